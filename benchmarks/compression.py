@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+"""
+Compare the stored size and read/write cost of post content with and without WP_API_COMPRESS_CONTENT.
+
+Usage: python benchmarks/compression.py [num_posts]
+"""
+from __future__ import print_function, unicode_literals
+
+import datetime
+import json
+import os
+import sys
+import time
+
+import django
+from django.conf import settings
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def setup():
+    settings.configure(
+        INSTALLED_APPS=["django.contrib.contenttypes", "wordpress"],
+        MIDDLEWARE_CLASSES=[],
+        DATABASES={"default": {"ENGINE": "django.db.backends.sqlite3", "NAME": ":memory:"}},
+        SECRET_KEY="notasecret",
+        USE_TZ=True,
+    )
+    django.setup()
+
+    from django.core.management import call_command
+    call_command("migrate", verbosity=0)
+
+
+def sample_post():
+    with open(os.path.join(ROOT, "wordpress", "tests", "data", "post.json")) as f:
+        return json.load(f)
+
+
+def stored_size():
+    from django.db import connection
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT SUM(LENGTH(content)) + SUM(LENGTH(metadata)) FROM wordpress_post")
+        return cursor.fetchone()[0]
+
+
+def run(num_posts, compressed):
+    """
+    Write, list, and fully read num_posts copies of the sample post.
+
+    :return: the stored size in characters, and the write, listing, and read times in seconds
+    """
+    from django.test.utils import override_settings
+    from django.utils import timezone
+    from wordpress.models import Post
+
+    Post.objects.all().delete()
+    api_post = sample_post()
+    # repeat the sample content so that posts are a typical article length
+    content = api_post["content"] * 10
+    date = datetime.datetime(2015, 10, 1, tzinfo=timezone.utc)
+
+    with override_settings(WP_API_COMPRESS_CONTENT=compressed):
+        start = time.time()
+        Post.objects.bulk_create([Post(site_id=1, wp_id=i, title=api_post["title"], content=content,
+                                       metadata=api_post["metadata"], post_date=date, modified=date)
+                                  for i in range(num_posts)])
+        write_time = time.time() - start
+
+        # listings don't read content, so they shouldn't pay for decompression
+        start = time.time()
+        for post in Post.objects.all():
+            post.title
+        listing_time = time.time() - start
+
+        start = time.time()
+        for post in Post.objects.all():
+            post.content
+            post.metadata
+        read_time = time.time() - start
+
+    return stored_size(), write_time, listing_time, read_time
+
+
+def main():
+    num_posts = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    setup()
+
+    print("{} posts".format(num_posts))
+    print("{:<12}{:>14}{:>10}{:>10}{:>10}".format("", "stored chars", "write s", "list s", "read s"))
+    for label, compressed in (("plain", False), ("compressed", True)):
+        size, write_time, listing_time, read_time = run(num_posts, compressed)
+        print("{:<12}{:>14}{:>10.3f}{:>10.3f}{:>10.3f}".format(label, size, write_time, listing_time, read_time))
+
+
+if __name__ == "__main__":
+    main()
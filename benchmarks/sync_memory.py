@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+"""
+Measure the memory used by WPAPILoader.load_site() on a large synthetic site, served by a local stand-in for the
+WordPress.com API in a separate process (see wpapi_server.py).
+
+The process's resident memory is sampled while the loader runs, and attributed to the loader's current phase
+(ref_data, posts, m2m, or attachments). For a full sync into an empty db, then an incremental sync, it reports the
+steady state (median) and peak memory of each phase, and exits with an error if either exceeds a given ceiling.
+
+Usage: python benchmarks/sync_memory.py [--posts 100000] [--attachments_per_post 5] [--max_peak_mb 1024] ...
+"""
+from __future__ import print_function, unicode_literals
+
+import argparse
+from collections import defaultdict
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import django
+from django.conf import settings
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from wpapi_server import start_server_process  # noqa: E402
+
+
+MB = 1024 * 1024
+
+
+def setup(database):
+    settings.configure(
+        INSTALLED_APPS=["django.contrib.contenttypes", "wordpress"],
+        MIDDLEWARE_CLASSES=[],
+        DATABASES={"default": {"ENGINE": "django.db.backends.sqlite3", "NAME": database}},
+        SECRET_KEY="notasecret",
+        USE_TZ=True,
+    )
+    django.setup()
+
+    from django.core.management import call_command
+    call_command("migrate", verbosity=0)
+
+
+def current_rss():
+    """
+    The resident memory of this process in bytes, from /proc; or its peak so far, where /proc isn't available.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf(str("SC_PAGE_SIZE"))
+    except (IOError, OSError, ValueError):
+        import resource
+        # kilobytes on linux, bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class MemorySampler(object):
+    """
+    Samples resident memory in a background thread, by the loader's current metrics phase.
+    """
+
+    def __init__(self, metrics, interval=0.05):
+        """
+        :param metrics: the loader's Metrics, for its current phase
+        :param interval: the number of seconds between samples
+        """
+        self.metrics = metrics
+        self.interval = interval
+        self.samples = defaultdict(list)
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="memory-sampler")
+        self.thread.daemon = True
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.stopped.set()
+        self.thread.join()
+        # what's still held once the run is over
+        self.samples["after"].append(current_rss())
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        self.samples[self.metrics.current_phase or "other"].append(current_rss())
+
+    def phase_stats(self):
+        """
+        :return: (phase, number of samples, median bytes, peak bytes) for each phase, in order of peak
+        """
+        stats = []
+        for phase, samples in self.samples.items():
+            samples = sorted(samples)
+            stats.append((phase, len(samples), samples[len(samples) // 2], samples[-1]))
+        return sorted(stats, key=lambda stat: stat[3])
+
+
+def run(api_base_url, **load_site_kwargs):
+    """
+    Sync the site with a new loader, as load_wp_api would, sampling memory.
+
+    :return: the MemorySampler, and the time in seconds
+    """
+    from wordpress.loading import WPAPILoader
+
+    loader = WPAPILoader(site_id=1, api_base_url=api_base_url)
+
+    start = time.time()
+    with MemorySampler(loader.metrics) as sampler:
+        loader.load_site(**load_site_kwargs)
+
+    return sampler, time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n\n")[0])
+    parser.add_argument("--posts", type=int, default=100000, help="the number of posts in the site")
+    parser.add_argument("--tags_per_post", type=int, default=3)
+    parser.add_argument("--attachments_per_post", type=int, default=5,
+                        help="each is a media item and an attachment post (default: 5, i.e. 500k media)")
+    parser.add_argument("--content_length", type=int, default=2000, help="characters of content per post")
+    # load_posts() stops after 200 pages, so larger pages than WordPress.com allows are needed to cover a big site
+    parser.add_argument("--batch_size", type=int, default=500, help="posts per page of API results")
+    parser.add_argument("--type", default="all", help="the type of content to load, as for load_wp_api")
+    parser.add_argument("--max_peak_mb", type=float, help="fail if memory ever exceeds this")
+    parser.add_argument("--max_steady_mb", type=float, help="fail if the steady state of any phase exceeds this")
+    parser.add_argument("--database", help="the sqlite db file (default: a temporary file)")
+    args = parser.parse_args()
+
+    # start the server before loading anything, so the forked process stays small
+    server, api_base_url = start_server_process(num_posts=args.posts, tags_per_post=args.tags_per_post,
+                                                attachments_per_post=args.attachments_per_post,
+                                                content_length=args.content_length)
+    tmp_dir = None if args.database else tempfile.mkdtemp()
+
+    # the loader warns about the missing auth token on every run
+    logging.basicConfig(level=logging.ERROR)
+    setup(args.database or os.path.join(tmp_dir, "sync_memory.sqlite3"))
+
+    failures = []
+    try:
+        print("{} posts, {} tags/post, {} attachments/post, {} chars/post".format(
+            args.posts, args.tags_per_post, args.attachments_per_post, args.content_length))
+        print("baseline: {:.1f} MB".format(current_rss() / float(MB)))
+        print("{:<14}{:<12}{:>9}{:>12}{:>10}".format("", "phase", "samples", "steady MB", "peak MB"))
+
+        for label, load_site_kwargs in (("full", {"full": True}), ("incremental", {})):
+            sampler, elapsed = run(api_base_url, type=args.type, batch_size=args.batch_size, **load_site_kwargs)
+
+            for phase, num_samples, steady, peak in sampler.phase_stats():
+                print("{:<14}{:<12}{:>9}{:>12.1f}{:>10.1f}".format(label, phase, num_samples,
+                                                                   steady / float(MB), peak / float(MB)))
+                if args.max_peak_mb and peak > args.max_peak_mb * MB:
+                    failures.append("{} {}: peak {:.1f} MB > {} MB".format(label, phase, peak / float(MB),
+                                                                           args.max_peak_mb))
+                if args.max_steady_mb and steady > args.max_steady_mb * MB:
+                    failures.append("{} {}: steady state {:.1f} MB > {} MB".format(label, phase, steady / float(MB),
+                                                                                   args.max_steady_mb))
+            print("{:<14}{:.1f}s".format(label, elapsed))
+    finally:
+        server.terminate()
+        if tmp_dir:
+            shutil.rmtree(tmp_dir)
+
+    for failure in failures:
+        print("FAIL: {}".format(failure))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
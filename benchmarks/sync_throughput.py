@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+"""
+Measure end-to-end sync throughput of WPAPILoader.load_site(), against a local stand-in for the WordPress.com API
+serving a synthetic site (see wpapi_server.py).
+
+Reports posts/sec, API calls per post, and DB queries per post for an initial sync into an empty db,
+an incremental sync after some posts are edited, and a --full sync.
+
+Usage: python benchmarks/sync_throughput.py [--posts 1000] [--tags_per_post 3] [--attachments_per_post 1] ...
+"""
+from __future__ import print_function, unicode_literals
+
+import argparse
+from collections import Counter
+import logging
+import os
+import sys
+import time
+
+import django
+from django.conf import settings
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from wpapi_server import SyntheticSite, start_server  # noqa: E402
+
+
+def setup(database):
+    settings.configure(
+        INSTALLED_APPS=["django.contrib.contenttypes", "wordpress"],
+        MIDDLEWARE_CLASSES=[],
+        DATABASES={"default": {"ENGINE": "django.db.backends.sqlite3", "NAME": database}},
+        SECRET_KEY="notasecret",
+        USE_TZ=True,
+    )
+    django.setup()
+
+    from django.core.management import call_command
+    call_command("migrate", verbosity=0)
+
+
+def run(server, **load_site_kwargs):
+    """
+    Sync the server's site with a new loader, as load_wp_api would.
+
+    :return: the number of posts processed, the number of API calls and DB queries made, and the time in seconds
+    """
+    from django.db import connection
+    from wordpress.loading import WPAPILoader
+    from wordpress.metrics import CallbackSink, Metrics
+    from wordpress.querytracking import track_queries
+
+    counts = Counter()
+
+    def count_post(kind, name, value, tags):
+        if kind == "incr" and name in ("posts.inserted", "posts.updated", "posts.unchanged"):
+            counts["posts"] += value
+
+    def count_query(sql, params, duration):
+        counts["queries"] += 1
+
+    loader = WPAPILoader(site_id=server.site.site_id, api_base_url=server.api_base_url,
+                         metrics=Metrics(sinks=[CallbackSink(count_post)]))
+    num_requests = server.num_requests
+
+    start = time.time()
+    with track_queries(connection, count_query):
+        loader.load_site(**load_site_kwargs)
+    elapsed = time.time() - start
+
+    return counts["posts"], server.num_requests - num_requests, counts["queries"], elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n\n")[0])
+    parser.add_argument("--posts", type=int, default=1000, help="the number of posts in the site")
+    parser.add_argument("--tags_per_post", type=int, default=3)
+    parser.add_argument("--attachments_per_post", type=int, default=1)
+    parser.add_argument("--content_length", type=int, default=2000, help="characters of content per post")
+    parser.add_argument("--edits", type=int, default=50, help="the number of posts edited before the incremental run")
+    parser.add_argument("--batch_size", type=int, default=100, help="posts per page of API results")
+    parser.add_argument("--database", default=":memory:", help="the sqlite db file (default: in memory)")
+    args = parser.parse_args()
+
+    # the loader warns about the missing auth token on every run
+    logging.basicConfig(level=logging.ERROR)
+    setup(args.database)
+
+    site = SyntheticSite(num_posts=args.posts, tags_per_post=args.tags_per_post,
+                         attachments_per_post=args.attachments_per_post, content_length=args.content_length)
+    server = start_server(site)
+
+    print("{} posts, {} tags/post, {} attachments/post, {} chars/post".format(
+        args.posts, args.tags_per_post, args.attachments_per_post, args.content_length))
+    print("{:<14}{:>8}{:>10}{:>12}{:>12}{:>14}".format("", "posts", "time s", "posts/s", "API/post", "queries/post"))
+
+    try:
+        for label, edits, load_site_kwargs in (("initial", 0, {}),
+                                               ("incremental", args.edits, {}),
+                                               ("full", 0, {"full": True})):
+            site.touch(edits)
+            num_posts, num_requests, num_queries, elapsed = run(server, batch_size=args.batch_size, **load_site_kwargs)
+            per_post = float(max(num_posts, 1))
+            print("{:<14}{:>8}{:>10.2f}{:>12.1f}{:>12.2f}{:>14.1f}".format(
+                label, num_posts, elapsed, num_posts / elapsed, num_requests / per_post, num_queries / per_post))
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,389 @@
+"""
+A local stand-in for the WordPress.com REST API v1.1, serving a synthetic site, for benchmarks.
+
+It implements the parts of the endpoints that WPAPILoader.load_site() uses:
+categories, tags, users, media, and posts (with page_handle paging), plus single posts.
+"""
+from __future__ import print_function, unicode_literals
+
+from collections import Counter
+import datetime
+import json
+import multiprocessing
+import random
+import re
+import threading
+
+from six.moves import BaseHTTPServer, socketserver
+from six.moves.urllib.parse import parse_qs, urlparse
+
+
+DATE_FORMAT = "%Y-%m-%dT%H:%M:%S+00:00"
+WORDS = ("lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor incididunt ut labore et dolore "
+         "magna aliqua enim ad minim veniam quis nostrud exercitation ullamco laboris nisi aliquip ex ea commodo").split()
+
+
+def format_date(date):
+    return date.strftime(DATE_FORMAT)
+
+
+def parse_date(value):
+    # the loader sends isoformat() dates, with or without a utc offset
+    return datetime.datetime.strptime(value[:19], "%Y-%m-%dT%H:%M:%S")
+
+
+class SyntheticSite(object):
+    """
+    A generated WordPress site: posts, each with tags, a category, an author, and attachments.
+    Posts are spread an hour apart, ending now, so that recent media is within the loader's 90 day window.
+
+    Posts, media, and attachment posts are generated when they're requested, from the seed and their ID,
+    so that sites with hundreds of thousands of posts don't need to be held in memory.
+    """
+
+    def __init__(self, site_id=1, num_posts=1000, tags_per_post=3, attachments_per_post=1, content_length=2000,
+                 num_tags=None, num_categories=20, num_authors=10, seed=0):
+        """
+        :param site_id: the WordPress site ID
+        :param num_posts: the number of posts with post_type=post
+        :param tags_per_post: the number of tags on each post
+        :param attachments_per_post: the number of attachments (media, and attachment posts) on each post
+        :param content_length: the length of each post's content, in characters
+        :param num_tags: the number of distinct tags; defaults to one per 5 posts
+        :param num_categories: the number of distinct categories
+        :param num_authors: the number of distinct authors
+        :param seed: the random seed, so that runs are comparable
+        """
+        self.site_id = site_id
+        self.num_posts = num_posts
+        self.tags_per_post = tags_per_post
+        self.attachments_per_post = attachments_per_post
+        self.content_length = content_length
+        self.seed = seed
+        self.random = random.Random(seed)
+        self.end = datetime.datetime.utcnow().replace(microsecond=0)
+        self.now = self.end
+        self.lock = threading.Lock()
+
+        self.categories = [self.make_category(i) for i in range(1, num_categories + 1)]
+        self.tags = [self.make_tag(i) for i in range(1, max(num_tags or num_posts // 5, tags_per_post) + 1)]
+        self.authors = [self.make_author(i) for i in range(1, num_authors + 1)]
+
+        # IDs, newest first; attachments take the IDs after the posts, so they're in date order too
+        self.post_ids = list(range(num_posts, 0, -1))
+        self.attachment_ids = list(range(num_posts + num_posts * attachments_per_post, num_posts, -1))
+        # post ID -> (modified date, edit number), for posts edited with touch()
+        self.edits = {}
+
+    def words(self, length, rand=None):
+        rand = rand or self.random
+        text = []
+        text_length = 0
+        while text_length < length:
+            text.append(rand.choice(WORDS))
+            text_length += len(text[-1]) + 1
+        return " ".join(text)[:length]
+
+    def make_category(self, i):
+        return {"ID": i, "name": "Category {}".format(i), "slug": "category-{}".format(i),
+                "description": "", "post_count": 0, "parent": 0}
+
+    def make_tag(self, i):
+        return {"ID": i, "name": "Tag {}".format(i), "slug": "tag-{}".format(i),
+                "description": "", "post_count": 0}
+
+    def make_author(self, i):
+        return {"ID": i, "login": "author{}".format(i), "email": False, "name": "Author {}".format(i),
+                "nice_name": "author{}".format(i), "URL": "", "avatar_URL": "https://avatar.local/{}".format(i),
+                "profile_URL": "https://profile.local/{}".format(i), "site_ID": self.site_id}
+
+    def post_date(self, post_id):
+        return self.end - datetime.timedelta(hours=self.num_posts - post_id)
+
+    def post_modified(self, post_id):
+        return self.edits[post_id][0] if post_id in self.edits else self.post_date(post_id)
+
+    def post_attachment_ids(self, post_id):
+        first = self.num_posts + (post_id - 1) * self.attachments_per_post + 1
+        return list(range(first, first + self.attachments_per_post))
+
+    def attachment_parent_id(self, attachment_id):
+        return (attachment_id - self.num_posts - 1) // self.attachments_per_post + 1
+
+    def attachment_modified(self, attachment_id):
+        return self.post_date(self.attachment_parent_id(attachment_id))
+
+    def make_media(self, wp_id):
+        post_id = self.attachment_parent_id(wp_id)
+        url = "https://test.local/files/{}.jpg".format(wp_id)
+        return {"ID": wp_id, "URL": url, "guid": url, "date": format_date(self.post_date(post_id)), "post_ID": post_id,
+                "file": "{}.jpg".format(wp_id), "mime_type": "image/jpeg", "extension": "jpg",
+                "title": "Image {}".format(wp_id), "caption": "", "description": "", "alt": "",
+                "thumbnails": {}, "height": 680, "width": 1024,
+                "exif": {"aperture": 0, "credit": "", "camera": "", "caption": "", "created_timestamp": 0,
+                         "copyright": "", "focal_length": 0, "iso": 0, "shutter_speed": 0, "title": "",
+                         "orientation": 0}}
+
+    def make_post(self, wp_id):
+        modified, edit = self.edits.get(wp_id, (self.post_date(wp_id), 0))
+        rand = random.Random(self.seed * 1000003 + wp_id)
+        post_media = [self.make_media(media_id) for media_id in self.post_attachment_ids(wp_id)]
+        tags = rand.sample(self.tags, self.tags_per_post)
+        category = rand.choice(self.categories)
+        thumbnail = post_media[0] if post_media else None
+        return {
+            "ID": wp_id,
+            "site_ID": self.site_id,
+            "author": rand.choice(self.authors),
+            "date": format_date(self.post_date(wp_id)),
+            "modified": format_date(modified),
+            "title": self.words(60, rand) + (" ({})".format(edit) if edit else ""),
+            "URL": "http://test.local/post-{}/".format(wp_id),
+            "short_URL": "http://bit.ly/{}".format(wp_id),
+            "content": "<p>{}</p>\n".format(self.words(self.content_length, rand)),
+            "excerpt": "<p>{}</p>\n".format(self.words(200, rand)),
+            "slug": "post-{}".format(wp_id),
+            "guid": "http://test.local/?p={}".format(wp_id),
+            "status": "publish",
+            "sticky": False,
+            "password": "",
+            "parent": False,
+            "type": "post",
+            "likes_enabled": False,
+            "sharing_enabled": True,
+            "like_count": 0,
+            "global_ID": "{:032x}".format(wp_id),
+            "featured_image": thumbnail["URL"] if thumbnail else "",
+            "post_thumbnail": dict((key, thumbnail[key]) for key in ("ID", "URL", "guid", "mime_type", "width",
+                                                                     "height")) if thumbnail else None,
+            "format": "standard",
+            "menu_order": 0,
+            "tags": dict((tag["name"], tag) for tag in tags),
+            "categories": {category["name"]: category},
+            "attachments": dict((str(media["ID"]), media) for media in post_media),
+            "attachment_count": len(post_media),
+            "metadata": [{"id": "1", "key": "benchmark", "value": str(wp_id)}],
+        }
+
+    def make_attachment(self, wp_id):
+        media = self.make_media(wp_id)
+        date = format_date(self.post_date(media["post_ID"]))
+        return {
+            "ID": wp_id,
+            "site_ID": self.site_id,
+            "author": self.authors[0],
+            "date": date,
+            "modified": date,
+            "title": media["title"],
+            "URL": media["URL"],
+            "short_URL": "http://bit.ly/{}".format(wp_id),
+            "content": "",
+            "excerpt": "",
+            "slug": "image-{}".format(wp_id),
+            "guid": media["guid"],
+            "status": "inherit",
+            "sticky": False,
+            "password": "",
+            "parent": {"ID": media["post_ID"], "type": "post", "link": "", "title": ""},
+            "type": "attachment",
+            "likes_enabled": False,
+            "sharing_enabled": True,
+            "like_count": 0,
+            "global_ID": "{:032x}".format(wp_id),
+            "featured_image": "",
+            "post_thumbnail": None,
+            "format": "standard",
+            "menu_order": 0,
+            "tags": {},
+            "categories": {},
+            "attachments": {},
+            "attachment_count": 0,
+            "metadata": [],
+        }
+
+    def get_post(self, wp_id):
+        if 1 <= wp_id <= self.num_posts:
+            return self.make_post(wp_id)
+        if self.num_posts < wp_id <= self.num_posts * (1 + self.attachments_per_post):
+            return self.make_attachment(wp_id)
+        return None
+
+    def touch(self, num_posts):
+        """
+        Edit the most recent posts, as authors would between incremental syncs.
+
+        :param num_posts: the number of posts to edit
+        :return: None
+        """
+        with self.lock:
+            self.now += datetime.timedelta(hours=1)
+            for post_id in self.post_ids[:num_posts]:
+                self.edits[post_id] = (self.now, self.edits.get(post_id, (None, 0))[1] + 1)
+
+    def list_post_ids(self, params):
+        """
+        The IDs of the posts matching a listing's type, modified_after, and parent_id params, newest first.
+        All posts are published, and all attachments inherit their post's status.
+        """
+        post_type = params.get("type", "post")
+        if "parent_id" in params:
+            parent_id = int(params["parent_id"])
+            return self.post_attachment_ids(parent_id)[::-1] if 1 <= parent_id <= self.num_posts else []
+
+        if post_type == "attachment":
+            ids = self.attachment_ids
+            modified = self.attachment_modified
+        elif post_type == "post" and params.get("status", "publish") in ("publish", "any"):
+            ids = self.post_ids
+            modified = self.post_modified
+        else:
+            return []
+
+        if "modified_after" in params:
+            modified_after = parse_date(params["modified_after"])
+            ids = [wp_id for wp_id in ids if modified(wp_id) > modified_after]
+        return ids
+
+    def list_media_ids(self, params):
+        """
+        The IDs of media uploaded after a listing's after param, if any, newest first.
+        """
+        if "after" in params:
+            after = parse_date(params["after"])
+            return [wp_id for wp_id in self.attachment_ids
+                    if self.post_date(self.attachment_parent_id(wp_id)) > after]
+        return self.attachment_ids
+
+
+def page(items, params, default_number=20):
+    # the offset to start at, from the page or offset params
+    number = int(params.get("number", default_number))
+    if "offset" in params:
+        start = int(params["offset"])
+    else:
+        start = (int(params.get("page", 1)) - 1) * number
+    return items[start:start + number]
+
+
+class WPAPIRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Serves the server's SyntheticSite at /rest/v1.1/, and counts requests by endpoint.
+    """
+    protocol_version = "HTTP/1.1"
+    path_re = re.compile(r"^/rest/v1\.1/sites/(?P<site_id>-?\d+)/(?P<endpoint>\w+)/?(?P<wp_id>\d+)?/?$")
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = dict((key, values[0]) for key, values in parse_qs(url.query).items())
+        match = self.path_re.match(url.path)
+        site = self.server.site
+
+        if not match or int(match.group("site_id")) != site.site_id:
+            return self.send_json({"error": "unknown_blog"}, status=404)
+
+        endpoint = match.group("endpoint")
+        self.server.count(endpoint)
+
+        with site.lock:
+            if endpoint == "posts" and match.group("wp_id"):
+                post = site.get_post(int(match.group("wp_id")))
+                if not post:
+                    return self.send_json({"error": "unknown_post"}, status=404)
+                return self.send_json(post)
+            elif endpoint == "posts":
+                return self.send_json(self.list_posts(site, params))
+            elif endpoint == "categories":
+                return self.send_json({"found": len(site.categories), "categories": page(site.categories, params)})
+            elif endpoint == "tags":
+                return self.send_json({"found": len(site.tags), "tags": page(site.tags, params)})
+            elif endpoint == "users":
+                return self.send_json({"found": len(site.authors), "users": page(site.authors, params)})
+            elif endpoint == "media":
+                media_ids = site.list_media_ids(params)
+                return self.send_json({"found": len(media_ids),
+                                       "media": [site.make_media(wp_id) for wp_id in page(media_ids, params)]})
+
+        self.send_json({"error": "unknown_endpoint"}, status=404)
+
+    def list_posts(self, site, params):
+        post_ids = site.list_post_ids(params)
+        number = int(params.get("number", 20))
+        # page handles are opaque to the client; here they're just the offset of the next page
+        start = int(params.get("page_handle") or 0)
+        data = {"found": len(post_ids), "posts": [site.get_post(wp_id) for wp_id in post_ids[start:start + number]],
+                "meta": {}}
+        if start + number < len(post_ids):
+            data["meta"]["next_page"] = str(start + number)
+
+        if params.get("fields"):
+            fields = params["fields"].split(",")
+            data["posts"] = [dict((field, post[field]) for field in fields if field in post) for post in data["posts"]]
+        return data
+
+    def send_json(self, data, status=200):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class WPAPIServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, site, address=("127.0.0.1", 0)):
+        BaseHTTPServer.HTTPServer.__init__(self, address, WPAPIRequestHandler)
+        self.site = site
+        self.requests = Counter()
+        self.requests_lock = threading.Lock()
+
+    @property
+    def api_base_url(self):
+        return "http://{}:{}/rest/v1.1/".format(*self.server_address[:2])
+
+    def count(self, endpoint):
+        with self.requests_lock:
+            self.requests[endpoint] += 1
+
+    @property
+    def num_requests(self):
+        with self.requests_lock:
+            return sum(self.requests.values())
+
+
+def start_server(site):
+    """
+    Serve a SyntheticSite on a free local port, in a background thread.
+
+    :param site: the SyntheticSite
+    :return: the WPAPIServer; pass its api_base_url to WPAPILoader, and call shutdown() when done
+    """
+    server = WPAPIServer(site)
+    thread = threading.Thread(target=server.serve_forever, name="wpapi-server")
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+def serve_site(site_kwargs, addresses):
+    server = WPAPIServer(SyntheticSite(**site_kwargs))
+    addresses.put(server.server_address[:2])
+    server.serve_forever()
+
+
+def start_server_process(**site_kwargs):
+    """
+    Serve a SyntheticSite from a separate process, e.g. to keep the server out of the loader's memory measurements.
+
+    :param site_kwargs: the arguments for the SyntheticSite
+    :return: the process, which should be terminated when done, and the API base URL to pass to WPAPILoader
+    """
+    addresses = multiprocessing.Queue()
+    process = multiprocessing.Process(target=serve_site, args=(site_kwargs, addresses), name="wpapi-server")
+    process.daemon = True
+    process.start()
+    return process, "http://{}:{}/rest/v1.1/".format(*addresses.get(timeout=60))
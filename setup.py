@@ -42,7 +42,6 @@ setup(
     ],
     install_requires=[
         "Django>=1.7.9",
-        "django-after-response==0.2.1",
         "jsonfield>=1.0.3",
         "python-dateutil>=2.4.2",
         "requests>=2.7.0",
@@ -70,6 +70,7 @@ class PostAdmin(admin.ModelAdmin):
     ordering = ('-post_date',)
     search_fields = ('id', 'wp_id', 'title', 'slug', 'author__name')
     list_filter = ('post_date', 'post_type', 'status', 'author')
+    list_select_related = ('author',)
 
     # wider fields to show more of the entity names
     formfield_overrides = {
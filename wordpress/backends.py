@@ -0,0 +1,518 @@
+from __future__ import unicode_literals
+
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+import six
+
+from wordpress.utils import chunked
+
+
+logger = logging.getLogger(__name__)
+
+
+def get_api_version():
+    """
+    The API the loader syncs from, with WP_API_VERSION in settings:
+    "v1.1" for the WordPress.com REST API (default), or "v2" for the core WordPress REST API of a self-hosted site.
+    """
+    return getattr(settings, "WP_API_VERSION", "v1.1")
+
+
+def get_prefetch_pages():
+    """
+    The number of pages of a listing to fetch in parallel, ahead of the page the loader is working on,
+    from WP_API_PREFETCH_PAGES in settings (default: 2). Only the v2 API has numbered pages to fetch ahead.
+    """
+    return int(getattr(settings, "WP_API_PREFETCH_PAGES", 2))
+
+
+def get_backend(loader, api_version=None):
+    """
+    Get the backend for an API version.
+
+    :param loader: the WPAPILoader the backend sends requests for
+    :param api_version: "v1.1" or "v2"; if not given, we use get_api_version()
+    :return: a backend instance
+    """
+    api_version = api_version or get_api_version()
+    if api_version == "v1.1":
+        return WPComBackend(loader)
+    if api_version == "v2":
+        return WPV2Backend(loader)
+    raise ImproperlyConfigured("Unknown WordPress API version: {}".format(api_version))
+
+
+class WPComBackend(object):
+    """
+    The WordPress.com REST API v1.1.
+
+    The loader's requests, and the data it reads from responses, are in this API's terms, so they're sent as they are.
+    """
+    default_api_base_url = "https://public-api.wordpress.com/rest/v1.1/"
+
+    def __init__(self, loader):
+        self.loader = loader
+
+    def get(self, path, params=None):
+        return self.loader.request(self.loader.api_base_url + path, params, endpoint=self.loader.endpoint_name(path))
+
+
+class APIResponse(object):
+    """
+    A response from the v2 API, with its data in the v1.1 API's terms.
+    """
+
+    def __init__(self, response, data=None):
+        self.response = response
+        self.status_code = response.status_code
+        self.ok = response.ok
+        self.data = data
+
+    @property
+    def text(self):
+        return self.response.text
+
+    def json(self):
+        return self.data
+
+
+class Prefetch(object):
+    """
+    A request running in a background thread, for its response to be picked up later.
+    """
+
+    def __init__(self, func, *args):
+        self.response = None
+        self.error = None
+        self.started = time.time()
+        self.thread = threading.Thread(target=self.run, args=(func,) + args, name="wordpress-prefetch")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def run(self, func, *args):
+        try:
+            self.response = func(*args)
+        except Exception as e:
+            self.error = e
+
+    def result(self):
+        self.thread.join()
+        if self.error:
+            raise self.error
+        return self.response
+
+
+def rendered(value):
+    """
+    The rendered text of a v2 field such as title or content, which may be an object or, with some plugins, a string.
+    """
+    if isinstance(value, dict):
+        return value.get("rendered") or ""
+    return value or ""
+
+
+def gmt_date(value):
+    """
+    Convert a v2 GMT date, which has no timezone, to the v1.1 API's format.
+    """
+    return value + "+00:00" if value else None
+
+
+def embedded(api_data, rel):
+    """
+    The first object embedded in v2 data for a link relation, e.g. the author; None if it's missing or an error.
+    """
+    objs = api_data.get("_embedded", {}).get(rel) or []
+    obj = objs[0] if objs else None
+    if isinstance(obj, dict) and "code" in obj:
+        return None
+    return obj
+
+
+class WPV2Backend(object):
+    """
+    The core WordPress REST API (wp-json/wp/v2), for self-hosted sites.
+
+    The loader's requests are translated from the v1.1 API's terms, and responses back to them,
+    so that it loads content the same way from either API.
+
+    - Posts are requested with their author, terms, featured image, and attachments embedded (_embed),
+      so a page of posts takes one request.
+    - Embedded terms don't have descriptions or post counts, so those are fetched for terms that haven't been seen in
+      a listing yet, with one include[] request per taxonomy for a page of posts. Authors that couldn't be embedded are
+      fetched the same way.
+    - Pages are numbered, and the X-WP-TotalPages header says how many there are, so the next pages of posts are
+      fetched in parallel while the loader works on the current one. (The loader pages through posts by handle, but
+      fetches the pages of ref data listings in parallel itself.)
+
+    The loader uses a backend from more than one thread at once, e.g. to list a post's attachments while the next page
+    of posts is fetched, so the terms, authors, and pages fetched ahead are shared under a lock, and a listing's pages
+    fetched ahead are kept until they're picked up, or expire if they aren't.
+    """
+    embed = "author,wp:term,wp:featuredmedia,wp:attachment"
+    max_per_page = 100
+
+    # seconds to keep a page fetched ahead that hasn't been picked up, e.g. because the loader stopped early
+    prefetch_max_age = 60
+
+    # the v2 endpoints of post types, where they differ from the type's name
+    post_type_endpoints = {
+        "post": "posts",
+        "page": "pages",
+        "attachment": "media",
+    }
+
+    # the v2 names of fields the loader asks for
+    field_names = {
+        "ID": "id",
+        "modified": "modified_gmt",
+    }
+
+    def __init__(self, loader, prefetch_pages=None):
+        """
+        :param loader: the WPAPILoader to send requests with
+        :param prefetch_pages: the number of pages to fetch ahead; if not given, we use get_prefetch_pages()
+        """
+        if not loader.api_base_url:
+            raise ImproperlyConfigured("Set WP_API_BASE_URL in settings to the site's v2 API, "
+                                       "e.g. https://example.com/wp-json/wp/v2/")
+        self.loader = loader
+        self.prefetch_pages = get_prefetch_pages() if prefetch_pages is None else prefetch_pages
+
+        # v1.1 data for terms and authors, keyed by ID; there are few of these compared to posts
+        self.terms = {"categories": {}, "tags": {}}
+        self.authors = {}
+
+        # pending requests for pages of a listing, keyed by (endpoint, params without the page, page)
+        self.prefetched = {}
+
+        self.lock = threading.Lock()
+
+    def get(self, path, params=None):
+        """
+        Send a request in the v1.1 API's terms to the v2 API.
+
+        :param path: a v1.1 API path, e.g. sites/123/posts
+        :param params: v1.1 API querystring args
+        :return: an APIResponse
+        """
+        parts = [part for part in path.split("/") if part]
+        if parts[:1] == ["sites"]:
+            parts = parts[2:]
+        params = params or {}
+
+        if parts == ["posts"]:
+            return self.list_posts(params)
+        if len(parts) == 2 and parts[0] == "posts":
+            return self.get_post(parts[1])
+        if parts in (["categories"], ["tags"]):
+            return self.list_terms(parts[0], params)
+        if parts == ["users"]:
+            return self.list_users(params)
+        if parts == ["media"]:
+            return self.list_media(params)
+
+        raise ValueError("The v2 API backend can't request {}".format(path))
+
+    def request(self, endpoint, params=None):
+        return self.loader.request(self.loader.api_base_url + endpoint, params, endpoint=endpoint.split("/")[0])
+
+    def fetch_page(self, endpoint, params):
+        """
+        Request a page of a listing, or pick it up if it was fetched ahead, and start fetching the pages after it.
+
+        :param endpoint: the v2 endpoint, e.g. posts
+        :param params: v2 querystring args, including the page number
+        :return: the response
+        """
+        page = params.get("page", 1)
+        listing = (endpoint, tuple(sorted((key, value) for key, value in params.items() if key != "page")))
+
+        with self.lock:
+            self.expire_prefetched()
+            prefetch = self.prefetched.pop(listing + (page,), None)
+
+        response = prefetch.result() if prefetch else self.request(endpoint, params)
+
+        if response.ok:
+            num_pages = int(response.headers.get("X-WP-TotalPages") or 1)
+            with self.lock:
+                for next_page in range(page + 1, min(page + self.prefetch_pages, num_pages) + 1):
+                    if listing + (next_page,) not in self.prefetched:
+                        self.prefetched[listing + (next_page,)] = Prefetch(self.request, endpoint,
+                                                                           dict(params, page=next_page))
+
+        return response
+
+    def expire_prefetched(self):
+        """
+        Drop pages fetched ahead that have been waiting to be picked up for longer than prefetch_max_age.
+        Call with the lock held.
+        """
+        expired = time.time() - self.prefetch_max_age
+        for key, prefetch in list(self.prefetched.items()):
+            if prefetch.started < expired:
+                del self.prefetched[key]
+
+    def listing_data(self, response, page, key, objs):
+        """
+        A page of a listing in v1.1 terms: the total number of objects, the objects, and the next page, if any.
+        """
+        num_pages = int(response.headers.get("X-WP-TotalPages") or 1)
+        data = {
+            "found": int(response.headers.get("X-WP-Total") or len(objs)),
+            key: objs,
+            "meta": {}
+        }
+        if page < num_pages:
+            data["meta"]["next_page"] = six.text_type(page + 1)
+        return data
+
+    # ------- posts ---------- #
+
+    def list_posts(self, params):
+        post_type = params.get("type", "post")
+        endpoint = self.post_type_endpoints.get(post_type, post_type)
+        page = int(params.get("page_handle") or 1)
+
+        # most recently modified first, so that posts modified during a crawl aren't skipped
+        v2_params = {"per_page": min(int(params.get("number", 20)), self.max_per_page),
+                     "page": page,
+                     "orderby": "modified"}
+
+        status = params.get("status")
+        if post_type == "attachment":
+            # attachments are "inherit"ed, and listed with any status by default
+            status = None if status in ("publish", "any") else status
+        if status:
+            v2_params["status"] = status
+        if params.get("modified_after"):
+            v2_params["modified_after"] = params["modified_after"]
+        if params.get("parent_id"):
+            v2_params["parent"] = params["parent_id"]
+
+        fields = params.get("fields")
+        if fields:
+            v2_params["_fields"] = ",".join(self.field_names.get(field, field) for field in fields.split(","))
+        else:
+            v2_params["_embed"] = self.embed
+
+        response = self.fetch_page(endpoint, v2_params)
+        if not response.ok:
+            return APIResponse(response)
+
+        items = response.json()
+        if fields:
+            api_posts = [dict((field, item.get(self.field_names.get(field, field))) for field in fields.split(","))
+                         for item in items]
+            for api_post in api_posts:
+                if api_post.get("modified"):
+                    api_post["modified"] = gmt_date(api_post["modified"])
+        else:
+            api_posts = self.get_api_posts(items)
+
+        return APIResponse(response, self.listing_data(response, page, "posts", api_posts))
+
+    def get_post(self, wp_id):
+        # the v1.1 API has one endpoint for every post type
+        for post_type in ("post", "page", "attachment"):
+            response = self.request("{}/{}".format(self.post_type_endpoints[post_type], wp_id), {"_embed": self.embed})
+            if response.status_code != 404:
+                break
+
+        if not response.ok:
+            return APIResponse(response)
+        return APIResponse(response, self.get_api_posts([response.json()])[0])
+
+    def get_api_posts(self, items):
+        """
+        Convert v2 posts (with embeds) to v1.1 posts, after fetching any terms and authors we don't have yet.
+        """
+        for taxonomy in ("categories", "tags"):
+            self.fetch_missing(taxonomy, self.terms[taxonomy],
+                               [term_id for item in items for term_id in item.get(taxonomy, [])],
+                               self.get_api_term)
+
+        embedded_authors = [embedded(item, "author") for item in items]
+        with self.lock:
+            self.authors.update((author["id"], self.get_api_author(author)) for author in embedded_authors
+                                if author and "id" in author)
+        self.fetch_missing("users", self.authors, [item["author"] for item in items if item.get("author")],
+                           self.get_api_author)
+
+        return [self.get_api_attachment_post(item) if item.get("type") == "attachment" else self.get_api_post(item)
+                for item in items]
+
+    def fetch_missing(self, endpoint, objs, ids, convert):
+        """
+        Fetch the objects we don't have yet out of the given IDs, a hundred at a time with include[].
+
+        :param endpoint: the v2 endpoint, e.g. categories
+        :param objs: the v1.1 data we have, keyed by ID, to add to
+        :param ids: the IDs needed
+        :param convert: a function from v2 data to v1.1 data
+        :return: None
+        """
+        with self.lock:
+            missing_ids = sorted(set(ids) - set(objs))
+
+        for ids_chunk in chunked(missing_ids, self.max_per_page):
+            response = self.request(endpoint, {"include[]": ids_chunk, "per_page": self.max_per_page})
+            if not response.ok:
+                logger.warning("Response NOT OK! status_code=%s\n%s", response.status_code, response.text)
+                continue
+            converted = [(item["id"], convert(item)) for item in response.json()]
+            with self.lock:
+                objs.update(converted)
+
+    def get_api_post(self, item):
+        featured_media = embedded(item, "wp:featuredmedia")
+        attachments = embedded(item, "wp:attachment") or []
+        meta = item.get("meta") or {}
+
+        return {
+            "ID": item["id"],
+            "author": self.authors.get(item.get("author"), {}),
+            # drafts don't have a GMT date yet
+            "date": gmt_date(item.get("date_gmt") or item.get("date")),
+            "modified": gmt_date(item.get("modified_gmt") or item.get("modified")),
+            "title": rendered(item.get("title")),
+            "URL": item.get("link", ""),
+            "short_URL": "",
+            "content": rendered(item.get("content")),
+            "excerpt": rendered(item.get("excerpt")),
+            "slug": item.get("slug", ""),
+            "guid": rendered(item.get("guid")),
+            "status": item.get("status"),
+            "sticky": bool(item.get("sticky")),
+            "password": item.get("password") or "",
+            "parent": {"ID": item["parent"]} if item.get("parent") else False,
+            "type": item.get("type"),
+            "likes_enabled": None,
+            "sharing_enabled": None,
+            "like_count": None,
+            "global_ID": "",
+            "featured_image": featured_media.get("source_url", "") if featured_media else "",
+            "post_thumbnail": self.get_api_post_thumbnail(featured_media) if featured_media else None,
+            "format": item.get("format") or "standard",
+            "menu_order": item.get("menu_order") or 0,
+            "metadata": [{"key": key, "value": value} for key, value in sorted(meta.items())] if meta else False,
+            "categories": self.get_api_post_terms("categories", item),
+            "tags": self.get_api_post_terms("tags", item),
+            "attachments": dict((six.text_type(media["id"]), self.get_api_media(media))
+                                for media in attachments if isinstance(media, dict) and "id" in media),
+        }
+
+    def get_api_post_terms(self, taxonomy, item):
+        terms = (self.terms[taxonomy].get(term_id) for term_id in item.get(taxonomy, []))
+        return dict((term["name"], term) for term in terms if term)
+
+    def get_api_post_thumbnail(self, media):
+        details = media.get("media_details") or {}
+        return {
+            "ID": media["id"],
+            "URL": media.get("source_url", ""),
+            "guid": rendered(media.get("guid")),
+            "mime_type": media.get("mime_type"),
+            "width": details.get("width"),
+            "height": details.get("height"),
+        }
+
+    def get_api_attachment_post(self, item):
+        api_post = self.get_api_post(item)
+        api_post["content"] = rendered(item.get("description"))
+        api_post["excerpt"] = rendered(item.get("caption"))
+        return api_post
+
+    # ------- ref data ---------- #
+
+    def list_terms(self, taxonomy, params):
+        page = int(params.get("page") or 1)
+        response = self.request(taxonomy, {"per_page": min(int(params.get("number", 20)), self.max_per_page),
+                                           "page": page})
+        if not response.ok:
+            return APIResponse(response)
+
+        api_terms = [self.get_api_term(item) for item in response.json()]
+        with self.lock:
+            self.terms[taxonomy].update((api_term["ID"], api_term) for api_term in api_terms)
+        return APIResponse(response, self.listing_data(response, page, taxonomy, api_terms))
+
+    def list_users(self, params):
+        response = self.request("users", {"per_page": min(int(params.get("number", 20)), self.max_per_page),
+                                          "offset": int(params.get("offset") or 0)})
+        if not response.ok:
+            return APIResponse(response)
+
+        api_authors = [self.get_api_author(item) for item in response.json()]
+        with self.lock:
+            self.authors.update((api_author["ID"], api_author) for api_author in api_authors)
+        return APIResponse(response, {"found": int(response.headers.get("X-WP-Total") or len(api_authors)),
+                                      "users": api_authors})
+
+    def list_media(self, params):
+        page = int(params.get("page") or 1)
+        v2_params = {"per_page": min(int(params.get("number", 20)), self.max_per_page), "page": page}
+        if params.get("after"):
+            v2_params["after"] = params["after"]
+
+        response = self.request("media", v2_params)
+        if not response.ok:
+            return APIResponse(response)
+
+        return APIResponse(response, self.listing_data(response, page, "media",
+                                                       [self.get_api_media(item) for item in response.json()]))
+
+    @staticmethod
+    def get_api_term(item):
+        return {
+            "ID": item["id"],
+            "name": item.get("name", ""),
+            "slug": item.get("slug", ""),
+            "description": item.get("description", ""),
+            "post_count": item.get("count", 0),
+            "parent": item.get("parent") or None,
+        }
+
+    @staticmethod
+    def get_api_author(item):
+        avatar_urls = item.get("avatar_urls") or {}
+        return {
+            "ID": item["id"],
+            # logins and emails are private, so the slug stands in for the login
+            "login": item.get("slug", ""),
+            "email": item.get("email", ""),
+            "name": item.get("name", ""),
+            "nice_name": item.get("slug", ""),
+            "URL": item.get("url", ""),
+            "avatar_URL": avatar_urls[max(avatar_urls, key=int)] if avatar_urls else "",
+            "profile_URL": item.get("link", ""),
+        }
+
+    @staticmethod
+    def get_api_media(item):
+        details = item.get("media_details") or {}
+        url = item.get("source_url", "")
+        file_name = os.path.basename(details.get("file") or url)
+        return {
+            "ID": item["id"],
+            "URL": url,
+            "guid": rendered(item.get("guid")),
+            "date": gmt_date(item.get("date_gmt") or item.get("date")),
+            "post_ID": item.get("post") or 0,
+            "file": file_name,
+            "extension": os.path.splitext(file_name)[1].lstrip("."),
+            "mime_type": item.get("mime_type"),
+            "width": details.get("width"),
+            "height": details.get("height"),
+            "title": rendered(item.get("title")),
+            "caption": rendered(item.get("caption")),
+            "description": rendered(item.get("description")),
+            "alt": item.get("alt_text", ""),
+            "exif": details.get("image_meta") or {},
+        }
@@ -0,0 +1,208 @@
+from __future__ import unicode_literals
+
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+import six
+
+from wordpress.models import Post
+
+
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}
+
+LOOKUPS = ("wp_id", "slug", "guid")
+
+
+def get_cache():
+    """
+    The Django cache to use, configured with WP_API_CACHE_ALIAS in settings (default: "default").
+    """
+    return caches[getattr(settings, "WP_API_CACHE_ALIAS", "default")]
+
+
+def get_timeout():
+    return getattr(settings, "WP_API_CACHE_TIMEOUT", 300)
+
+
+def get_stats():
+    """
+    Get the cache hit and miss counters for this process.
+
+    :return: a dict with "hits" and "misses" keys
+    """
+    with _stats_lock:
+        return dict(_stats)
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats["hits"] = 0
+        _stats["misses"] = 0
+
+
+def _count(stat):
+    with _stats_lock:
+        _stats[stat] += 1
+
+
+def _site_id(site_id):
+    return int(settings.WP_API_SITE_ID if site_id is None else site_id)
+
+
+def post_key(site_id, lookup, value, post_type=None):
+    # hash values since guids and slugs can contain characters that some cache backends don't allow in keys
+    value_hash = hashlib.md5(six.text_type(value).encode("utf-8")).hexdigest()
+    return "wordpress:post:{}:{}:{}:{}".format(site_id, post_type or "", lookup, value_hash)
+
+
+def listing_generation_key(site_id):
+    return "wordpress:posts:{}:generation".format(site_id)
+
+
+def ref_data_generation_key(site_id):
+    return "wordpress:refdata:{}:generation".format(site_id)
+
+
+def get_listing_generation(cache, site_id):
+    return get_generation(cache, listing_generation_key(site_id))
+
+
+def get_ref_data_generation(site_id):
+    """
+    Get the site's ref data generation, which changes whenever the loader purges or reloads its tags, categories,
+    authors, or media. Processes that keep ref data in memory use it to tell when to drop it.
+    """
+    return get_generation(get_cache(), ref_data_generation_key(site_id))
+
+
+def get_generation(cache, generation_key):
+    generation = cache.get(generation_key)
+
+    if generation is None:
+        # start from the clock rather than zero, so that values cached before an eviction can't come back
+        cache.add(generation_key, int(time.time() * 1000), None)
+        generation = cache.get(generation_key)
+
+    return generation
+
+
+def get_post(site_id=None, post_type=None, using=None, **lookup):
+    """
+    Get a single post by wp_id, slug, or guid, from the cache if possible, else from the db.
+    The post's author, tags, categories, and attachments are cached with it.
+
+    Example: get_post(slug="hello-world", post_type="post")
+
+    :param site_id: the WordPress site ID; if not given, we use the WP_API_SITE_ID value in settings
+    :param post_type: limit the lookup to a post type, since slugs are only unique within a type
+    :param using: the database alias to read from on a miss; if not given, leave it to the database routers
+    :param lookup: exactly one of wp_id, slug, or guid
+    :return: the Post, or None if it doesn't exist
+    """
+    if len(lookup) != 1 or list(lookup)[0] not in LOOKUPS:
+        raise ValueError("Must look up posts by exactly one of: {}".format(", ".join(LOOKUPS)))
+
+    site_id = _site_id(site_id)
+    field, value = list(lookup.items())[0]
+    key = post_key(site_id, field, value, post_type)
+    cache = get_cache()
+
+    # cache a 1-tuple so that we can tell a cached "does not exist" apart from a miss
+    cached = cache.get(key)
+    if cached is not None:
+        _count("hits")
+        return cached[0]
+
+    _count("misses")
+    posts = Post.objects.db_manager(using).for_site(site_id).filter(**lookup)
+    if post_type:
+        posts = posts.of_type(post_type)
+    post = posts.with_relations().order_by("-post_date").first()
+
+    cache.set(key, (post,), get_timeout())
+    return post
+
+
+def get_posts(site_id=None, post_type="post", status="publish", page=1, per_page=20, using=None):
+    """
+    Get a page of a post listing, newest first, from the cache if possible, else from the db.
+    Listings are invalidated whenever a post on the site is sync'd.
+
+    :param site_id: the WordPress site ID; if not given, we use the WP_API_SITE_ID value in settings
+    :param post_type: post, page, attachment, etc.
+    :param status: publish, draft, etc.
+    :param page: the 1-based page number
+    :param per_page: the number of posts per page
+    :param using: the database alias to read from on a miss; if not given, leave it to the database routers
+    :return: a list of Posts
+    """
+    site_id = _site_id(site_id)
+    cache = get_cache()
+
+    generation = get_listing_generation(cache, site_id)
+    key = "wordpress:posts:{}:{}:{}:{}:{}:{}".format(site_id, generation, post_type, status, page, per_page)
+
+    posts = cache.get(key)
+    if posts is not None:
+        _count("hits")
+        return posts
+
+    _count("misses")
+    offset = (page - 1) * per_page
+    posts = list(Post.objects.db_manager(using).for_site(site_id)
+                             .of_type(post_type)
+                             .filter(status=status)
+                             .for_listing()[offset:offset + per_page])
+
+    cache.set(key, posts, get_timeout())
+    return posts
+
+
+def invalidate_posts(site_id, posts):
+    """
+    Remove cached lookups for the given posts, and expire the site's cached listings.
+    Called by the loader for posts it inserts, updates, or deletes.
+
+    :param site_id: the WordPress site ID
+    :param posts: (wp_id, slug, guid, post_type) tuples; for updated posts, include both the old and new values
+    :return: None
+    """
+    keys = set()
+    for post in posts:
+        post_type = post[3]
+        for lookup, value in zip(LOOKUPS, post[:3]):
+            if value is not None and value != "":
+                keys.add(post_key(site_id, lookup, value))
+                if post_type:
+                    keys.add(post_key(site_id, lookup, value, post_type))
+
+    if not keys:
+        return
+
+    cache = get_cache()
+    cache.delete_many(list(keys))
+
+    # listings are keyed by generation, so bumping it expires all of the site's listings at once
+    bump_generation(cache, listing_generation_key(site_id))
+
+
+def invalidate_ref_data(site_id):
+    """
+    Expire ref data kept in memory by other processes, such as the webhook's workers.
+    Called by the loader after it purges or reloads tags, categories, authors, or media.
+
+    :param site_id: the WordPress site ID
+    :return: None
+    """
+    bump_generation(get_cache(), ref_data_generation_key(site_id))
+
+
+def bump_generation(cache, generation_key):
+    try:
+        cache.incr(generation_key)
+    except ValueError:
+        cache.add(generation_key, int(time.time() * 1000), None)
@@ -0,0 +1,155 @@
+from __future__ import unicode_literals
+
+import logging
+import threading
+import time
+
+from django.db import close_old_connections, reset_queries
+import requests
+
+from wordpress.loading import WPAPILoader
+
+
+logger = logging.getLogger(__name__)
+
+
+class ChangeCounter(object):
+    """
+    A metrics sink that counts the posts a sync inserted or updated.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def timing(self, name, value, tags):
+        pass
+
+    def incr(self, name, value, tags):
+        if name in ("posts.inserted", "posts.updated"):
+            self.count += value
+
+
+class SiteSchedule(object):
+    """
+    A site's warm loader, and when to sync it next.
+    """
+
+    def __init__(self, loader, interval):
+        self.loader = loader
+        self.changes = ChangeCounter()
+        self.loader.metrics.sinks.append(self.changes)
+        self.interval = interval
+        self.next_sync = 0
+        self.next_ref_data_sync = 0
+
+
+class SyncDaemon(object):
+    """
+    Keeps sites in sync by polling the WordPress.com API, with one long-lived loader per site.
+
+    Each site is polled more often while its posts are changing, and less often while they aren't:
+    after a sync that changed anything, the site's interval drops to min_interval,
+    and after one that didn't, it grows by the backoff factor, up to max_interval.
+
+    Loaders keep their HTTP connections and ref data maps between syncs, and ref data (tags, categories, authors, and
+    media) is only crawled every ref_data_interval; posts that refer to new ref data still bring it in as they load.
+
+    stop() ends the daemon after the page of posts it's on, so it can be called from a signal handler.
+    """
+
+    def __init__(self, site_ids, min_interval=30, max_interval=900, backoff=2.0, ref_data_interval=3600,
+                 type="all", status="publish", batch_size=None, using=None):
+        """
+        :param site_ids: the WordPress site IDs to sync
+        :param min_interval: the number of seconds between syncs of a site whose posts are changing
+        :param max_interval: the max number of seconds between syncs of a site
+        :param backoff: the factor to grow a site's interval by after a sync that didn't change anything
+        :param ref_data_interval: the number of seconds between crawls of a site's ref data
+        :param type: the type of content to sync, as for load_site()
+        :param status: the post status to sync, as for load_site()
+        :param batch_size: the number of posts to request per page, as for load_site()
+        :param using: the database alias to sync to; if not given, leave it to settings and routers
+        """
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.ref_data_interval = ref_data_interval
+        self.type = type
+        self.status = status
+        self.batch_size = batch_size
+        self.stop_event = threading.Event()
+
+        self.sites = []
+        for site_id in site_ids:
+            loader = WPAPILoader(site_id=site_id,
+                                 using=using,
+                                 session=requests.Session(),
+                                 keep_ref_data_map=True,
+                                 stop_event=self.stop_event)
+            self.sites.append(SiteSchedule(loader, min_interval))
+
+    def stop(self, *args):
+        """
+        Stop after the current page of posts. Takes and ignores a signal handler's args.
+        """
+        self.stop_event.set()
+
+    def run(self, once=False):
+        """
+        Sync sites as they come due, until stopped.
+
+        :param once: sync each site once, then return
+        :return: None
+        """
+        num_synced = 0
+        while not (once and num_synced >= len(self.sites)):
+            site = min(self.sites, key=lambda site: site.next_sync)
+
+            # wait for the site to come due, or for a stop
+            if self.stop_event.wait(max(site.next_sync - time.time(), 0)):
+                break
+
+            self.sync(site)
+            num_synced += 1
+
+            if self.stop_event.is_set():
+                break
+
+    def sync(self, site):
+        """
+        Sync a site's new and changed content, and schedule its next sync.
+
+        :param site: the SiteSchedule
+        :return: the number of posts inserted or updated
+        """
+        loader = site.loader
+        site.changes.count = 0
+        start = time.time()
+
+        # like a request, so that a long-lived process doesn't hold a dead connection or build up queries in DEBUG
+        close_old_connections()
+        reset_queries()
+        try:
+            if self.type == "all" and start < site.next_ref_data_sync:
+                for post_type in ["attachment", "post", "page"]:
+                    loader.load_site(type=post_type, status=self.status, batch_size=self.batch_size)
+                    if loader.stopping():
+                        break
+            else:
+                loader.load_site(type=self.type, status=self.status, batch_size=self.batch_size)
+                if self.type in ("all", "ref_data"):
+                    site.next_ref_data_sync = start + self.ref_data_interval
+        except Exception:
+            logger.exception("Error syncing site_id=%s", loader.site_id)
+        finally:
+            close_old_connections()
+
+        if site.changes.count:
+            site.interval = self.min_interval
+        else:
+            site.interval = min(site.interval * self.backoff, self.max_interval)
+        site.next_sync = time.time() + site.interval
+
+        logger.info("synced site_id=%s in %.1fs: %d posts changed, next sync in %ds",
+                    loader.site_id, time.time() - start, site.changes.count, site.interval)
+        return site.changes.count
@@ -0,0 +1,256 @@
+from __future__ import unicode_literals
+
+import base64
+import copy
+import json
+import zlib
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import models
+from django.utils.translation import ugettext_lazy as _
+from jsonfield.encoder import JSONEncoder
+from jsonfield.fields import JSONFormField
+import six
+
+
+# marks a stored value as compressed; the unit separator control character doesn't occur in real content
+COMPRESSED_PREFIX = "\x1fzlib:"
+
+
+def compression_enabled():
+    """
+    Compression is opt-in, with WP_API_COMPRESS_CONTENT = True in settings.
+    """
+    return getattr(settings, "WP_API_COMPRESS_CONTENT", False)
+
+
+def is_compressed(value):
+    return isinstance(value, six.string_types) and value.startswith(COMPRESSED_PREFIX)
+
+
+def compress(value):
+    """
+    Compress a string for storage, if it's long enough for that to be worthwhile.
+    The min length can be set with WP_API_COMPRESS_MIN_LENGTH in settings (default: 256 characters).
+
+    :param value: the string
+    :return: the compressed string, or the original if it's None, short, or already compressed
+    """
+    if not isinstance(value, six.string_types) or is_compressed(value):
+        return value
+
+    if len(value) < getattr(settings, "WP_API_COMPRESS_MIN_LENGTH", 256):
+        return value
+
+    compressed = COMPRESSED_PREFIX + base64.b64encode(zlib.compress(value.encode("utf-8"))).decode("ascii")
+
+    # random-ish data can come out bigger
+    if len(compressed) >= len(value):
+        return value
+
+    return compressed
+
+
+def decompress(value):
+    """
+    Restore a string stored by compress(). Other values are returned as is,
+    so this is safe to call on values stored before compression was enabled.
+    """
+    if not is_compressed(value):
+        return value
+
+    return zlib.decompress(base64.b64decode(value[len(COMPRESSED_PREFIX):].encode("ascii"))).decode("utf-8")
+
+
+class CompressedDescriptor(object):
+    """
+    Holds the stored value on the instance, and only decompresses it when the attribute is first read.
+    """
+
+    def __init__(self, field):
+        self.field = field
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            raise AttributeError("Can only be accessed via an instance.")
+
+        value = instance.__dict__[self.field.attname]
+        if is_compressed(value):
+            value = instance.__dict__[self.field.attname] = decompress(value)
+
+        return value
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.attname] = value
+
+
+class CompressedTextField(models.TextField):
+    """
+    A TextField that's compressed when saved, if WP_API_COMPRESS_CONTENT is enabled,
+    and decompressed lazily when the attribute is read.
+
+    Rows stored before compression was enabled are read as is, so it's safe to turn on at any time.
+    Note that values() and values_list() return the stored (possibly compressed) value; use decompress() on it.
+    Lookups such as icontains only work on uncompressed rows.
+    """
+    description = _("Text (compressed)")
+
+    def contribute_to_class(self, cls, name, **kwargs):
+        super(CompressedTextField, self).contribute_to_class(cls, name, **kwargs)
+        setattr(cls, self.attname, CompressedDescriptor(self))
+
+    def pre_save(self, model_instance, add):
+        # save the stored value directly, so that content that was never read isn't decompressed and compressed again
+        if self.attname in model_instance.__dict__:
+            return model_instance.__dict__[self.attname]
+        return super(CompressedTextField, self).pre_save(model_instance, add)
+
+    def get_db_prep_save(self, value, connection):
+        value = super(CompressedTextField, self).get_db_prep_save(value, connection)
+        if compression_enabled():
+            value = compress(value)
+        return value
+
+
+class RawJSON(six.text_type):
+    """
+    JSON as stored in the db (possibly compressed), not decoded yet.
+    """
+
+
+class LazyJSONDescriptor(object):
+    """
+    Holds the stored JSON on the instance, and only decodes it when the attribute is first read.
+    """
+
+    def __init__(self, field):
+        self.field = field
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            raise AttributeError("Can only be accessed via an instance.")
+
+        value = instance.__dict__[self.field.attname]
+        if isinstance(value, RawJSON):
+            value = instance.__dict__[self.field.attname] = self.field.loads(value)
+
+        return value
+
+    def __set__(self, instance, value):
+        # like jsonfield, strings are only taken to be JSON when an instance is being loaded from the db
+        if isinstance(value, six.string_types) and instance._state.adding and instance.pk is not None:
+            value = RawJSON(value)
+        instance.__dict__[self.field.attname] = value
+
+
+class LazyJSONField(models.TextField):
+    """
+    A drop-in replacement for jsonfield's JSONField that decodes lazily, when the attribute is first read.
+
+    Until then the instance holds the stored JSON, which is saved back as is, without being decoded and encoded again.
+    Once read, the value is serialized on save like any other, since it may have been changed in place.
+    """
+    description = _("JSON (decoded lazily)")
+    form_class = JSONFormField
+
+    def __init__(self, *args, **kwargs):
+        self.dump_kwargs = kwargs.pop("dump_kwargs", {
+            "cls": JSONEncoder,
+            "separators": (",", ":")
+        })
+        self.load_kwargs = kwargs.pop("load_kwargs", {})
+
+        super(LazyJSONField, self).__init__(*args, **kwargs)
+
+    def contribute_to_class(self, cls, name, **kwargs):
+        super(LazyJSONField, self).contribute_to_class(cls, name, **kwargs)
+        setattr(cls, self.attname, LazyJSONDescriptor(self))
+
+    def loads(self, value):
+        try:
+            return json.loads(decompress(value), **self.load_kwargs)
+        except ValueError:
+            raise ValidationError(_("Enter valid JSON"))
+
+    def to_python(self, value):
+        # the descriptor decodes; this is still needed by Django's deserializers
+        return value
+
+    def pre_save(self, model_instance, add):
+        # save the stored JSON directly if the value was never read
+        if self.attname in model_instance.__dict__:
+            return model_instance.__dict__[self.attname]
+        return super(LazyJSONField, self).pre_save(model_instance, add)
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if isinstance(value, RawJSON):
+            return six.text_type(value)
+        if self.null and value is None:
+            return None
+        return json.dumps(value, **self.dump_kwargs)
+
+    def value_to_string(self, obj):
+        return json.dumps(self._get_val_from_obj(obj), **self.dump_kwargs)
+
+    def value_from_object(self, obj):
+        value = super(LazyJSONField, self).value_from_object(obj)
+        if self.null and value is None:
+            return None
+        return json.dumps(value, **self.dump_kwargs)
+
+    def formfield(self, **kwargs):
+        kwargs.setdefault("form_class", self.form_class)
+        field = super(LazyJSONField, self).formfield(**kwargs)
+
+        if isinstance(field, JSONFormField):
+            field.load_kwargs = self.load_kwargs
+
+        if not field.help_text:
+            field.help_text = "Enter valid JSON"
+
+        return field
+
+    def get_default(self):
+        # unlike Field.get_default(), don't coerce the default to a string
+        if self.has_default():
+            if callable(self.default):
+                return self.default()
+            return copy.deepcopy(self.default)
+        return super(LazyJSONField, self).get_default()
+
+
+class CompressedJSONField(LazyJSONField):
+    """
+    A LazyJSONField whose serialized JSON is compressed when saved, if WP_API_COMPRESS_CONTENT is enabled.
+    """
+
+    def get_db_prep_save(self, value, connection):
+        value = super(CompressedJSONField, self).get_db_prep_save(value, connection)
+        if compression_enabled():
+            value = compress(value)
+        return value
+
+
+def stored_value(field, value):
+    """
+    Convert a value for a field to the form it's stored in, ahead of saving, without a db connection:
+    JSON is encoded, text and JSON are compressed for compressed fields (if enabled), and dates are parsed.
+    Saving the result stores the same thing as saving the value itself.
+
+    :param field: the model field
+    :param value: the value
+    :return: the value to save
+    """
+    if isinstance(field, LazyJSONField):
+        if isinstance(value, RawJSON) or (field.null and value is None):
+            return value
+        value = json.dumps(value, **field.dump_kwargs)
+        if isinstance(field, CompressedJSONField) and compression_enabled():
+            value = compress(value)
+        return RawJSON(value)
+
+    value = field.to_python(value)
+    if isinstance(field, CompressedTextField) and compression_enabled():
+        value = compress(value)
+    return value
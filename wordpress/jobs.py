@@ -0,0 +1,144 @@
+from __future__ import unicode_literals
+
+import datetime
+import logging
+import os
+import socket
+import uuid
+
+from django.conf import settings
+from django.db import IntegrityError, router, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from wordpress.models import PostSyncJob
+from wordpress import webhooks
+
+
+logger = logging.getLogger(__name__)
+
+
+def is_enabled():
+    """
+    The webhook queues posts in the db, rather than loading them in web processes,
+    with WP_API_WEBHOOK_QUEUE = True in settings.
+    """
+    return getattr(settings, "WP_API_WEBHOOK_QUEUE", False)
+
+
+def enqueue_post(site_id, wp_post_id, using=None):
+    """
+    Request a load of a post by a queue worker.
+    If the post is already queued, the request is merged into that job.
+
+    :param site_id: the WordPress site ID
+    :param wp_post_id: the WordPress post ID
+    :param using: the database alias of the queue; if not given, leave it to the database routers
+    :return: None
+    """
+    using = using or router.db_for_write(PostSyncJob)
+    jobs = PostSyncJob.objects.using(using).filter(site_id=site_id, wp_id=wp_post_id)
+    now = timezone.now()
+
+    if jobs.update(requested_at=now, version=F("version") + 1):
+        return
+
+    try:
+        with transaction.atomic(using=using):
+            PostSyncJob.objects.using(using).create(site_id=site_id, wp_id=wp_post_id, requested_at=now)
+    except IntegrityError:
+        # another request created it first
+        jobs.update(requested_at=now, version=F("version") + 1)
+
+
+def claim_jobs(batch_size=10, debounce=None, claim_timeout=600, using=None):
+    """
+    Claim a batch of jobs for this worker, oldest first.
+
+    Rows are locked while they're claimed, and the claim is a conditional update, so each job is only claimed by one
+    worker even on databases without row locking. Claims older than claim_timeout, e.g. from a worker that died,
+    can be claimed again.
+
+    :param batch_size: the max number of jobs to claim
+    :param debounce: only claim jobs that haven't been requested again for this many seconds;
+                     if not given, we use WP_API_WEBHOOK_DEBOUNCE
+    :param claim_timeout: the number of seconds after which a claim expires
+    :param using: the database alias of the queue; if not given, leave it to the database routers
+    :return: a list of claimed PostSyncJobs
+    """
+    using = using or router.db_for_write(PostSyncJob)
+    debounce = webhooks.get_debounce() if debounce is None else debounce
+    now = timezone.now()
+    token = "{}:{}:{}".format(socket.gethostname(), os.getpid(), uuid.uuid4().hex)[-100:]
+
+    unclaimed = Q(claimed_at__isnull=True) | Q(claimed_at__lt=now - datetime.timedelta(seconds=claim_timeout))
+    claimable = (PostSyncJob.objects.using(using)
+                                    .filter(requested_at__lte=now - datetime.timedelta(seconds=debounce))
+                                    .filter(unclaimed))
+
+    with transaction.atomic(using=using):
+        pks = list(claimable.select_for_update().order_by("requested_at").values_list("pk", flat=True)[:batch_size])
+        if not pks:
+            return []
+        claimable.filter(pk__in=pks).update(claimed_at=now, claimed_by=token)
+
+    return list(PostSyncJob.objects.using(using).filter(claimed_by=token).order_by("requested_at"))
+
+
+def complete_job(job, using=None):
+    """
+    Remove a job after its post was loaded, unless the post was requested again while it was loading,
+    in which case it's released to be loaded again.
+    """
+    using = using or job._state.db
+    jobs = PostSyncJob.objects.using(using).filter(pk=job.pk, claimed_by=job.claimed_by)
+
+    jobs.filter(version=job.version).delete()
+    # if it's still there, it was requested again
+    jobs.update(claimed_at=None, claimed_by=None, attempts=0)
+
+
+def fail_job(job, max_attempts=5, using=None):
+    """
+    Release a job whose post couldn't be loaded, to be retried; or drop it after max_attempts.
+    """
+    using = using or job._state.db
+    jobs = PostSyncJob.objects.using(using).filter(pk=job.pk, claimed_by=job.claimed_by)
+
+    if job.attempts + 1 >= max_attempts:
+        logger.error("Giving up on post site_id=%s, wp_post_id=%s after %d attempts",
+                     job.site_id, job.wp_id, job.attempts + 1)
+        jobs.delete()
+    else:
+        jobs.update(claimed_at=None, claimed_by=None, attempts=F("attempts") + 1)
+
+
+def process_jobs(batch_size=10, debounce=None, claim_timeout=600, max_attempts=5, using=None, handler=None):
+    """
+    Claim a batch of jobs, and load their posts.
+
+    :param batch_size: the max number of jobs to claim
+    :param debounce: see claim_jobs()
+    :param claim_timeout: see claim_jobs()
+    :param max_attempts: the number of times to try loading a post before giving up on it
+    :param using: the database alias of the queue; if not given, leave it to the database routers
+    :param handler: called with (site_id, wp_post_id) to load a post, returning the Post, or None on failure;
+                    if not given, we use wordpress.webhooks.load_post
+    :return: the number of jobs processed
+    """
+    handler = handler or webhooks.load_post
+    jobs = claim_jobs(batch_size=batch_size, debounce=debounce, claim_timeout=claim_timeout, using=using)
+
+    for job in jobs:
+        try:
+            post = handler(job.site_id, job.wp_id)
+        except Exception:
+            logger.exception("Error loading post site_id=%s, wp_post_id=%s", job.site_id, job.wp_id)
+            post = None
+
+        if post:
+            complete_job(job)
+        else:
+            fail_job(job, max_attempts=max_attempts)
+
+    return len(jobs)
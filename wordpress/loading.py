@@ -1,14 +1,33 @@
 from __future__ import unicode_literals
 
+from collections import deque
+from contextlib import contextmanager
+import itertools
+import json
 import logging
+import math
 from datetime import datetime, timedelta
 
 from django.conf import settings
+from django.db import connections, router
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
 import requests
 import six
-
-from wordpress.models import Tag, Category, Author, Post, Media
-from wordpress.utils import int_or_None
+from six.moves import queue
+
+from wordpress.backends import Prefetch, WPComBackend, get_api_version, get_backend
+from wordpress.cache import get_ref_data_generation, invalidate_posts, invalidate_ref_data
+from wordpress.fields import stored_value
+from wordpress.metrics import Metrics
+from wordpress.models import Tag, Category, Author, Post, Media, SyncState
+from wordpress.pipeline import Pipeline, Stage, get_pipeline_queue_size, get_pipeline_workers
+from wordpress.purging import purge_queryset
+from wordpress.querytracking import track_queries
+from wordpress.refdata import RefDataIndex, RefRecord, checksum
+from wordpress.routers import get_sync_database
+from wordpress import search
+from wordpress.utils import int_or_None, chunked
 
 
 logger = logging.getLogger(__name__)
@@ -16,7 +35,8 @@ logger = logging.getLogger(__name__)
 
 class WPAPILoader(object):
 
-    def __init__(self, site_id=None, api_base_url=None):
+    def __init__(self, site_id=None, api_base_url=None, using=None, session=None, ref_data_cache=None, metrics=None,
+                 keep_ref_data_map=False, stop_event=None, api_version=None):
         """
         Set up a loader object to sync content from a WordPress.com site to a local Django site.
 
@@ -24,7 +44,25 @@ class WPAPILoader(object):
                         This must be int (to save local db space).
                         If not given, we use the WP_API_SITE_ID value in settings.
         :param api_base_url: Override WP API url for proxies, etc.
-                             If not given, we use the standard URL: https://public-api.wordpress.com/rest/v1.1/
+                             If not given, we use WP_API_BASE_URL in settings,
+                             else the standard URL: https://public-api.wordpress.com/rest/v1.1/
+        :param using: The database alias to read from and write to.
+                      If not given, we use the site's database in WP_API_SITE_DATABASES, or WP_API_DATABASE_WRITE,
+                      else leave it to the database routers.
+        :param session: A requests Session to send API requests with, to reuse connections across requests.
+                        If not given, each request uses a new connection.
+        :param ref_data_cache: A RefDataCache to keep ref data in memory across single post loads.
+                               If not given, each load_post() looks up its ref data in the db.
+        :param metrics: A Metrics to send timers and counters to.
+                        If not given, we use one with the sinks in WP_API_METRICS_SINKS.
+        :param keep_ref_data_map: If True, keep the ref data map in memory between load_site() calls,
+                                  only reloading it from the db when the site's ref data is purged or reloaded.
+                                  This is for long-lived loaders, such as the sync daemon's.
+        :param stop_event: A threading.Event that, once set, stops load_site() after the page of posts it's on.
+                           The interrupted crawl resumes from its checkpoint on the next run.
+        :param api_version: The API to sync from: "v1.1" for the WordPress.com REST API, or "v2" for the core
+                            WordPress REST API of a self-hosted site, at api_base_url.
+                            If not given, we use WP_API_VERSION in settings, else "v1.1".
         :return: None
         """
         if site_id is not None:
@@ -40,19 +78,49 @@ class WPAPILoader(object):
                 logger.exception("Must provide int site_id as an integer kwarg or in settings.")
                 raise
 
-        self.api_base_url = api_base_url or "https://public-api.wordpress.com/rest/v1.1/"
+        self.api_version = api_version or get_api_version()
+        default_api_base_url = WPComBackend.default_api_base_url if self.api_version == "v1.1" else None
+        self.api_base_url = api_base_url or getattr(settings, "WP_API_BASE_URL", None) or default_api_base_url
+        self.using = using or get_sync_database(self.site_id)
+        self.session = session
+        self.ref_data_cache = ref_data_cache
+        self.metrics = metrics or Metrics()
+        self.keep_ref_data_map = keep_ref_data_map
+        self.stop_event = stop_event
+
+        # the max number of ref data pages to request at once, from WP_API_FETCH_CONCURRENCY in settings
+        self.fetch_concurrency = max(int(getattr(settings, "WP_API_FETCH_CONCURRENCY", 4)), 1)
+
+        self.ref_data_map = None
+        # the ref data generation the kept ref data map was loaded at
+        self.ref_data_map_generation = None
 
         # useful for displaying warnings only once, etc.
         self.first_get = True
 
+        # (wp_id, slug, guid, post_type) of posts written since the cache was last invalidated
+        self.changed_posts = []
+
+        # translates requests and responses for the API version
+        self.backend = get_backend(self, self.api_version)
+
     def get(self, path, params=None):
         """
-        Send a GET request to the Wordpress REST API v1.1 and return the response
+        Send a GET request to the Wordpress REST API v1.1, or its equivalent in the site's API, and return the response
         :param path: aka resource
         :param params: querystring args
+        :return: requests.reponse object, or a response-like object with v1.1 data
+        """
+        return self.backend.get(path, params)
+
+    def request(self, api_url, params=None, endpoint=None):
+        """
+        Send a GET request to an API URL, with the auth token, and return the response
+        :param api_url: the full URL
+        :param params: querystring args
+        :param endpoint: the name of the endpoint, for metrics
         :return: requests.reponse object
         """
-        api_url = self.api_base_url + path
 
         headers = None
         try:
@@ -65,7 +133,41 @@ class WPAPILoader(object):
 
         self.first_get = False
 
-        return requests.get(api_url, headers=headers, params=params)
+        with self.metrics.timer("api.request", endpoint=endpoint):
+            response = (self.session or requests).get(api_url, headers=headers, params=params)
+
+        self.metrics.incr("api.requests", endpoint=endpoint)
+        if isinstance(response.content, six.binary_type):
+            self.metrics.incr("api.bytes", len(response.content), endpoint=endpoint)
+
+        return response
+
+    @staticmethod
+    def endpoint_name(path):
+        """
+        Name an API path for metrics, without the IDs in it, e.g. sites/123/posts/456 -> posts
+        """
+        parts = [part for part in path.split("/") if part and not part.lstrip("-").isdigit()]
+        if parts and parts[0] == "sites":
+            parts = parts[1:]
+        return ".".join(parts)
+
+    @contextmanager
+    def tracking(self):
+        """
+        Attribute db queries to the current metrics phase within a block, and send the totals at the end of it.
+        Queries aren't tracked if there are no metrics sinks.
+        """
+        if not self.metrics.sinks:
+            yield
+            return
+
+        connection = connections[self.using or router.db_for_write(Post)]
+        try:
+            with track_queries(connection, lambda sql, params, duration: self.metrics.record_query(duration)):
+                yield
+        finally:
+            self.metrics.flush()
 
     def load_post(self, wp_post_id):
         """
@@ -82,12 +184,14 @@ class WPAPILoader(object):
 
             api_post = response.json()
 
-            self.get_ref_data_map(bulk_mode=False)
-            self.load_wp_post(api_post, bulk_mode=False)
+            with self.tracking(), self.metrics.phase("posts"):
+                self.get_ref_data_map(bulk_mode=False)
+                self.load_wp_post(api_post, bulk_mode=False)
+                self.flush_changed_posts()
 
             # the post should exist in the db now, so return it so that callers can work with it
             try:
-                post = Post.objects.get(site_id=self.site_id, wp_id=wp_post_id)
+                post = Post.objects.using(self.using).get(site_id=self.site_id, wp_id=wp_post_id)
             except Exception as ex:
                 logger.exception("Unable to load post with wp_post_id={}:\n{}".format(wp_post_id, ex.message))
             else:
@@ -134,22 +238,156 @@ class WPAPILoader(object):
         if status is None:
             status = "publish"
 
-        if type in ["all", "ref_data"]:
-            self.load_categories()
-            self.load_tags()
-            self.load_authors()
-            self.load_media()
+        with self.tracking():
+            if type in ["all", "ref_data"]:
+                try:
+                    with self.metrics.phase("ref_data"):
+                        self.load_categories()
+                        self.load_tags()
+                        self.load_authors()
+                        self.load_media()
+                finally:
+                    # other processes may have ref data in memory that's out of date now
+                    invalidate_ref_data(self.site_id)
+
+            # get ref data into memory for faster lookups
+            if type in ["all", "attachment", "post", "page"]:
+                with self.metrics.phase("ref_data"):
+                    self.get_ref_data_map()
+
+            # load posts of each type that we need
+            with self.metrics.phase("posts"):
+                if type == "all":
+                    for post_type in ["attachment", "post", "page"]:
+                        if self.stopping():
+                            break
+                        self.load_posts(post_type=post_type, status=status)
+                elif type in ["attachment", "post", "page"]:
+                    self.load_posts(post_type=type, status=status)
+
+    def stopping(self):
+        """
+        Has the loader been asked to stop, with its stop_event?
+        """
+        return bool(self.stop_event and self.stop_event.is_set())
+
+    def reconcile_site(self, type=None, status=None, action="delete"):
+        """
+        Find local posts that have been deleted on the WordPress side, or no longer have the given status,
+        by listing only the IDs of the site's posts, and delete them or mark them as trash.
+
+        This is much cheaper than a purge and full sweep, since the listing doesn't include post content.
+
+        :param type: the type(s) of posts to reconcile: all, attachment, post, or page
+        :param status: the post status to reconcile, e.g. publish (default), or any
+        :param action: "delete" to delete extra posts, or "trash" to set their status to trash
+        :return: the number of extra posts found
+        """
+        if type is None or type == "all":
+            post_types = ["attachment", "post", "page"]
+        elif type in ["attachment", "post", "page"]:
+            post_types = [type]
+        else:
+            logger.warning("Only posts can be reconciled, not type=%s", type)
+            return 0
 
-        # get ref data into memory for faster lookups
-        if type in ["all", "attachment", "post", "page"]:
-            self.get_ref_data_map()
+        return sum(self.reconcile_posts(post_type=post_type, status=status, action=action) for post_type in post_types)
 
-        # load posts of each type that we need
-        if type == "all":
-            for post_type in ["attachment", "post", "page"]:
-                self.load_posts(post_type=post_type, status=status)
-        elif type in ["attachment", "post", "page"]:
-            self.load_posts(post_type=type, status=status)
+    def reconcile_posts(self, post_type="post", status=None, action="delete", max_pages=1000):
+        """
+        Delete or mark as trash the local posts of a given post_type and status that are no longer in the API.
+
+        Nothing is changed unless the listing of IDs is complete, so an API error can't cause posts to be removed.
+
+        :param post_type: post, page, attachment, or any custom post type set up in the WP API
+        :param status: the post status, e.g. publish (default), or any
+        :param action: "delete" to delete extra posts, or "trash" to set their status to trash
+        :param max_pages: kill counter to avoid infinite looping
+        :return: the number of extra posts found
+        """
+        if action not in ("delete", "trash"):
+            raise ValueError("action must be delete or trash, not {}".format(action))
+
+        status = status or "publish"
+        logger.info("reconciling posts with post_type=%s, status=%s", post_type, status)
+
+        api_modified = self.get_api_post_modified_dates(post_type, status, max_pages)
+        if api_modified is None:
+            logger.warning("Unable to list all post IDs, so not reconciling post_type=%s, status=%s", post_type, status)
+            return 0
+
+        posts = Post.objects.using(self.using).filter(site_id=self.site_id, post_type=post_type)
+        if status != "any":
+            posts = posts.filter(status=status)
+
+        extra_wp_ids = []
+        num_out_of_date = 0
+        for wp_id, modified in posts.values_list("wp_id", "modified").iterator():
+            if wp_id not in api_modified:
+                extra_wp_ids.append(wp_id)
+            elif api_modified[wp_id] and modified and api_modified[wp_id] > modified:
+                num_out_of_date += 1
+
+        for wp_ids_chunk in chunked(extra_wp_ids, 500):
+            extra_posts = posts.filter(wp_id__in=wp_ids_chunk)
+            self.changed_posts.extend(extra_posts.values_list("wp_id", "slug", "guid", "post_type"))
+            if action == "delete":
+                purge_queryset(extra_posts)
+            else:
+                extra_posts.update(status="trash")
+            self.flush_changed_posts()
+
+        logger.info(" - %s %d posts no longer in the API", "deleted" if action == "delete" else "trashed", len(extra_wp_ids))
+        if num_out_of_date:
+            logger.info(" - %d posts have been modified since they were last loaded", num_out_of_date)
+
+        return len(extra_wp_ids)
+
+    def get_api_post_modified_dates(self, post_type, status, max_pages=1000):
+        """
+        List the IDs and modified dates of all of the site's posts of a given post_type and status,
+        requesting only those fields so that pages are small.
+
+        :param post_type: post, page, attachment, or any custom post type set up in the WP API
+        :param status: the post status, or any
+        :param max_pages: kill counter to avoid infinite looping
+        :return: a dict of modified dates keyed by post ID, or None if the listing couldn't be completed
+        """
+        path = "sites/{}/posts".format(self.site_id)
+        params = {"number": 100, "type": post_type, "status": status, "fields": "ID,modified"}
+        api_modified = {}
+        found = None
+        page = 1
+
+        response = self.get(path, params)
+
+        while True:
+            if not response.ok:
+                logger.warning("Response NOT OK! status_code=%s\n%s", response.status_code, response.text)
+                return None
+
+            api_json = response.json()
+            found = api_json.get("found")
+            api_posts = api_json.get("posts", [])
+            for api_post in api_posts:
+                api_modified[api_post["ID"]] = parse_datetime(api_post["modified"]) if api_post.get("modified") else None
+
+            next_page_handle = api_json.get("meta", {}).get("next_page")
+            if not api_posts or not next_page_handle:
+                break
+
+            page += 1
+            if page > max_pages:
+                return None
+
+            params["page_handle"] = next_page_handle
+            response = self.get(path, params)
+
+        # posts can move between pages while we list them, so make sure we've seen them all
+        if found is not None and len(api_modified) < found:
+            return None
+
+        return api_modified
 
     def load_categories(self, max_pages=30):
         """
@@ -162,50 +400,160 @@ class WPAPILoader(object):
 
         # clear them all out so we don't get dupes if requested
         if self.purge_first:
-            Category.objects.filter(site_id=self.site_id).delete()
+            purge_queryset(Category.objects.using(self.using).filter(site_id=self.site_id))
 
         path = "sites/{}/categories".format(self.site_id)
         params = {"number": 100}
-        page = 1
-
-        response = self.get(path, params)
-
-        if not response.ok:
-            logger.warning("Response NOT OK! status_code=%s\n%s", response.status_code, response.text)
-
-        while response.ok and response.text and page < max_pages:
-            logger.info(" - page: %d", page)
-
-            api_categories = response.json().get("categories")
-            if not api_categories:
-                # we're done here
-                break
 
+        for api_categories in self.get_ref_data_pages(path, params, "categories", max_pages):
             categories = []
+            existing_categories = self.get_existing_objs(Category, api_categories)
             for api_category in api_categories:
 
                 # if it exists locally, update local version if anything has changed
-                existing_category = Category.objects.filter(site_id=self.site_id, wp_id=api_category["ID"]).first()
+                existing_category = existing_categories.get(api_category["ID"])
                 if existing_category:
                     self.update_existing_category(existing_category, api_category)
                 else:
                     categories.append(self.get_new_category(api_category))
 
             if categories:
-                Category.objects.bulk_create(categories)
+                Category.objects.using(self.using).bulk_create(categories)
             elif not self.full:
                 # we're done here
                 break
 
-            # get next page
-            page += 1
-            params["page"] = page
-            response = self.get(path, params)
+    def get_ref_data_pages(self, path, params, key, max_pages, offset_paging=False):
+        """
+        Get the pages of a ref data listing from the API, in order, until an empty page or an error.
 
-            if not response.ok:
-                logger.warning("Response NOT OK! status_code=%s\n%s", response.status_code, response.text)
+        The first page's "found" count tells us how many pages there are, so the rest are requested in parallel,
+        with up to fetch_concurrency requests in flight, while the pages before them are written.
+        If the caller stops early, the requests in flight are dropped.
+
+        :param path: the API path of the listing
+        :param params: querystring args, including "number" per page
+        :param key: the key of the list of objects in the API response, e.g. "categories"
+        :param max_pages: kill counter to avoid infinite looping; pages up to (not including) this one are fetched
+        :param offset_paging: if True, page with an "offset" param, for endpoints that don't have a page param
+        :return: a generator of lists of API objects, one per page
+        """
+        def page_params(page):
+            if offset_paging:
+                return dict(params, offset=(page - 1) * per_page)
+            return dict(params, page=page)
+
+        response = self.get(path, params)
+        pending = deque()
+        page = next_page = 1
+        per_page = params["number"]
+        num_pages = None
+
+        while page < max_pages:
+            api_json = self.decode_ref_data_page(response, page)
+            api_objects = api_json.get(key) if api_json else None
+            if not api_objects:
+                # we're done here
                 return
 
+            if page == 1:
+                per_page, num_pages = self.count_ref_data_pages(api_json, api_objects, per_page)
+                next_page = 2
+
+            next_page = self.prefetch_ref_data_pages(pending, path, page_params, page, next_page, num_pages, max_pages)
+
+            yield api_objects
+
+            response = self.next_prefetched_response(pending)
+            if response is None:
+                return
+            page += 1
+
+    @staticmethod
+    def decode_ref_data_page(response, page):
+        """
+        Get the JSON of a page of a ref data listing.
+
+        :param response: the API response for the page
+        :param page: the page number, for logging
+        :return: the JSON, or None if the response was an error or empty
+        """
+        if not response.ok:
+            logger.warning("Response NOT OK! status_code=%s\n%s", response.status_code, response.text)
+            return None
+        if not response.text:
+            return None
+
+        logger.info(" - page: %d", page)
+        return response.json()
+
+    @staticmethod
+    def count_ref_data_pages(api_json, api_objects, per_page):
+        """
+        Work out the size and number of pages of a ref data listing from its first page.
+
+        :param api_json: the JSON of the first page
+        :param api_objects: the objects on the first page
+        :param per_page: the number of objects per page that we asked for
+        :return: a tuple of the number of objects per page, and the number of pages, or None if the API didn't say
+        """
+        # the first page is full unless it's the only one, and the API may have capped "number"
+        found = api_json.get("found")
+        per_page = min(len(api_objects), per_page)
+        # without a count, fall back to requesting one page at a time until an empty one
+        num_pages = int(math.ceil(float(found) / per_page)) if found is not None else None
+        return per_page, num_pages
+
+    def prefetch_ref_data_pages(self, pending, path, page_params, page, next_page, num_pages, max_pages):
+        """
+        Start requests for the pages of a ref data listing after the current one,
+        keeping up to fetch_concurrency requests in flight.
+
+        :param pending: the deque of Prefetches in flight, in page order, to add to
+        :param path: the API path of the listing
+        :param page_params: a function of a page number that returns the querystring args for the page
+        :param page: the number of the current page
+        :param next_page: the number of the next page not yet requested
+        :param num_pages: the number of pages in the listing, or None if unknown
+        :param max_pages: kill counter to avoid infinite looping; pages up to (not including) this one are fetched
+        :return: the number of the next page not yet requested
+        """
+        if num_pages is None:
+            if page + 1 < max_pages:
+                pending.append(Prefetch(self.get, path, page_params(page + 1)))
+            return next_page
+
+        while next_page <= min(num_pages, max_pages - 1) and len(pending) < self.fetch_concurrency:
+            pending.append(Prefetch(self.get, path, page_params(next_page)))
+            next_page += 1
+        return next_page
+
+    @staticmethod
+    def next_prefetched_response(pending):
+        """
+        Wait for the oldest request in flight.
+
+        :param pending: the deque of Prefetches in flight, in page order
+        :return: its response, or None if there are no requests in flight
+        """
+        if not pending:
+            return None
+        return pending.popleft().result()
+
+    def get_existing_objs(self, model, api_objects):
+        """
+        Get the local copies of a page of ref data from the API, in one query per 500 objects.
+
+        :param model: Category, Tag, Author, or Media
+        :param api_objects: the API data for the page
+        :return: a dict of model instances keyed by wp_id
+        """
+        existing_objs = {}
+        for wp_ids in chunked([api_object["ID"] for api_object in api_objects], 500):
+            objs = model.objects.using(self.using).filter(site_id=self.site_id, wp_id__in=wp_ids)
+            existing_objs.update((obj.wp_id, obj) for obj in objs)
+        return existing_objs
+
     def get_new_category(self, api_category):
         """
         Instantiate a new Category from api data.
@@ -228,50 +576,29 @@ class WPAPILoader(object):
 
         # clear them all out so we don't get dupes if requested
         if self.purge_first:
-            Tag.objects.filter(site_id=self.site_id).delete()
+            purge_queryset(Tag.objects.using(self.using).filter(site_id=self.site_id))
 
         path = "sites/{}/tags".format(self.site_id)
         params = {"number": 1000}
-        page = 1
-
-        response = self.get(path, params)
-
-        if not response.ok:
-            logger.warning("Response NOT OK! status_code=%s\n%s", response.status_code, response.text)
-
-        while response.ok and response.text and page < max_pages:
-            logger.info(" - page: %d", page)
-
-            api_tags = response.json().get("tags")
-            if not api_tags:
-                # we're done here
-                break
 
+        for api_tags in self.get_ref_data_pages(path, params, "tags", max_pages):
             tags = []
+            existing_tags = self.get_existing_objs(Tag, api_tags)
             for api_tag in api_tags:
 
                 # if it exists locally, update local version if anything has changed
-                existing_tag = Tag.objects.filter(site_id=self.site_id, wp_id=api_tag["ID"]).first()
+                existing_tag = existing_tags.get(api_tag["ID"])
                 if existing_tag:
                     self.update_existing_tag(existing_tag, api_tag)
                 else:
                     tags.append(self.get_new_tag(api_tag))
 
             if tags:
-                Tag.objects.bulk_create(tags)
+                Tag.objects.using(self.using).bulk_create(tags)
             elif not self.full:
                 # we're done here
                 break
 
-            # get next page
-            page += 1
-            params["page"] = page
-            response = self.get(path, params)
-
-            if not response.ok:
-                logger.warning("Response NOT OK! status_code=%s\n%s", response.status_code, response.text)
-                return
-
     def get_new_tag(self, api_tag):
         """
         Instantiate a new Tag from api data.
@@ -294,51 +621,30 @@ class WPAPILoader(object):
 
         # clear them all out so we don't get dupes if requested
         if self.purge_first:
-            Author.objects.filter(site_id=self.site_id).delete()
+            purge_queryset(Author.objects.using(self.using).filter(site_id=self.site_id))
 
         path = "sites/{}/users".format(self.site_id)
         params = {"number": 100}
-        page = 1
-
-        response = self.get(path, params)
-
-        if not response.ok:
-            logger.warning("Response NOT OK! status_code=%s\n%s", response.status_code, response.text)
-
-        while response.ok and response.text and page < max_pages:
-            logger.info(" - page: %d", page)
-
-            api_users = response.json().get("users")
-            if not api_users:
-                # we're done here
-                break
 
+        # this endpoint doesn't have a page param, so use offset
+        for api_users in self.get_ref_data_pages(path, params, "users", max_pages, offset_paging=True):
             authors = []
+            existing_authors = self.get_existing_objs(Author, api_users)
             for api_author in api_users:
 
                 # if it exists locally, update local version if anything has changed
-                existing_author = Author.objects.filter(site_id=self.site_id, wp_id=api_author["ID"]).first()
+                existing_author = existing_authors.get(api_author["ID"])
                 if existing_author:
                     self.update_existing_author(existing_author, api_author)
                 else:
                     authors.append(self.get_new_author(api_author))
 
             if authors:
-                Author.objects.bulk_create(authors)
+                Author.objects.using(self.using).bulk_create(authors)
             elif not self.full:
                 # we're done here
                 break
 
-            # get next page
-            # this endpoint doesn't have a page param, so use offset
-            params["offset"] = page * 100
-            page += 1
-            response = self.get(path, params)
-
-            if not response.ok:
-                logger.warning("Response NOT OK! status_code=%s\n%s", response.status_code, response.text)
-                return
-
     def get_new_author(self, api_author):
         """
         Instantiate a new Author from api data.
@@ -362,50 +668,29 @@ class WPAPILoader(object):
         # clear them all out so we don't get dupes
         if self.purge_first:
             logger.warning("purging ALL media from site %s", self.site_id)
-            Media.objects.filter(site_id=self.site_id).delete()
+            purge_queryset(Media.objects.using(self.using).filter(site_id=self.site_id))
 
         path = "sites/{}/media".format(self.site_id)
         params = {"number": 100}
         self.set_media_params_after(params)
-        page = 1
-
-        response = self.get(path, params)
-
-        if not response.ok:
-            logger.warning("Response NOT OK! status_code=%s\n%s", response.status_code, response.text)
-
-        while response.ok and response.text and page < max_pages:
-            logger.info(" - page: %d", page)
-
-            api_medias = response.json().get("media")
-            if not api_medias:
-                # we're done here
-                break
 
+        for api_medias in self.get_ref_data_pages(path, params, "media", max_pages):
             medias = []
+            existing_medias = self.get_existing_objs(Media, api_medias)
             for api_media in api_medias:
 
                 # exclude media items that are not attached to posts (for now)
                 if api_media["post_ID"] != 0:
 
                     # if it exists locally, update local version if anything has changed
-                    existing_media = Media.objects.filter(site_id=self.site_id, wp_id=api_media["ID"]).first()
+                    existing_media = existing_medias.get(api_media["ID"])
                     if existing_media:
                         self.update_existing_media(existing_media, api_media)
                     else:
                         medias.append(self.get_new_media(api_media))
 
             if medias:
-                Media.objects.bulk_create(medias)
-
-            # get next page
-            page += 1
-            params["page"] = page
-            response = self.get(path, params)
-
-            if not response.ok:
-                logger.warning("Response NOT OK! status_code=%s\n%s", response.status_code, response.text)
-                return
+                Media.objects.using(self.using).bulk_create(medias)
 
     def set_media_params_after(self, params):
         """
@@ -440,24 +725,39 @@ class WPAPILoader(object):
         Get referential data from the local db into the self.ref_data_map dictionary.
         This allows for fast FK lookups when looping through posts.
 
+        Each map is a compact RefDataIndex of wp_id -> (pk, checksum) rather than full model instances.
+        Authors carry a checksum of their synced fields, so that they're only fetched and saved when they've changed.
+
         :param bulk_mode: if True, actually get all of the existing ref data
-                          else this would be too much memory, so just build empty dicts
+                          (or keep the maps we have, with keep_ref_data_map, if the ref data hasn't been reloaded since)
+                          else just build empty maps, since WP ref data is handled dynamically for the post,
+                          or use the maps of the loader's ref_data_cache, if it has one
         :return: None
         """
         if bulk_mode:
+            generation = get_ref_data_generation(self.site_id) if self.keep_ref_data_map else None
+            if generation is not None and self.ref_data_map and generation == self.ref_data_map_generation:
+                return
+
+            self.ref_data_map_generation = generation
             self.ref_data_map = {
-                "authors": {a.wp_id: a for a in Author.objects.filter(site_id=self.site_id)},
-                "categories": {c.wp_id: c for c in Category.objects.filter(site_id=self.site_id)},
-                "tags": {t.wp_id: t for t in Tag.objects.filter(site_id=self.site_id)},
-                "media": {m.wp_id: m for m in Media.objects.filter(site_id=self.site_id)}
+                "authors": RefDataIndex.from_queryset(Author.objects.using(self.using).filter(site_id=self.site_id),
+                                                      checksum_fields=self.model_fields("author")),
+                "categories": RefDataIndex.from_queryset(Category.objects.using(self.using).filter(site_id=self.site_id)),
+                "tags": RefDataIndex.from_queryset(Tag.objects.using(self.using).filter(site_id=self.site_id)),
+                "media": RefDataIndex.from_queryset(Media.objects.using(self.using).filter(site_id=self.site_id))
             }
+        elif self.ref_data_cache:
+            self.ref_data_map_generation = None
+            self.ref_data_map = self.ref_data_cache.get_maps()
         else:
             # in single post mode, WP ref data is handled dynamically for the post
+            self.ref_data_map_generation = None
             self.ref_data_map = {
-                "authors": {},
-                "categories": {},
-                "tags": {},
-                "media": {}
+                "authors": RefDataIndex(with_checksums=True),
+                "categories": RefDataIndex(),
+                "tags": RefDataIndex(),
+                "media": RefDataIndex()
             }
 
     def load_posts(self, post_type=None, max_pages=200, status=None):
@@ -475,7 +775,10 @@ class WPAPILoader(object):
 
         # clear them all out so we don't get dupes
         if self.purge_first:
-            Post.objects.filter(site_id=self.site_id, post_type=post_type).delete()
+            self.invalidate_cached_posts(Post.objects.using(self.using).filter(site_id=self.site_id, post_type=post_type))
+            purge_queryset(Post.objects.using(self.using).filter(site_id=self.site_id, post_type=post_type))
+            search.prune(self.site_id, using=self.using)
+            SyncState.objects.using(self.using).filter(site_id=self.site_id, endpoint="posts", post_type=post_type or "post").delete()
 
         path = "sites/{}/posts".format(self.site_id)
 
@@ -486,105 +789,270 @@ class WPAPILoader(object):
         if not status:
             status = "publish"
         params = {"number": self.batch_size, "type": post_type, "status": status}
-        self.set_posts_param_modified_after(params, post_type, status)
 
-        # get first page
-        response = self.get(path, params)
+        # resume an interrupted crawl from its checkpoint, unless we've been asked to start from a given date,
+        # or we're starting a full sweep and the interrupted crawl was only an incremental one
+        sync_state = self.get_sync_state("posts", post_type, status)
+        page = 1
+        response = None
+        if sync_state.in_progress and not self.modified_after and not (self.full and sync_state.run_modified_after):
+            logger.info("resuming interrupted crawl at page %s", sync_state.page)
+            resume_params = dict(params, page_handle=sync_state.page_handle)
+            if sync_state.run_modified_after:
+                resume_params["modified_after"] = sync_state.run_modified_after.isoformat()
+            response = self.get(path, resume_params)
+
+            if response.ok:
+                params = resume_params
+                page = sync_state.page or 1
+            else:
+                # the page handle may have gone stale, so rather than retry it on every run, start over
+                logger.warning("Unable to resume crawl, starting over; status_code=%s\n%s",
+                               response.status_code, response.text)
+                response = None
+
+        if response is None:
+            self.set_posts_param_modified_after(params, post_type, status, sync_state)
+            self.start_sync_state(sync_state, params)
+
+            # get first page
+            response = self.get(path, params)
 
         if not response.ok:
             logger.warning("Response NOT OK! status_code=%s\n%s", response.status_code, response.text)
 
         # process all posts in the response
-        self.process_posts_response(response, path, params, max_pages)
+        self.process_posts_response(response, path, params, max_pages, sync_state=sync_state, page=page)
 
-    def set_posts_param_modified_after(self, params, post_type, status):
+    def set_posts_param_modified_after(self, params, post_type, status, sync_state=None):
         """
         Set modified_after date to "continue where we left off" if appropriate
 
         :param params: the GET params dict, which may be updated to include the "modified_after" key
         :param post_type: post, page, attachment, or any custom post type set up in the WP API
         :param status: publish, private, draft, etc.
+        :param sync_state: the SyncState for this crawl; its committed watermark is preferred over local posts
         :return: None
         """
-        if not self.purge_first and not self.full and not self.modified_after:
-            if status == "any":
-                latest = Post.objects.filter(post_type=post_type).order_by("-modified").first()
-            else:
-                latest = Post.objects.filter(post_type=post_type, status=status).order_by("-modified").first()
-            if latest:
-                self.modified_after = latest.modified
+        modified_after = self.modified_after
 
-        if self.modified_after:
-            params["modified_after"] = self.modified_after.isoformat()
+        if not self.purge_first and not self.full and not modified_after:
+            if sync_state and sync_state.watermark:
+                modified_after = sync_state.watermark
+            else:
+                # no completed crawl on record, so fall back to the latest local post
+                latest = Post.objects.using(self.using).filter(site_id=self.site_id, post_type=post_type)
+                if status != "any":
+                    latest = latest.filter(status=status)
+                latest = latest.order_by("-modified").first()
+                if latest:
+                    modified_after = latest.modified
+
+        if modified_after:
+            params["modified_after"] = modified_after.isoformat()
             logger.info("getting posts after: %s", params["modified_after"])
 
-    def process_posts_response(self, response, path, params, max_pages):
+    def get_sync_state(self, endpoint, post_type="", status=""):
+        """
+        Get the checkpoint record for crawls of the given endpoint, creating it if needed.
+
+        :param endpoint: the API endpoint being crawled, e.g. "posts"
+        :param post_type: post, page, attachment, or any custom post type set up in the WP API
+        :param status: publish, private, draft, etc.
+        :return: the SyncState object
+        """
+        sync_state, created = SyncState.objects.using(self.using).get_or_create(site_id=self.site_id,
+                                                                                endpoint=endpoint,
+                                                                                post_type=post_type,
+                                                                                status=status)
+        return sync_state
+
+    @staticmethod
+    def start_sync_state(sync_state, params):
+        """
+        Record that a new crawl is starting, discarding any previous in-progress checkpoint.
+
+        :param sync_state: the SyncState for this crawl
+        :param params: the GET params the crawl is starting with
+        :return: None
         """
-        Insert / update all posts in a posts list response, in batches.
+        sync_state.run_modified_after = parse_datetime(params["modified_after"]) if params.get("modified_after") else None
+        sync_state.run_watermark = None
+        sync_state.page_handle = None
+        sync_state.page = None
+        sync_state.num_processed = 0
+        sync_state.save()
+
+    @staticmethod
+    def checkpoint_sync_state(sync_state, api_posts, next_page_handle, next_page, num_processed_posts):
+        """
+        Record the progress of a crawl after a page of posts has been written to the db.
+
+        :param sync_state: the SyncState for this crawl
+        :param api_posts: the API data for the posts on the page just written
+        :param next_page_handle: the API page handle for the next page
+        :param next_page: the number of the next page
+        :param num_processed_posts: the number of posts processed so far in this crawl
+        :return: None
+        """
+        for api_post in api_posts:
+            modified = parse_datetime(api_post["modified"])
+            if modified and (not sync_state.run_watermark or modified > sync_state.run_watermark):
+                sync_state.run_watermark = modified
+
+        sync_state.page_handle = next_page_handle
+        sync_state.page = next_page
+        sync_state.num_processed = num_processed_posts
+        sync_state.save()
+
+    @staticmethod
+    def complete_sync_state(sync_state):
+        """
+        Commit the watermark of a crawl that has finished, and clear its in-progress checkpoint.
+
+        :param sync_state: the SyncState for this crawl
+        :return: None
+        """
+        if sync_state.run_watermark and (not sync_state.watermark or sync_state.run_watermark > sync_state.watermark):
+            sync_state.watermark = sync_state.run_watermark
+
+        sync_state.run_modified_after = None
+        sync_state.run_watermark = None
+        sync_state.page_handle = None
+        sync_state.page = None
+        sync_state.num_processed = 0
+        sync_state.save()
+
+    def process_posts_response(self, response, path, params, max_pages, sync_state=None, page=1):
+        """
+        Insert / update all posts in a posts list response, and the pages after it, in batches.
+
+        Pages go through a pipeline of stages (see wordpress.pipeline), so that the API and the db are busy at once:
+        - fetch: request the next page as soon as the one before it is decoded, since its page handle is in it
+        - decode: parse the page's JSON, and decide whether there's a page after it
+        - transform: prepare new posts' field values, as they're stored (see get_new_post_data())
+        - write: load the page's posts into the db, and checkpoint the crawl, on this thread
+
+        The number of transform workers and the size of the queues between stages can be set in settings,
+        with WP_API_PIPELINE_WORKERS and WP_API_PIPELINE_QUEUE_SIZE.
 
         :param response: a response that contains a list of posts from the WP API
         :param path: the path we're using to get the list of posts (for subsquent pages)
         :param params: the path we're using to get the list of posts (for subsquent pages)
-        :param max_pages: kill counter to avoid infinite looping
+        :param max_pages: kill counter to avoid infinite looping; a run processes up to max_pages - 1 pages,
+                          and a crawl it cuts short resumes from its checkpoint on the next run
+        :param sync_state: if given, checkpoint progress to this SyncState after each page
+        :param page: the page number of the response, if resuming an interrupted crawl
         :return: None
         """
-        page = 1
-        num_processed_posts = 0
-        api_posts_found = None
-        while response.ok and response.text and page < max_pages:
+        PostsCrawl(self, response, path, params, max_pages, sync_state=sync_state, page=page).run()
 
-            logger.info(" - page: %d", page)
+    def load_wp_posts(self, api_posts, sync_attachments=True, new_post_data=None):
+        """
+        Load a page of posts from API data, with a fixed number of queries for the page as a whole,
+        plus one for each existing post that has changed.
 
-            posts = []
-            post_categories = {}
-            post_tags = {}
-            post_media_attachments = {}
+        :param api_posts: the API data for the posts
+        :param sync_attachments: if True, remove local attachments that have been removed from the posts,
+                                 which takes an API request for each post with attachments
+        :param new_post_data: the posts' field values from get_new_post_data(), for the posts that are new;
+                              if not given, they're prepared as the posts are saved
+        :return: None
+        """
+        posts = []
+        post_categories = {}
+        post_tags = {}
+        post_media_attachments = {}
+
+        # get all the ref data for the page up front, so that each post can find it in the ref data map
+        with self.metrics.phase("ref_data"):
+            self.resolve_post_ref_data(api_posts)
+
+        # and the page's existing posts and attachments, so that each post doesn't look up its own
+        existing_posts = self.get_existing_posts(api_posts)
+        attachment_wp_ids = None
+        if sync_attachments:
+            with self.metrics.phase("attachments"):
+                attachment_wp_ids = self.get_attachment_wp_ids(api_posts)
+
+        for api_post in api_posts:
+            self.load_wp_post(api_post,
+                              bulk_mode=True,
+                              post_categories=post_categories,
+                              post_tags=post_tags,
+                              post_media_attachments=post_media_attachments,
+                              posts=posts,
+                              existing_posts=existing_posts,
+                              attachment_wp_ids=attachment_wp_ids,
+                              sync_attachments=sync_attachments,
+                              new_post_data=(new_post_data or {}).get(api_post["ID"]))
+
+        if posts:
+            self.bulk_create_posts(posts, post_categories, post_tags, post_media_attachments)
+            self.metrics.incr("posts.inserted", len(posts))
 
-            api_json = response.json()
-            api_posts = api_json.get("posts")
-            if not api_posts_found:
-                api_posts_found = api_json.get("found", max_pages * self.batch_size)
-                logger.info("Found %s posts", api_posts_found)
+        self.flush_changed_posts()
 
-            # we're done if no posts left to process
-            if not api_posts:
-                break
+    def resolve_post_ref_data(self, api_posts):
+        """
+        Make sure every Category, Tag, and Media referenced by a page of posts is in the ref data map,
+        using one query per model to find any we have locally but haven't mapped yet,
+        and one bulk insert per model to create the rest.
 
-            logger.info("Processing post modified date: %s", api_posts[0]["modified"])
+        :param api_posts: the API data for a page of posts
+        :return: None
+        """
+        # the ref data types posts reference: the fields_mapping type, model, ref data map key, and API post key
+        ref_data_types = (("category", Category, "categories", "categories"),
+                          ("tag", Tag, "tags", "tags"),
+                          ("media", Media, "media", "attachments"))
 
+        for type, model, ref_data_key, api_post_key in ref_data_types:
+            ref_data = self.ref_data_map[ref_data_key]
+
+            # collect the unmapped objects, keyed by wp_id, since posts on a page often share them
+            api_objects = {}
             for api_post in api_posts:
-                self.load_wp_post(api_post,
-                                  bulk_mode=True,
-                                  post_categories=post_categories,
-                                  post_tags=post_tags,
-                                  post_media_attachments=post_media_attachments,
-                                  posts=posts)
-                num_processed_posts += 1
-                logger.debug("Processed %s of %s posts, modified date: %s", num_processed_posts, api_posts_found, api_post["modified"])
-
-            if posts:
-                self.bulk_create_posts(posts, post_categories, post_tags, post_media_attachments)
-
-            # we're done if we've processed all posts
-            if num_processed_posts >= api_posts_found:
-                break
+                api_objects.update((api_object["ID"], api_object) for api_object in six.itervalues(api_post[api_post_key])
+                                   if api_object["ID"] not in ref_data)
 
-            # get next page
-            page += 1
-            next_page_handle = api_json.get("meta", {}).get("next_page")
-            if next_page_handle:
-                params["page_handle"] = next_page_handle
-            else:
-                # no more pages left
-                break
+            if api_objects:
+                self.resolve_ref_data(type, model, ref_data, api_objects)
 
-            response = self.get(path, params)
+    def resolve_ref_data(self, type, model, ref_data, api_objects):
+        """
+        Add ref data objects that aren't in the ref data map yet to it,
+        updating the ones we have locally, and bulk creating the rest.
 
-            if not response.ok:
-                logger.warning("Response NOT OK! status_code=%s\n%s", response.status_code, response.text)
-                break
+        :param type: the key into fields_mapping
+        :param model: Category, Tag, or Media
+        :param ref_data: the RefDataIndex of the model, from the ref data map
+        :param api_objects: the API data for the objects, keyed by wp_id
+        :return: None
+        """
+        # we may have sync'd some of them since the map was built, so update those
+        for wp_ids in chunked(api_objects, 500):
+            for existing_obj in model.objects.using(self.using).filter(site_id=self.site_id, wp_id__in=wp_ids):
+                self.update_existing_obj(self.fields_mapping[type], existing_obj, api_objects[existing_obj.wp_id])
+                ref_data[existing_obj.wp_id] = RefRecord(existing_obj.pk, None)
+
+        # and create the rest
+        new_wp_ids = [wp_id for wp_id in api_objects if wp_id not in ref_data]
+        if not new_wp_ids:
+            return
 
-    def load_wp_post(self, api_post, bulk_mode=True, post_categories=None, post_tags=None, post_media_attachments=None, posts=None):
+        model.objects.using(self.using).bulk_create([model(site_id=self.site_id,
+                                                           wp_id=wp_id,
+                                                           **self.api_object_data(type, api_objects[wp_id]))
+                                                     for wp_id in new_wp_ids])
+
+        # bulk_create doesn't give us pks on every backend, so look them up
+        for wp_ids in chunked(new_wp_ids, 500):
+            for wp_id, pk in model.objects.using(self.using).filter(site_id=self.site_id, wp_id__in=wp_ids).values_list("wp_id", "pk"):
+                ref_data[wp_id] = RefRecord(pk, None)
+
+    def load_wp_post(self, api_post, bulk_mode=True, post_categories=None, post_tags=None, post_media_attachments=None, posts=None,
+                     existing_posts=None, attachment_wp_ids=None, sync_attachments=True, new_post_data=None):
         """
         Load a single post from API data.
 
@@ -594,6 +1062,12 @@ class WPAPILoader(object):
         :param post_tags: a mapping of Tags in the site, keyed by post ID
         :param post_media_attachments: a mapping of Media in the site, keyed by post ID
         :param posts: a list of posts to be created or updated
+        :param existing_posts: the local Posts of the page being loaded, keyed by post ID, from get_existing_posts();
+                               if not given, we look up the post in the db
+        :param attachment_wp_ids: the local attachment IDs of the page being loaded, from get_attachment_wp_ids();
+                                  if not given, we look up the post's attachments in the db
+        :param sync_attachments: if True, remove local attachments that have been removed from the post
+        :param new_post_data: the post's field values from get_new_post_data(), used if the post is new
         :return: None
         """
         # initialize reference vars if none supplied
@@ -610,27 +1084,77 @@ class WPAPILoader(object):
             posts = []
 
         # process objects related to this post
-        author = None
-        if api_post["author"].get("ID"):
-            author = self.process_post_author(bulk_mode, api_post["author"])
+        with self.metrics.phase("ref_data"):
+            author_id = None
+            if api_post["author"].get("ID"):
+                author_id = self.process_post_author(bulk_mode, api_post["author"])
 
-        # process many-to-many fields
-        self.process_post_categories(bulk_mode, api_post, post_categories)
-        self.process_post_tags(bulk_mode, api_post, post_tags)
-        self.process_post_media_attachments(bulk_mode, api_post, post_media_attachments)
+            # process many-to-many fields
+            self.process_post_categories(bulk_mode, api_post, post_categories)
+            self.process_post_tags(bulk_mode, api_post, post_tags)
+            self.process_post_media_attachments(bulk_mode, api_post, post_media_attachments)
 
         # if this post exists, update it; else create it
-        existing_post = Post.objects.filter(site_id=self.site_id, wp_id=api_post["ID"]).first()
+        if existing_posts is None:
+            existing_post = Post.objects.using(self.using).filter(site_id=self.site_id, wp_id=api_post["ID"]).first()
+        else:
+            existing_post = existing_posts.get(api_post["ID"])
+
         if existing_post:
-            self.process_existing_post(existing_post, api_post, author, post_categories, post_tags, post_media_attachments)
+            self.load_existing_wp_post(existing_post, api_post, author_id, post_categories, post_tags, post_media_attachments)
         else:
-            self.process_new_post(bulk_mode, api_post, posts, author, post_categories, post_tags, post_media_attachments)
+            self.load_new_wp_post(bulk_mode, api_post, posts, author_id, post_categories, post_tags, post_media_attachments,
+                                  new_post_data)
 
         # if this is a real post (not an attachment, page, etc.), sync child attachments that haven been deleted
         # these are generally other posts with post_type=attachment representing media that has been "uploaded to the post"
         # they can be deleted on the WP side, creating an orphan here without this step.
-        if api_post["type"] == "post":
-            self.sync_deleted_attachments(api_post)
+        if sync_attachments and api_post["type"] == "post":
+            with self.metrics.phase("attachments"):
+                self.sync_deleted_attachments(api_post, attachment_wp_ids=attachment_wp_ids)
+
+    def load_existing_wp_post(self, existing_post, api_post, author_id, post_categories, post_tags, post_media_attachments):
+        """
+        Update a post that's already in the db from API data, if it has changed, and count it.
+
+        :param existing_post: the local Post
+        :param api_post: the API data for the post
+        :param author_id: the pk of the post's Author, or None
+        :param post_categories: a mapping of Categories in the site, keyed by post ID
+        :param post_tags: a mapping of Tags in the site, keyed by post ID
+        :param post_media_attachments: a mapping of Media in the site, keyed by post ID
+        :return: None
+        """
+        # loaders don't skip posts, since some fields (like_count, etc.) change without the modified date changing,
+        # but posts that haven't changed at all aren't written
+        old_cache_values = self.post_cache_values(existing_post)
+        if self.process_existing_post(existing_post, api_post, author_id, post_categories, post_tags, post_media_attachments):
+            # invalidate the cache for both the old and new slug, etc.
+            self.changed_posts.append(old_cache_values)
+            self.changed_posts.append(self.post_cache_values(existing_post))
+            self.metrics.incr("posts.updated")
+        else:
+            self.metrics.incr("posts.unchanged")
+
+    def load_new_wp_post(self, bulk_mode, api_post, posts, author_id, post_categories, post_tags, post_media_attachments,
+                         new_post_data=None):
+        """
+        Create a post from API data, or in bulk mode, add it to the posts to be bulk created.
+
+        :param bulk_mode: If True, minimize db operations by bulk creating post objects
+        :param api_post: the API data for the post
+        :param posts: a list of posts to be created or updated
+        :param author_id: the pk of the post's Author, or None
+        :param post_categories: a mapping of Categories in the site, keyed by post ID
+        :param post_tags: a mapping of Tags in the site, keyed by post ID
+        :param post_media_attachments: a mapping of Media in the site, keyed by post ID
+        :param new_post_data: the post's field values from get_new_post_data()
+        :return: None
+        """
+        self.process_new_post(bulk_mode, api_post, posts, author_id, post_categories, post_tags, post_media_attachments,
+                              post_data=new_post_data)
+        if not bulk_mode:
+            self.metrics.incr("posts.inserted")
 
     def process_post_author(self, bulk_mode, api_author):
         """
@@ -638,30 +1162,40 @@ class WPAPILoader(object):
 
         :param bulk_mode: If True, minimize db operations by bulk creating post objects
         :param api_author: the data in the api for the Author
-        :return: the up-to-date Author object
+        :return: the pk of the up-to-date Author
         """
+        api_checksum = self.ref_data_checksum("author", api_author)
+
         # get from the ref data map if in bulk mode, else look it up from the db
         if bulk_mode:
-            author = self.ref_data_map["authors"].get(api_author["ID"])
-            if author:
-                self.update_existing_author(author, api_author)
+            record = self.ref_data_map["authors"].get(api_author["ID"])
+            if record:
+                # only fetch the full author if something has changed
+                if record.checksum != api_checksum:
+                    self.update_existing_author(Author.objects.using(self.using).get(pk=record.pk), api_author)
+                author_id = record.pk
             else:
                 # if the author wasn't found (likely because it's a Byline or guest author, not a user),
                 # go ahead and create the author now
-                author = Author.objects.create(site_id=self.site_id,
-                                               wp_id=api_author["ID"],
-                                               **self.api_object_data("author", api_author))
+                author_id = Author.objects.using(self.using).create(site_id=self.site_id,
+                                                                    wp_id=api_author["ID"],
+                                                                    **self.api_object_data("author", api_author)).pk
         else:
-            # do a direct db lookup if we're not in bulk mode
-            author, created = self.get_or_create_author(api_author)
-            if author and not created:
-                self.update_existing_author(author, api_author)
+            # do a direct db lookup if we're not in bulk mode, unless we already know the author is up to date
+            record = self.ref_data_map["authors"].get(api_author["ID"])
+            if record and record.checksum == api_checksum:
+                author_id = record.pk
+            else:
+                author, created = self.get_or_create_author(api_author)
+                if author and not created:
+                    self.update_existing_author(author, api_author)
+                author_id = author.pk if author else None
 
         # add to the ref data map so we don't try to create it again
-        if author:
-            self.ref_data_map["authors"][api_author["ID"]] = author
+        if author_id:
+            self.ref_data_map["authors"][api_author["ID"]] = RefRecord(author_id, api_checksum)
 
-        return author
+        return author_id
 
     def get_or_create_author(self, api_author):
         """
@@ -670,9 +1204,9 @@ class WPAPILoader(object):
         :param api_author: the API data for the Author
         :return: a tuple of an Author instance and a boolean indicating whether the author was created or not
         """
-        return Author.objects.get_or_create(site_id=self.site_id,
-                                            wp_id=api_author["ID"],
-                                            defaults=self.api_object_data("author", api_author))
+        return Author.objects.using(self.using).get_or_create(site_id=self.site_id,
+                                                              wp_id=api_author["ID"],
+                                                              defaults=self.api_object_data("author", api_author))
 
     def process_post_categories(self, bulk_mode, api_post, post_categories):
         """
@@ -680,14 +1214,14 @@ class WPAPILoader(object):
 
         :param bulk_mode: If True, minimize db operations by bulk creating post objects
         :param api_post: the API data for the post
-        :param post_categories: a mapping of Categories keyed by post ID
+        :param post_categories: a mapping of Category pks keyed by post ID
         :return: None
         """
         post_categories[api_post["ID"]] = []
         for api_category in six.itervalues(api_post["categories"]):
-            category = self.process_post_category(bulk_mode, api_category)
-            if category:
-                post_categories[api_post["ID"]].append(category)
+            category_id = self.process_post_category(bulk_mode, api_category)
+            if category_id:
+                post_categories[api_post["ID"]].append(category_id)
 
     def process_post_category(self, bulk_mode, api_category):
         """
@@ -695,28 +1229,32 @@ class WPAPILoader(object):
 
         :param bulk_mode: If True, minimize db operations by bulk creating post objects
         :param api_category: the API data for the Category
-        :return: the Category object
+        :return: the Category pk
         """
-        category = None
+        record = self.ref_data_map["categories"].get(api_category["ID"])
+        api_checksum = None
 
-        # try to get from the ref data map if in bulk mode
-        if bulk_mode:
-            category = self.ref_data_map["categories"].get(api_category["ID"])
+        # outside of bulk mode, only trust the ref data map if the category is known to be up to date
+        if record and not bulk_mode:
+            api_checksum = self.ref_data_checksum("category", api_category)
+            if record.checksum != api_checksum:
+                record = None
 
         # double check the db before giving up, we may have sync'd it in a previous run
-        if not category:
-            category, created = Category.objects.get_or_create(site_id=self.site_id,
-                                                               wp_id=api_category["ID"],
-                                                               defaults=self.api_object_data("category", api_category))
+        if not record:
+            category, created = Category.objects.using(self.using).get_or_create(site_id=self.site_id,
+                                                                                 wp_id=api_category["ID"],
+                                                                                 defaults=self.api_object_data("category", api_category))
 
             if category and not created:
                 self.update_existing_category(category, api_category)
 
             # add to ref data map so later lookups work
             if category:
-                self.ref_data_map["categories"][api_category["ID"]] = category
+                record = RefRecord(category.pk, api_checksum or self.ref_data_checksum("category", api_category))
+                self.ref_data_map["categories"][api_category["ID"]] = record
 
-        return category
+        return record.pk if record else None
 
     def process_post_tags(self, bulk_mode, api_post, post_tags):
         """
@@ -724,14 +1262,14 @@ class WPAPILoader(object):
 
         :param bulk_mode: If True, minimize db operations by bulk creating post objects
         :param api_post: the API data for the post
-        :param post_tags: a mapping of Tags keyed by post ID
+        :param post_tags: a mapping of Tag pks keyed by post ID
         :return: None
         """
         post_tags[api_post["ID"]] = []
         for api_tag in six.itervalues(api_post["tags"]):
-            tag = self.process_post_tag(bulk_mode, api_tag)
-            if tag:
-                post_tags[api_post["ID"]].append(tag)
+            tag_id = self.process_post_tag(bulk_mode, api_tag)
+            if tag_id:
+                post_tags[api_post["ID"]].append(tag_id)
 
     def process_post_tag(self, bulk_mode, api_tag):
         """
@@ -739,27 +1277,31 @@ class WPAPILoader(object):
 
         :param bulk_mode: If True, minimize db operations by bulk creating post objects
         :param api_tag: the API data for the Tag
-        :return: the Tag object
+        :return: the Tag pk
         """
-        tag = None
+        record = self.ref_data_map["tags"].get(api_tag["ID"])
+        api_checksum = None
 
-        # try to get from the ref data map if in bulk mode
-        if bulk_mode:
-            tag = self.ref_data_map["tags"].get(api_tag["ID"])
+        # outside of bulk mode, only trust the ref data map if the tag is known to be up to date
+        if record and not bulk_mode:
+            api_checksum = self.ref_data_checksum("tag", api_tag)
+            if record.checksum != api_checksum:
+                record = None
 
         # double check the db before giving up, we may have sync'd it in a previous run
-        if not tag:
-            tag, created = Tag.objects.get_or_create(site_id=self.site_id,
-                                                     wp_id=api_tag["ID"],
-                                                     defaults=self.api_object_data("tag", api_tag))
+        if not record:
+            tag, created = Tag.objects.using(self.using).get_or_create(site_id=self.site_id,
+                                                                       wp_id=api_tag["ID"],
+                                                                       defaults=self.api_object_data("tag", api_tag))
             if tag and not created:
                 self.update_existing_tag(tag, api_tag)
 
             # add to ref data map so later lookups work
             if tag:
-                self.ref_data_map["tags"][api_tag["ID"]] = tag
+                record = RefRecord(tag.pk, api_checksum or self.ref_data_checksum("tag", api_tag))
+                self.ref_data_map["tags"][api_tag["ID"]] = record
 
-        return tag
+        return record.pk if record else None
 
     def process_post_media_attachments(self, bulk_mode, api_post, post_media_attachments):
         """
@@ -767,15 +1309,15 @@ class WPAPILoader(object):
 
         :param bulk_mode: If True, minimize db operations by bulk creating post objects
         :param api_post: the API data for the Post
-        :param post_media_attachments: a mapping of Media objects keyed by post ID
+        :param post_media_attachments: a mapping of Media pks keyed by post ID
         :return: None
         """
         post_media_attachments[api_post["ID"]] = []
 
         for api_attachment in six.itervalues(api_post["attachments"]):
-            attachment = self.process_post_media_attachment(bulk_mode, api_attachment)
-            if attachment:
-                post_media_attachments[api_post["ID"]].append(attachment)
+            attachment_id = self.process_post_media_attachment(bulk_mode, api_attachment)
+            if attachment_id:
+                post_media_attachments[api_post["ID"]].append(attachment_id)
 
     def process_post_media_attachment(self, bulk_mode, api_media_attachment):
         """
@@ -783,16 +1325,19 @@ class WPAPILoader(object):
 
         :param bulk_mode: If True, minimize db operations by bulk creating post objects
         :param api_media_attachment: the API data for the Media
-        :return: the Media attachment object
+        :return: the Media attachment pk
         """
-        attachment = None
+        record = self.ref_data_map["media"].get(api_media_attachment["ID"])
+        api_checksum = None
 
-        # try to get from the ref data map if in bulk mode
-        if bulk_mode:
-            attachment = self.ref_data_map["media"].get(api_media_attachment["ID"])
+        # outside of bulk mode, only trust the ref data map if the media is known to be up to date
+        if record and not bulk_mode:
+            api_checksum = self.ref_data_checksum("media", api_media_attachment)
+            if record.checksum != api_checksum:
+                record = None
 
         # double check the db before giving up, we may have sync'd it in a previous run
-        if not attachment:
+        if not record:
             # do a direct db lookup if we're not in bulk mode
             attachment, created = self.get_or_create_media(api_media_attachment)
             if attachment and not created:
@@ -800,9 +1345,10 @@ class WPAPILoader(object):
 
             # add to ref data map so later lookups work
             if attachment:
-                self.ref_data_map["media"][api_media_attachment["ID"]] = attachment
+                record = RefRecord(attachment.pk, api_checksum or self.ref_data_checksum("media", api_media_attachment))
+                self.ref_data_map["media"][api_media_attachment["ID"]] = record
 
-        return attachment
+        return record.pk if record else None
 
     def get_or_create_media(self, api_media):
         """
@@ -811,54 +1357,39 @@ class WPAPILoader(object):
         :param api_media: the API data for the Media
         :return: a tuple of an Media instance and a boolean indicating whether the Media was created or not
         """
-        return Media.objects.get_or_create(site_id=self.site_id,
-                                           wp_id=api_media["ID"],
-                                           defaults=self.api_object_data("media", api_media))
+        return Media.objects.using(self.using).get_or_create(site_id=self.site_id,
+                                                             wp_id=api_media["ID"],
+                                                             defaults=self.api_object_data("media", api_media))
 
-    @staticmethod
-    def process_existing_post(existing_post, api_post, author, post_categories, post_tags, post_media_attachments):
+    def process_existing_post(self, existing_post, api_post, author_id, post_categories, post_tags, post_media_attachments):
         """
         Sync attributes for a single post from WP API data.
+        The post is only saved if something has changed.
 
         :param existing_post: Post object that needs to be sync'd
         :param api_post: the API data for the Post
-        :param author: the Author object of the post (should already exist in the db)
-        :param post_categories: the Categories to attach to the post (should already exist in the db)
-        :param post_tags: the Tags to attach to the post (should already exist in the db)
-        :param post_media_attachments: the Medias to attach to the post (should already exist in the db)
-        :return: None
+        :param author_id: the pk of the Author of the post (should already exist in the db)
+        :param post_categories: the Category pks to attach to the post (should already exist in the db)
+        :param post_tags: the Tag pks to attach to the post (should already exist in the db)
+        :param post_media_attachments: the Media pks to attach to the post (should already exist in the db)
+        :return: True if the post or its many-to-many fields changed
         """
-        # don't bother checking what's different, just update all fields
-        existing_post.author = author
-        existing_post.post_date = api_post["date"]
-        existing_post.modified = api_post["modified"]
-        existing_post.title = api_post["title"]
-        existing_post.url = api_post["URL"]
-        existing_post.short_url = api_post["short_URL"]
-        existing_post.content = api_post["content"]
-        existing_post.excerpt = api_post["excerpt"]
-        existing_post.slug = api_post["slug"]
-        existing_post.guid = api_post["guid"]
-        existing_post.status = api_post["status"]
-        existing_post.sticky = api_post["sticky"]
-        existing_post.password = api_post["password"]
-        existing_post.parent = api_post["parent"]
-        existing_post.post_type = api_post["type"]
-        existing_post.likes_enabled = api_post["likes_enabled"]
-        existing_post.sharing_enabled = api_post["sharing_enabled"]
-        existing_post.like_count = api_post["like_count"]
-        existing_post.global_ID = api_post["global_ID"]
-        existing_post.featured_image = api_post["featured_image"]
-        existing_post.format = api_post["format"]
-        existing_post.menu_order = api_post["menu_order"]
-        existing_post.metadata = api_post["metadata"]
-        existing_post.post_thumbnail = api_post["post_thumbnail"]
-
-        WPAPILoader.process_post_many_to_many_field(existing_post, "categories", post_categories)
-        WPAPILoader.process_post_many_to_many_field(existing_post, "tags", post_tags)
-        WPAPILoader.process_post_many_to_many_field(existing_post, "attachments", post_media_attachments)
-
-        existing_post.save()
+        changed = self.update_obj_fields(self.fields_mapping["post"], existing_post, api_post)
+        if existing_post.author_id != author_id:
+            existing_post.author_id = author_id
+            changed = True
+
+        if changed:
+            existing_post.save()
+
+        with self.metrics.phase("m2m"):
+            for field, related_objects in (("categories", post_categories),
+                                           ("tags", post_tags),
+                                           ("attachments", post_media_attachments)):
+                if self.process_post_many_to_many_field(existing_post, field, related_objects):
+                    changed = True
+
+        return changed
 
     @staticmethod
     def process_post_many_to_many_field(existing_post, field, related_objects):
@@ -867,18 +1398,25 @@ class WPAPILoader(object):
 
         :param existing_post: Post object that needs to be sync'd
         :param field: the many-to-many field to update
-        :param related_objects: the list of objects for the field, that need to be sync'd to the Post
-        :return: None
+        :param related_objects: a mapping of the objects (or pks) for the field that need to be sync'd, keyed by post ID
+        :return: True if anything was added or removed
         """
-        to_add = set(related_objects.get(existing_post.wp_id, set())) - set(getattr(existing_post, field).all())
-        to_remove = set(getattr(existing_post, field).all()) - set(related_objects.get(existing_post.wp_id, set()))
+        related_ids = set(getattr(obj, "pk", obj) for obj in related_objects.get(existing_post.wp_id, []))
+        # all() rather than values_list(), so that we use the field's prefetched objects, if any
+        existing_ids = set(obj.pk for obj in getattr(existing_post, field).all())
+
+        to_add = related_ids - existing_ids
+        to_remove = existing_ids - related_ids
 
         if to_add:
             getattr(existing_post, field).add(*to_add)
         if to_remove:
             getattr(existing_post, field).remove(*to_remove)
 
-    def process_new_post(self, bulk_mode, api_post, posts, author, post_categories, post_tags, post_media_attachments):
+        return bool(to_add or to_remove)
+
+    def process_new_post(self, bulk_mode, api_post, posts, author_id, post_categories, post_tags, post_media_attachments,
+                         post_data=None):
         """
         Instantiate a new Post object using data from the WP API.
         Related fields -- author, categories, tags, and attachments should be processed in advance
@@ -886,38 +1424,17 @@ class WPAPILoader(object):
         :param bulk_mode: If True, minimize db operations by bulk creating post objects
         :param api_post: the API data for the Post
         :param posts: the potentially growing list of Posts that we are processing in this run
-        :param author: the Author object for this Post
-        :param post_categories: the list of Category objects that should be linked to this Post
-        :param post_tags: the list of Tags objects that should be linked to this Post
-        :param post_media_attachments: the list of Media objects that should be attached to this Post
+        :param author_id: the pk of the Author for this Post
+        :param post_categories: the list of Category pks that should be linked to this Post
+        :param post_tags: the list of Tag pks that should be linked to this Post
+        :param post_media_attachments: the list of Media pks that should be attached to this Post
+        :param post_data: the Post's field values, from get_new_post_data(); if not given, we get them from api_post
         :return: None
         """
         post = Post(site_id=self.site_id,
                     wp_id=api_post["ID"],
-                    author=author,
-                    post_date=api_post["date"],
-                    modified=api_post["modified"],
-                    title=api_post["title"],
-                    url=api_post["URL"],
-                    short_url=api_post["short_URL"],
-                    content=api_post["content"],
-                    excerpt=api_post["excerpt"],
-                    slug=api_post["slug"],
-                    guid=api_post["guid"],
-                    status=api_post["status"],
-                    sticky=api_post["sticky"],
-                    password=api_post["password"],
-                    parent=api_post["parent"],
-                    post_type=api_post["type"],
-                    likes_enabled=api_post["likes_enabled"],
-                    sharing_enabled=api_post["sharing_enabled"],
-                    like_count=api_post["like_count"],
-                    global_ID=api_post["global_ID"],
-                    featured_image=api_post["featured_image"],
-                    format=api_post["format"],
-                    menu_order=api_post["menu_order"],
-                    metadata=api_post["metadata"],
-                    post_thumbnail=api_post["post_thumbnail"])
+                    author_id=author_id,
+                    **(post_data or self.api_object_data("post", api_post)))
         posts.append(post)
 
         # if we're not in bulk mode, go ahead and create the post in the db now
@@ -925,29 +1442,112 @@ class WPAPILoader(object):
         if not bulk_mode:
             self.bulk_create_posts(posts, post_categories, post_tags, post_media_attachments)
 
+    @classmethod
+    def get_new_post_data(cls, api_posts):
+        """
+        Prepare the field values of new Posts from a page of API data, in the form they're stored:
+        dates parsed, and JSON encoded and compressed along with the content (if compression is enabled),
+        so that saving them has nothing left to do but insert them.
+
+        This is the CPU work of loading new posts, and takes no queries, so the sync pipeline does it off the db thread.
+        Existing posts are compared with the API data field by field instead, so they don't use these values.
+
+        :param api_posts: the API data for the posts
+        :return: a dict of field values, keyed by post ID
+        """
+        fields = [(field[0], Post._meta.get_field(field[0])) for field in cls.fields_mapping["post"]]
+        new_post_data = {}
+        for api_post in api_posts:
+            post_data = cls.api_object_data("post", api_post)
+            new_post_data[api_post["ID"]] = dict((name, stored_value(field, post_data[name])) for name, field in fields)
+        return new_post_data
+
     def bulk_create_posts(self, posts, post_categories, post_tags, post_media_attachments):
         """
         Actually do a db bulk creation of posts, and link up the many-to-many fields
 
         :param posts: the list of Post objects to bulk create
-        :param post_categories: a mapping of Categories to add to newly created Posts
-        :param post_tags: a mapping of Tags to add to newly created Posts
-        :param post_media_attachments: a mapping of Medias to add to newly created Posts
+        :param post_categories: a mapping of Category pks to add to newly created Posts
+        :param post_tags: a mapping of Tag pks to add to newly created Posts
+        :param post_media_attachments: a mapping of Media pks to add to newly created Posts
+        :return: None
+        """
+        Post.objects.using(self.using).bulk_create(posts)
+        self.changed_posts.extend(self.post_cache_values(post) for post in posts)
+
+        # bulk_create doesn't give us pks on every backend, so look them up
+        post_pks = {}
+        for wp_ids in chunked([post.wp_id for post in posts], 500):
+            post_pks.update(Post.objects.using(self.using).filter(site_id=self.site_id, wp_id__in=wp_ids)
+                                                          .values_list("wp_id", "pk"))
+
+        # attach many-to-manys
+        with self.metrics.phase("m2m"):
+            self.bulk_add_many_to_many_field("categories", post_pks, post_categories)
+            self.bulk_add_many_to_many_field("tags", post_pks, post_tags)
+            self.bulk_add_many_to_many_field("attachments", post_pks, post_media_attachments)
+
+    def bulk_add_many_to_many_field(self, field, post_pks, related_objects):
+        """
+        Link newly created posts to their related objects, with a bulk insert into the many-to-many table.
+
+        :param field: the many-to-many field to update
+        :param post_pks: the pks of the new Posts, keyed by post ID
+        :param related_objects: a mapping of the objects (or pks) to link, keyed by post ID
         :return: None
         """
-        Post.objects.bulk_create(posts)
+        m2m_field = Post._meta.get_field(field)
+        through = m2m_field.rel.through
 
-        # attach many-to-ones
-        for post_wp_id, categories in six.iteritems(post_categories):
-            Post.objects.get(site_id=self.site_id, wp_id=post_wp_id).categories.add(*categories)
+        rows = []
+        for post_wp_id, post_pk in six.iteritems(post_pks):
+            for related_pk in set(getattr(obj, "pk", obj) for obj in related_objects.get(post_wp_id, [])):
+                rows.append(through(**{m2m_field.m2m_column_name(): post_pk, m2m_field.m2m_reverse_name(): related_pk}))
 
-        for post_id, tags in six.iteritems(post_tags):
-            Post.objects.get(site_id=self.site_id, wp_id=post_id).tags.add(*tags)
+        through.objects.using(self.using).bulk_create(rows)
 
-        for post_id, attachments in six.iteritems(post_media_attachments):
-            Post.objects.get(site_id=self.site_id, wp_id=post_id).attachments.add(*attachments)
+    def get_existing_posts(self, api_posts):
+        """
+        Get the local copies of a page of posts, with their categories, tags, and attachments,
+        in a few queries rather than a few per post.
+
+        :param api_posts: the API data for the page of posts
+        :return: a dict of Posts keyed by post ID
+        """
+        existing_posts = {}
+        for wp_ids in chunked([api_post["ID"] for api_post in api_posts], 500):
+            posts = (Post.objects.using(self.using).filter(site_id=self.site_id, wp_id__in=wp_ids)
+                                                   .prefetch_related("categories", "tags", "attachments"))
+            existing_posts.update((post.wp_id, post) for post in posts)
+        return existing_posts
+
+    def get_attachment_wp_ids(self, api_posts):
+        """
+        Get the IDs of the local attachment posts of each of a page of posts, in one query per 500 posts.
+
+        :param api_posts: the API data for the page of posts
+        :return: a dict of sets of attachment post IDs, keyed by the ID of their parent post
+        """
+        parent_wp_ids = [api_post["ID"] for api_post in api_posts if api_post["type"] == "post"]
+        attachment_wp_ids = dict((wp_id, set()) for wp_id in parent_wp_ids)
+
+        for wp_ids in chunked(parent_wp_ids, 500):
+            # parent is stored as JSON, so match the text, then check the parent ID exactly
+            parents = Q()
+            for wp_id in wp_ids:
+                parents |= Q(parent__icontains='"ID":{}'.format(wp_id))
+
+            attachments = (Post.objects.using(self.using).filter(site_id=self.site_id, post_type="attachment")
+                                                         .filter(parents)
+                                                         .values_list("wp_id", "parent"))
+            for wp_id, parent in attachments:
+                parent_wp_id = json.loads(parent).get("ID") if parent else None
+                if parent_wp_id in attachment_wp_ids:
+                    attachment_wp_ids[parent_wp_id].add(wp_id)
 
-    def sync_deleted_attachments(self, api_post):
+        return attachment_wp_ids
+
+    def sync_deleted_attachments(self, api_post, attachment_wp_ids=None):
         """
         Remove Posts with post_type=attachment that have been removed from the given Post on the WordPress side.
 
@@ -958,12 +1558,13 @@ class WPAPILoader(object):
         - delete extra local attachments if any
 
         :param api_post: the API data for the Post
+        :param attachment_wp_ids: the local attachment IDs of the page being loaded, from get_attachment_wp_ids();
+                                  if not given, we look up the post's attachments in the db
         :return: None
         """
-        existing_IDs = set(Post.objects.filter(site_id=self.site_id,
-                                               post_type="attachment",
-                                               parent__icontains='"ID":{}'.format(api_post["ID"]))
-                                       .values_list("wp_id", flat=True))
+        if attachment_wp_ids is None:
+            attachment_wp_ids = self.get_attachment_wp_ids([api_post])
+        existing_IDs = attachment_wp_ids.get(api_post["ID"], set())
 
         # can't delete what we don't have
         if existing_IDs:
@@ -1014,14 +1615,73 @@ class WPAPILoader(object):
 
             # purge the extras
             if to_remove:
-                Post.objects.filter(site_id=self.site_id,
-                                    post_type="attachment",
-                                    parent__icontains='"ID":{}'.format(api_post["ID"]),
-                                    wp_id__in=list(to_remove)).delete()
+                removed_posts = Post.objects.using(self.using).filter(site_id=self.site_id,
+                                                                      post_type="attachment",
+                                                                      wp_id__in=list(to_remove))
+                self.changed_posts.extend(removed_posts.values_list("wp_id", "slug", "guid", "post_type"))
+                removed_posts.delete()
+
+    @staticmethod
+    def post_cache_values(post):
+        return post.wp_id, post.slug, post.guid, post.post_type
+
+    def flush_changed_posts(self):
+        """
+        For posts inserted, updated, or deleted since the last call,
+        remove their cached lookups (along with the site's cached listings) and update the search index.
+
+        :return: None
+        """
+        if self.changed_posts:
+            invalidate_posts(self.site_id, self.changed_posts)
+            search.sync_posts(self.site_id, [values[0] for values in self.changed_posts], using=self.using)
+            self.changed_posts = []
+
+    def invalidate_cached_posts(self, queryset, chunk_size=500):
+        """
+        Remove cached lookups for posts that are about to be purged.
+
+        :param queryset: the Posts that will be deleted
+        :param chunk_size: the number of posts to invalidate at a time, to keep memory flat
+        :return: None
+        """
+        posts = []
+        for values in queryset.values_list("wp_id", "slug", "guid", "post_type").iterator():
+            posts.append(values)
+            if len(posts) >= chunk_size:
+                invalidate_posts(self.site_id, posts)
+                posts = []
+
+        invalidate_posts(self.site_id, posts)
 
     # ------- helpers to update existing objects ---------- #
 
     fields_mapping = {
+        "post": [
+            ("post_date", "date"),
+            ("modified", "modified"),
+            ("title", "title"),
+            ("url", "URL"),
+            ("short_url", "short_URL"),
+            ("content", "content"),
+            ("excerpt", "excerpt"),
+            ("slug", "slug"),
+            ("guid", "guid"),
+            ("status", "status"),
+            ("sticky", "sticky"),
+            ("password", "password"),
+            ("parent", "parent"),
+            ("post_type", "type"),
+            ("likes_enabled", "likes_enabled"),
+            ("sharing_enabled", "sharing_enabled"),
+            ("like_count", "like_count"),
+            ("global_ID", "global_ID"),
+            ("featured_image", "featured_image"),
+            ("format", "format"),
+            ("menu_order", "menu_order"),
+            ("metadata", "metadata"),
+            ("post_thumbnail", "post_thumbnail"),
+        ],
         "category": [
             ("name", "name"),
             ("slug", "slug"),
@@ -1080,18 +1740,53 @@ class WPAPILoader(object):
 
     @classmethod
     def update_existing_obj(cls, fields, existing_obj, api_data):
-        save_it = False
+        if cls.update_obj_fields(fields, existing_obj, api_data):
+            existing_obj.save()
+
+    @classmethod
+    def update_obj_fields(cls, fields, obj, api_data):
+        """
+        Set the fields of a model object from API data, if they've changed.
+
+        Values are converted as the db would before comparing, so that e.g. a date string from the API
+        matches the datetime we stored for it, and unchanged objects aren't saved again.
+
+        :param fields: the field mapping, from fields_mapping
+        :param obj: the model object
+        :param api_data: the API data for the object
+        :return: True if any field changed
+        """
+        changed = False
 
         for field in fields:
-            if getattr(existing_obj, field[0]) != api_data.get(field[1]):
-                save_it = True
-                if len(field) > 2 and callable(field[2]):
-                    setattr(existing_obj, field[0], field[2](api_data.get(field[1])))
-                else:
-                    setattr(existing_obj, field[0], api_data.get(field[1]))
+            value = api_data.get(field[1])
+            if len(field) > 2 and callable(field[2]):
+                value = field[2](value)
 
-        if save_it:
-            existing_obj.save()
+            value = obj._meta.get_field(field[0]).to_python(value)
+            if getattr(obj, field[0]) != value:
+                setattr(obj, field[0], value)
+                changed = True
+
+        return changed
+
+    @classmethod
+    def model_fields(cls, type):
+        return [field[0] for field in cls.fields_mapping[type]]
+
+    @classmethod
+    def ref_data_checksum(cls, type, api_data):
+        """
+        Checksum API data the same way RefDataIndex checksums local rows, by first converting values as the db would.
+
+        :param type: the key into fields_mapping
+        :param api_data: the API data for the object
+        :return: the checksum
+        """
+        model = {"category": Category, "tag": Tag, "author": Author, "media": Media}[type]
+        data = cls.api_object_data(type, api_data)
+
+        return checksum(model._meta.get_field(name).to_python(data[name]) for name in cls.model_fields(type))
 
     @classmethod
     def api_object_data(cls, type, api_data):
@@ -1104,3 +1799,177 @@ class WPAPILoader(object):
                 data[field[0]] = api_data.get(field[1])
 
         return data
+
+
+class PostsCrawl(object):
+    """
+    One run of a crawl through a posts list, for WPAPILoader.process_posts_response():
+    the stages of its pipeline, and the state they share as its pages go through.
+    """
+
+    def __init__(self, loader, response, path, params, max_pages, sync_state=None, page=1):
+        """
+        :param loader: the WPAPILoader to fetch and load the posts with
+        :param response: a response that contains a list of posts from the WP API
+        :param path: the path we're using to get the list of posts (for subsequent pages)
+        :param params: the GET params we're using to get the list of posts (for subsequent pages)
+        :param max_pages: kill counter to avoid infinite looping
+        :param sync_state: if given, checkpoint progress to this SyncState after each page
+        :param page: the page number of the response, if resuming an interrupted crawl
+        """
+        self.loader = loader
+        self.response = response
+        self.path = path
+        self.params = params
+        self.max_pages = max_pages
+        self.sync_state = sync_state
+        self.first_page = page
+        # pages are numbered from the start of the crawl, so a resumed crawl gets a full run of pages
+        self.end_page = page + max_pages - 1
+
+        self.num_processed_posts = sync_state.num_processed if sync_state else 0
+        self.api_posts_found = None
+        # the posts of the last page written
+        self.api_posts = None
+        # whether we got to the end of the listing
+        self.exhausted = False
+
+        # the decode stage passes each page's handle back to the fetch stage, or None after the last page
+        self.next_page_handles = queue.Queue()
+        self.num_decoded_posts = self.num_processed_posts
+        self.decoded_posts_found = None
+        self.pipeline = None
+
+    def run(self):
+        """
+        Send the pages through the pipeline, write them on this thread,
+        and complete the crawl's sync state if we got to the end of the listing.
+
+        :return: None
+        """
+        workers = get_pipeline_workers()
+        self.pipeline = Pipeline("posts",
+                                 [Stage("fetch", self.fetch),
+                                  Stage("decode", self.decode),
+                                  Stage("transform", self.transform, workers=workers.get("transform", 1))],
+                                 queue_size=get_pipeline_queue_size(),
+                                 metrics=self.loader.metrics,
+                                 consumer="write")
+
+        try:
+            for posts_page in self.pipeline:
+                if not self.write(posts_page):
+                    break
+        finally:
+            self.pipeline.close()
+
+        # only move the watermark forward if we got through every page;
+        # otherwise (an error, or the max_pages kill counter) the checkpoint is kept for the next run to resume from
+        if self.sync_state and self.exhausted:
+            if self.api_posts:
+                self.loader.checkpoint_sync_state(self.sync_state, self.api_posts, None, None, self.num_processed_posts)
+            self.loader.complete_sync_state(self.sync_state)
+
+    def fetch(self):
+        """
+        The source of the pipeline: the first response, then each page after it,
+        requested as soon as the decode stage has its page handle.
+        """
+        posts_response = self.response
+        for page_number in itertools.count(self.first_page):
+            yield page_number, posts_response
+
+            next_page_handle = self.pipeline.get(self.next_page_handles)
+            if not next_page_handle or self.loader.stopping():
+                return
+            posts_response = self.loader.get(self.path, dict(self.params, page_handle=next_page_handle))
+
+    def decode(self, item):
+        """
+        Parse a page's JSON, and pass the handle of the page after it, if there's one to fetch, back to the fetch stage.
+
+        :param item: the page number and response of the page
+        :return: the page, as a dict of its number, response, JSON and posts; its JSON is None if it isn't to be loaded
+        """
+        page_number, posts_response = item
+        posts_page = {"page": page_number, "response": posts_response, "api_json": None, "api_posts": None}
+
+        if posts_response.ok and posts_response.text and page_number < self.end_page:
+            posts_page["api_json"] = api_json = posts_response.json()
+            posts_page["api_posts"] = page_api_posts = api_json.get("posts")
+            if not self.decoded_posts_found:
+                self.decoded_posts_found = api_json.get("found", self.max_pages * self.loader.batch_size)
+            self.num_decoded_posts += len(page_api_posts or [])
+
+            next_page_handle = api_json.get("meta", {}).get("next_page")
+            if page_api_posts and self.num_decoded_posts < self.decoded_posts_found and page_number + 1 < self.end_page:
+                self.next_page_handles.put(next_page_handle)
+                return posts_page
+
+        self.next_page_handles.put(None)
+        return posts_page
+
+    def transform(self, posts_page):
+        """
+        Prepare new posts' field values, as they're stored (see WPAPILoader.get_new_post_data()).
+        """
+        if posts_page["api_posts"]:
+            posts_page["new_post_data"] = self.loader.get_new_post_data(posts_page["api_posts"])
+        return posts_page
+
+    def write(self, posts_page):
+        """
+        Load a page's posts into the db, and checkpoint the crawl.
+
+        :param posts_page: the page, from the transform stage
+        :return: True if the crawl goes on to the next page, else False
+        """
+        page = posts_page["page"]
+        response = posts_page["response"]
+
+        if posts_page["api_json"] is None:
+            if not response.ok and page > self.first_page:
+                logger.warning("Response NOT OK! status_code=%s\n%s", response.status_code, response.text)
+            return False
+
+        logger.info(" - page: %d", page)
+        self.loader.metrics.incr("pages", endpoint="posts")
+
+        api_json = posts_page["api_json"]
+        self.api_posts = api_posts = posts_page["api_posts"]
+        if not self.api_posts_found:
+            self.api_posts_found = api_json.get("found", self.max_pages * self.loader.batch_size)
+            logger.info("Found %s posts", self.api_posts_found)
+
+        # we're done if no posts left to process
+        if not api_posts:
+            self.exhausted = True
+            return False
+
+        logger.info("Processing post modified date: %s", api_posts[0]["modified"])
+
+        self.loader.load_wp_posts(api_posts, new_post_data=posts_page["new_post_data"])
+        self.num_processed_posts += len(api_posts)
+        logger.debug("Processed %s of %s posts", self.num_processed_posts, self.api_posts_found)
+
+        # we're done if we've processed all posts
+        if self.num_processed_posts >= self.api_posts_found:
+            self.exhausted = True
+            return False
+
+        next_page_handle = api_json.get("meta", {}).get("next_page")
+        if not next_page_handle:
+            # no more pages left
+            self.exhausted = True
+            return False
+
+        # the page is written, so an interrupted crawl can resume from the next one
+        if self.sync_state:
+            self.loader.checkpoint_sync_state(self.sync_state, api_posts, next_page_handle, page + 1,
+                                              self.num_processed_posts)
+
+        if self.loader.stopping():
+            logger.info("stopping before page %d", page + 1)
+            return False
+
+        return True
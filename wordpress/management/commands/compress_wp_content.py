@@ -0,0 +1,105 @@
+from __future__ import unicode_literals
+
+import logging
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, router, transaction
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "compresses (or with --decompress, decompresses) stored post content, metadata, and media exif in place"
+
+    option_list = BaseCommand.option_list + (
+        make_option('--decompress',
+                    action='store_true',
+                    dest='decompress',
+                    default=False,
+                    help='Restore rows to plain text, e.g. before turning WP_API_COMPRESS_CONTENT off.'),
+        make_option('--site_id',
+                    type='int',
+                    dest='site_id',
+                    default=None,
+                    help='Only convert rows for this site_id.'),
+        make_option('--chunk_size',
+                    type='int',
+                    dest='chunk_size',
+                    default=500,
+                    help='The number of rows to convert in each transaction.'),
+        make_option('--database',
+                    type='string',
+                    dest='database',
+                    default=None,
+                    help='The database alias to convert, instead of the one chosen by settings and routers.'),
+    )
+
+    def handle(self, *args, **options):
+        from wordpress.fields import compress, compression_enabled, decompress
+        from wordpress.models import Post, Media
+
+        if options["decompress"] and compression_enabled():
+            raise CommandError("Set WP_API_COMPRESS_CONTENT = False in settings before decompressing, "
+                               "or rows will be compressed again on their next save.")
+        if not options["decompress"] and not compression_enabled():
+            raise CommandError("Set WP_API_COMPRESS_CONTENT = True in settings before compressing.")
+
+        convert = decompress if options["decompress"] else compress
+
+        for model, field_names in ((Post, ("content", "metadata", "post_thumbnail")),
+                                   (Media, ("exif",))):
+            num_converted = self.convert_rows(model, field_names, convert,
+                                              site_id=options["site_id"],
+                                              chunk_size=options["chunk_size"],
+                                              using=options["database"] or router.db_for_write(model))
+            logger.info("converted %d %s rows", num_converted, model._meta.verbose_name)
+
+    @staticmethod
+    def convert_rows(model, field_names, convert, site_id=None, chunk_size=500, using=None):
+        """
+        Rewrite the stored values of some fields, in pk order and in chunks.
+        Values are read and written as raw strings, so JSON fields aren't decoded and encoded again.
+
+        :param model: the model class
+        :param field_names: the names of the fields to convert
+        :param convert: a function from stored value to new stored value
+        :param site_id: only convert rows for this site_id
+        :param chunk_size: the number of rows to convert in each transaction
+        :param using: the database alias
+        :return: the number of rows changed
+        """
+        connection = connections[using]
+        queryset = model.objects.using(using).order_by("pk")
+        if site_id is not None:
+            queryset = queryset.filter(site_id=site_id)
+
+        columns = [model._meta.get_field(field_name).column for field_name in field_names]
+        sql = "UPDATE {} SET {} WHERE {} = %s".format(
+            connection.ops.quote_name(model._meta.db_table),
+            ", ".join("{} = %s".format(connection.ops.quote_name(column)) for column in columns),
+            connection.ops.quote_name(model._meta.pk.column))
+
+        num_converted = 0
+        last_pk = 0
+        while True:
+            # values_list() returns the stored strings for the compressed fields
+            rows = list(queryset.filter(pk__gt=last_pk).values_list("pk", *field_names)[:chunk_size])
+            if not rows:
+                break
+
+            params = []
+            for row in rows:
+                values = [convert(value) for value in row[1:]]
+                if values != list(row[1:]):
+                    params.append(values + [row[0]])
+
+            if params:
+                with transaction.atomic(using=using):
+                    with connection.cursor() as cursor:
+                        cursor.executemany(sql, params)
+
+            num_converted += len(params)
+            last_pk = rows[-1][0]
+
+        return num_converted
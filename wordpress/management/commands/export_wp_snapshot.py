@@ -0,0 +1,39 @@
+from __future__ import unicode_literals
+
+import logging
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    args = '<site_id> <path>'
+    help = "writes all of a site's synced content to a snapshot file, for import_wp_snapshot to load elsewhere"
+
+    option_list = BaseCommand.option_list + (
+        make_option('--chunk_size',
+                    type='int',
+                    dest='chunk_size',
+                    default=500,
+                    help='The number of rows to read at a time.'),
+        make_option('--database',
+                    type='string',
+                    dest='database',
+                    default=None,
+                    help='The database alias to export from, instead of the one chosen by settings and routers.'),
+    )
+
+    def handle(self, *args, **options):
+        from wordpress.snapshots import export_snapshot
+
+        if len(args) != 2:
+            raise CommandError("Give the site_id to export, and the path to write the snapshot to.")
+        site_id, path = args
+
+        with open(path, "wb") as f:
+            counts = export_snapshot(site_id, f, using=options["database"], chunk_size=options["chunk_size"])
+
+        logger.info("exported site %s to %s: %s", site_id, path,
+                    ", ".join("{} {}".format(count, name) for name, count in sorted(counts.items())))
@@ -0,0 +1,55 @@
+from __future__ import unicode_literals
+
+import logging
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    args = '<path>'
+    help = "loads a snapshot file written by export_wp_snapshot into a site with no synced content"
+
+    option_list = BaseCommand.option_list + (
+        make_option('--site_id',
+                    type='int',
+                    dest='site_id',
+                    default=None,
+                    help='The site_id to load into, instead of the one the snapshot was exported from.'),
+        make_option('--purge',
+                    action='store_true',
+                    dest='purge',
+                    default=False,
+                    help='Purge the site\'s content before loading -- careful, this is destructive!'),
+        make_option('--chunk_size',
+                    type='int',
+                    dest='chunk_size',
+                    default=500,
+                    help='The number of rows to insert in each transaction.'),
+        make_option('--database',
+                    type='string',
+                    dest='database',
+                    default=None,
+                    help='The database alias to load into, instead of the one chosen by settings and routers.'),
+    )
+
+    def handle(self, *args, **options):
+        from wordpress.snapshots import import_snapshot
+
+        if len(args) != 1:
+            raise CommandError("Give the path of the snapshot to load.")
+        path = args[0]
+
+        with open(path, "rb") as f:
+            try:
+                counts = import_snapshot(f,
+                                         site_id=options["site_id"],
+                                         using=options["database"],
+                                         chunk_size=options["chunk_size"],
+                                         purge=options["purge"])
+            except ValueError as e:
+                raise CommandError(e)
+
+        logger.info("imported %s: %s", path, ", ".join("{} {}".format(count, name) for name, count in sorted(counts.items())))
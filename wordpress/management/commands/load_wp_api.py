@@ -48,6 +48,28 @@ class Command(BaseCommand):
                     dest='batch_size',
                     default=None,
                     help='Set the number of posts to load with each call to the WP API.'),
+        make_option('--reconcile',
+                    action='store_true',
+                    dest='reconcile',
+                    default=False,
+                    help='Instead of loading posts, find local posts that are no longer in the API, by listing IDs only.'),
+        make_option('--reconcile_action',
+                    type='choice',
+                    choices=['delete', 'trash'],
+                    dest='reconcile_action',
+                    default='delete',
+                    help="With --reconcile, whether to delete extra local posts, or set their status to trash."),
+        make_option('--profile',
+                    type='string',
+                    dest='profile',
+                    default=None,
+                    metavar='FILE',
+                    help='Profile the run, writing a cProfile dump to FILE, and print a summary of its SQL queries.'),
+        make_option('--database',
+                    type='string',
+                    dest='database',
+                    default=None,
+                    help='The database alias to sync to, instead of the one chosen by settings and routers.'),
     )
 
     def handle(self, *args, **options):
@@ -70,10 +92,25 @@ class Command(BaseCommand):
         status = options.get("status")
         batch_size = options.get("batch_size")
 
-        loader = loading.WPAPILoader(site_id=site_id)
-        loader.load_site(purge_first=purge_first,
-                         full=full,
-                         modified_after=modified_after,
-                         type=type,
-                         status=status,
-                         batch_size=batch_size)
+        loader = loading.WPAPILoader(site_id=site_id, using=options.get("database"))
+
+        if options.get("reconcile"):
+            loader.reconcile_site(type=type, status=status, action=options.get("reconcile_action"))
+            return
+
+        load_site_kwargs = dict(purge_first=purge_first,
+                                full=full,
+                                modified_after=modified_after,
+                                type=type,
+                                status=status,
+                                batch_size=batch_size)
+
+        if options.get("profile"):
+            from wordpress.profiling import profile_load
+
+            query_profile = profile_load(loader, options["profile"], **load_site_kwargs)
+            for line in query_profile.report():
+                self.stdout.write(line)
+            self.stdout.write("\nWrote profile to {0}; view it with: python -m pstats {0}".format(options["profile"]))
+        else:
+            loader.load_site(**load_site_kwargs)
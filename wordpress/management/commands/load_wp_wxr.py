@@ -0,0 +1,38 @@
+from __future__ import unicode_literals
+
+import logging
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    args = '<site_id> <path>'
+    help = "loads content from a WordPress export (WXR) file into the given site_id, as load_wp_api would from the API"
+
+    option_list = BaseCommand.option_list + (
+        make_option('--batch_size',
+                    type='int',
+                    dest='batch_size',
+                    default=100,
+                    help='The number of items to load at a time.'),
+        make_option('--database',
+                    type='string',
+                    dest='database',
+                    default=None,
+                    help='The database alias to load into, instead of the one chosen by settings and routers.'),
+    )
+
+    def handle(self, *args, **options):
+        from wordpress import loading
+        from wordpress.wxr import WXRImporter
+
+        if len(args) != 2:
+            raise CommandError("Give the site_id to load into, and the path of the WXR file.")
+        site_id, path = args
+
+        loader = loading.WPAPILoader(site_id=site_id, using=options.get("database"))
+        with open(path, "rb") as f:
+            WXRImporter(loader, batch_size=options["batch_size"]).load(f)
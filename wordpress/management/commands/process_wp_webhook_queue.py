@@ -0,0 +1,65 @@
+from __future__ import unicode_literals
+
+import logging
+from optparse import make_option
+import time
+
+from django.core.management.base import BaseCommand
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "loads the posts queued by the webhook, when WP_API_WEBHOOK_QUEUE is enabled; " \
+           "any number of workers can run at once"
+
+    option_list = BaseCommand.option_list + (
+        make_option('--batch_size',
+                    type='int',
+                    dest='batch_size',
+                    default=10,
+                    help='The number of jobs to claim at a time.'),
+        make_option('--poll_interval',
+                    type='float',
+                    dest='poll_interval',
+                    default=1.0,
+                    help='The number of seconds to wait before checking an empty queue again.'),
+        make_option('--claim_timeout',
+                    type='int',
+                    dest='claim_timeout',
+                    default=600,
+                    help='The number of seconds after which jobs claimed by a worker that died are claimed again.'),
+        make_option('--max_attempts',
+                    type='int',
+                    dest='max_attempts',
+                    default=5,
+                    help='The number of times to try loading a post before giving up on it.'),
+        make_option('--once',
+                    action='store_true',
+                    dest='once',
+                    default=False,
+                    help='Exit when the queue is empty, rather than waiting for more jobs.'),
+        make_option('--database',
+                    type='string',
+                    dest='database',
+                    default=None,
+                    help='The database alias of the queue, instead of the one chosen by settings and routers.'),
+    )
+
+    def handle(self, *args, **options):
+        from wordpress import jobs
+
+        num_processed = 0
+        while True:
+            num_claimed = jobs.process_jobs(batch_size=options["batch_size"],
+                                            claim_timeout=options["claim_timeout"],
+                                            max_attempts=options["max_attempts"],
+                                            using=options["database"])
+            num_processed += num_claimed
+
+            if not num_claimed:
+                if options["once"]:
+                    break
+                time.sleep(options["poll_interval"])
+
+        logger.info("processed %d jobs", num_processed)
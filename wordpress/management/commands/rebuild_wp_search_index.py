@@ -0,0 +1,35 @@
+from __future__ import unicode_literals
+
+import logging
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    args = '<site_id>'
+    help = "(re)builds the full-text search index of posts for the given site_id"
+
+    option_list = BaseCommand.option_list + (
+        make_option('--database',
+                    type='string',
+                    dest='database',
+                    default=None,
+                    help='The database alias of the index, instead of the one chosen by settings and routers.'),
+    )
+
+    def handle(self, *args, **options):
+        from wordpress import search
+        from wordpress.routers import get_sync_database
+
+        site_id = int(args[0])
+
+        backend = search.get_backend(options.get("database") or get_sync_database(site_id))
+        if not backend:
+            raise CommandError("The search index is disabled, or not supported by this database. "
+                               "Set WP_API_SEARCH_INDEX = True in settings to enable it.")
+
+        num_indexed = backend.rebuild(site_id)
+        logger.info("indexed %d posts for site %s", num_indexed, site_id)
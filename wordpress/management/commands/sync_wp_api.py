@@ -0,0 +1,93 @@
+from __future__ import unicode_literals
+
+import logging
+from optparse import make_option
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    args = '<site_id site_id ...>'
+    help = "keeps sites in sync with the Wordpress.com API, polling each one more often while its posts are changing; " \
+           "uses WP_API_SITE_ID if no site_ids are given"
+
+    option_list = BaseCommand.option_list + (
+        make_option('--min_interval',
+                    type='float',
+                    dest='min_interval',
+                    default=30,
+                    help='The number of seconds between syncs of a site whose posts are changing.'),
+        make_option('--max_interval',
+                    type='float',
+                    dest='max_interval',
+                    default=900,
+                    help='The max number of seconds between syncs of a site whose posts are not changing.'),
+        make_option('--backoff',
+                    type='float',
+                    dest='backoff',
+                    default=2.0,
+                    help='The factor to grow the interval by after a sync that found no changes.'),
+        make_option('--ref_data_interval',
+                    type='float',
+                    dest='ref_data_interval',
+                    default=3600,
+                    help='The number of seconds between crawls of tags, categories, authors, and media.'),
+        make_option('--type',
+                    type='choice',
+                    choices=['all', 'ref_data', 'attachment', 'post', 'page'],
+                    dest='type',
+                    default='all',
+                    help="The type of posts or information to sync."),
+        make_option('--status',
+                    type='choice',
+                    choices=['publish', 'private', 'draft', 'pending', 'future', 'trash', 'any'],
+                    dest='status',
+                    default='publish',
+                    help="Sync posts with a specific status, or 'any' status."),
+        make_option('--batch_size',
+                    type='int',
+                    dest='batch_size',
+                    default=None,
+                    help='Set the number of posts to load with each call to the WP API.'),
+        make_option('--once',
+                    action='store_true',
+                    dest='once',
+                    default=False,
+                    help='Sync each site once, then exit.'),
+        make_option('--database',
+                    type='string',
+                    dest='database',
+                    default=None,
+                    help='The database alias to sync to, instead of the one chosen by settings and routers.'),
+    )
+
+    def handle(self, *args, **options):
+        from wordpress.daemon import SyncDaemon
+
+        site_ids = list(args)
+        if not site_ids:
+            if not getattr(settings, "WP_API_SITE_ID", None):
+                raise CommandError("Give the site_ids to sync, or set WP_API_SITE_ID in settings.")
+            site_ids = [settings.WP_API_SITE_ID]
+
+        daemon = SyncDaemon(site_ids,
+                            min_interval=options["min_interval"],
+                            max_interval=options["max_interval"],
+                            backoff=options["backoff"],
+                            ref_data_interval=options["ref_data_interval"],
+                            type=options["type"],
+                            status=options["status"],
+                            batch_size=options["batch_size"],
+                            using=options["database"])
+
+        # finish the page of posts we're on, so that the next run resumes from its checkpoint
+        signal.signal(signal.SIGTERM, daemon.stop)
+        signal.signal(signal.SIGINT, daemon.stop)
+
+        logger.info("syncing site_ids=%s", ", ".join(str(site_id) for site_id in site_ids))
+        daemon.run(once=options["once"])
+        logger.info("stopped")
@@ -0,0 +1,176 @@
+from __future__ import unicode_literals
+
+from collections import defaultdict
+from contextlib import contextmanager
+import logging
+import time
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+import six
+
+
+logger = logging.getLogger(__name__)
+
+
+class LoggingSink(object):
+    """
+    Logs each metric, by default at DEBUG level on the wordpress.metrics logger.
+    """
+
+    def __init__(self, level=logging.DEBUG):
+        self.level = level
+
+    def timing(self, name, value, tags):
+        logger.log(self.level, "%s%s: %.1fms", name, format_tags(tags), value)
+
+    def incr(self, name, value, tags):
+        logger.log(self.level, "%s%s: +%s", name, format_tags(tags), value)
+
+
+class StatsdSink(object):
+    """
+    Sends metrics to a statsd-style client, with timing(name, ms) and incr(name, count) methods,
+    such as the one from the statsd package. Tags are appended to metric names, since plain statsd doesn't have them.
+    """
+
+    def __init__(self, client, prefix="wordpress"):
+        self.client = client
+        self.prefix = prefix
+
+    def metric_name(self, name, tags):
+        parts = [self.prefix, name] + ["{}_{}".format(key, tags[key]) for key in sorted(tags)]
+        return ".".join(part for part in parts if part)
+
+    def timing(self, name, value, tags):
+        self.client.timing(self.metric_name(name, tags), value)
+
+    def incr(self, name, value, tags):
+        self.client.incr(self.metric_name(name, tags), value)
+
+
+class CallbackSink(object):
+    """
+    Calls a function with (kind, name, value, tags) for each metric, where kind is "timing" or "incr".
+    """
+
+    def __init__(self, callback):
+        self.callback = callback
+
+    def timing(self, name, value, tags):
+        self.callback("timing", name, value, tags)
+
+    def incr(self, name, value, tags):
+        self.callback("incr", name, value, tags)
+
+
+def format_tags(tags):
+    if not tags:
+        return ""
+    return "[{}]".format(",".join("{}={}".format(key, tags[key]) for key in sorted(tags)))
+
+
+def get_sinks():
+    """
+    The sinks configured with WP_API_METRICS_SINKS in settings: a list of sink instances, or dotted paths of sink
+    classes to instantiate with no arguments. Defaults to no sinks.
+    """
+    sinks = []
+    for sink in getattr(settings, "WP_API_METRICS_SINKS", None) or []:
+        if isinstance(sink, six.string_types):
+            sink = import_string(sink)()
+        sinks.append(sink)
+    return sinks
+
+
+class Metrics(object):
+    """
+    Timers and counters for a sync, sent to any number of sinks.
+
+    Work is also attributed to phases (such as ref_data, posts, m2m, and attachments) with phase().
+    The time spent in each phase, and the db queries made during it (see wordpress.querytracking),
+    are totaled and sent when flush() is called, rather than once per phase, since some phases run once per post.
+    """
+
+    def __init__(self, sinks=None):
+        """
+        :param sinks: the sinks to send metrics to; if not given, we use get_sinks()
+        """
+        self.sinks = get_sinks() if sinks is None else list(sinks)
+        self.phases = []
+        self.phase_totals = defaultdict(lambda: {"time": 0.0, "db_queries": 0, "db_time": 0.0})
+
+    @property
+    def current_phase(self):
+        return self.phases[-1] if self.phases else None
+
+    def timing(self, name, value, **tags):
+        """
+        Send a timing.
+
+        :param name: the metric name
+        :param value: the time in milliseconds
+        :param tags: dimensions of the metric, e.g. endpoint="posts"
+        """
+        for sink in self.sinks:
+            sink.timing(name, value, tags)
+
+    def incr(self, name, value=1, **tags):
+        """
+        Send a counter increment.
+
+        :param name: the metric name
+        :param value: the amount to count
+        :param tags: dimensions of the metric, e.g. endpoint="posts"
+        """
+        if value:
+            for sink in self.sinks:
+                sink.incr(name, value, tags)
+
+    @contextmanager
+    def timer(self, name, **tags):
+        """
+        Time a block of code, e.g. with metrics.timer("api.request", endpoint="posts"): ...
+        """
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.timing(name, (time.time() - start) * 1000, **tags)
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Attribute the time and db queries of a block of code to a phase.
+        Phases can be nested, in which case the inner phase's time also counts toward the outer phase,
+        while its db queries only count toward the inner phase.
+        """
+        self.phases.append(name)
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.phase_totals[name]["time"] += time.time() - start
+            self.phases.pop()
+
+    def record_query(self, duration):
+        """
+        Attribute a db query to the current phase.
+
+        :param duration: the time the query took, in seconds
+        """
+        totals = self.phase_totals[self.current_phase or "other"]
+        totals["db_queries"] += 1
+        totals["db_time"] += duration
+
+    def flush(self):
+        """
+        Send the totals for each phase since the last flush.
+        """
+        for phase, totals in sorted(self.phase_totals.items()):
+            if totals["time"]:
+                self.timing("phase.time", totals["time"] * 1000, phase=phase)
+            self.incr("db.queries", totals["db_queries"], phase=phase)
+            if totals["db_queries"]:
+                self.timing("db.time", totals["db_time"] * 1000, phase=phase)
+        self.phase_totals.clear()
@@ -2,10 +2,12 @@ from __future__ import unicode_literals
 
 import collections
 
+from django.conf import settings
 from django.db import models
 from django.utils.translation import ugettext_lazy as _
 from django.core.urlresolvers import reverse
-from jsonfield import JSONField
+
+from wordpress.fields import CompressedTextField, CompressedJSONField, LazyJSONField
 
 
 class DateTracking(models.Model):
@@ -89,12 +91,73 @@ class Media(WordPressIDs, DateTracking, models.Model):
     caption = models.TextField(blank=True, null=True)
     description = models.TextField(blank=True, null=True)
     alt = models.TextField(blank=True, null=True)
-    exif = JSONField(load_kwargs={'object_pairs_hook': collections.OrderedDict})
+    exif = CompressedJSONField(load_kwargs={'object_pairs_hook': collections.OrderedDict})
 
     def __unicode__(self):
         return "{}: {}".format(self.pk, self.url)
 
 
+class PostQuerySet(models.QuerySet):
+    """
+    Ready-made read paths for sync'd posts, which avoid N+1 queries on related objects
+    and loading large columns that listings don't need.
+    """
+    listing_deferred_fields = ("content", "metadata", "parent", "post_thumbnail", "password")
+
+    def for_site(self, site_id=None):
+        """
+        Only posts from the given site, or the WP_API_SITE_ID in settings if not given.
+        If the site has its own database in WP_API_SITE_DATABASES, the posts come from there.
+        """
+        from wordpress.routers import get_site_database
+
+        if site_id is None:
+            site_id = settings.WP_API_SITE_ID
+
+        queryset = self.filter(site_id=int(site_id))
+
+        site_database = get_site_database(site_id)
+        if site_database and self._db is None:
+            queryset = queryset.using(site_database)
+
+        return queryset
+
+    def of_type(self, post_type):
+        """
+        Only posts with the given post_type: post, page, attachment, etc.
+        """
+        return self.filter(post_type=post_type)
+
+    def published(self):
+        """
+        Only published posts.
+        """
+        return self.filter(status="publish")
+
+    def with_relations(self):
+        """
+        Fetch the author with the posts, and prefetch tags, categories, and attachments in one query each.
+        """
+        return self.select_related("author").prefetch_related("tags", "categories", "attachments")
+
+    def for_listing(self):
+        """
+        Newest first, with author, tags, and categories, but without the large columns only a detail page needs.
+        """
+        return (self.select_related("author")
+                    .prefetch_related("tags", "categories")
+                    .defer(*self.listing_deferred_fields)
+                    .order_by("-sticky", "-post_date"))
+
+    def search(self, query):
+        """
+        Posts whose title, excerpt, or content match the query, best matches first.
+        Uses the full-text search index if WP_API_SEARCH_INDEX is enabled, else a (slow) icontains search.
+        """
+        from wordpress.search import search
+        return search(self, query)
+
+
 class Post(WordPressIDs, DateTracking, models.Model):
     author = models.ForeignKey("Author", blank=True, null=True)
     post_date = models.DateTimeField(blank=False, null=False)
@@ -105,7 +168,7 @@ class Post(WordPressIDs, DateTracking, models.Model):
                            help_text=_("The full permalink URL to the post"))
     short_url = models.CharField(max_length=1000, blank=False, null=False,
                                  help_text=_("The wp.me short URL"))
-    content = models.TextField(blank=True, null=True)
+    content = CompressedTextField(blank=True, null=True)
     excerpt = models.TextField(blank=True, null=True)
     slug = models.SlugField(max_length=200, blank=True, null=True, db_index=True)
     guid = models.CharField(max_length=1000, blank=True, null=True, db_index=True)
@@ -113,20 +176,81 @@ class Post(WordPressIDs, DateTracking, models.Model):
     sticky = models.BooleanField(default=False,
                                  help_text=_("Show this post at the top of the chronological list, even if old."))
     password = models.CharField(max_length=1000, blank=True, null=True)
-    parent = JSONField(load_kwargs={'object_pairs_hook': collections.OrderedDict}, blank=True, null=True)
+    parent = LazyJSONField(load_kwargs={'object_pairs_hook': collections.OrderedDict}, blank=True, null=True)
     post_type = models.CharField(max_length=20, blank=True, null=True)
     likes_enabled = models.NullBooleanField()
     sharing_enabled = models.NullBooleanField()
     like_count = models.IntegerField(blank=True, null=True)
     global_ID = models.CharField(max_length=1000)
     featured_image = models.CharField(max_length=1000)
-    post_thumbnail = JSONField(blank=True, null=True, load_kwargs={'object_pairs_hook': collections.OrderedDict})
+    post_thumbnail = CompressedJSONField(blank=True, null=True, load_kwargs={'object_pairs_hook': collections.OrderedDict})
     attachments = models.ManyToManyField("Media", blank=True)
     format = models.CharField(max_length=20)
     menu_order = models.IntegerField(blank=True, null=True)
     tags = models.ManyToManyField("Tag", blank=True)
     categories = models.ManyToManyField("Category", blank=True)
-    metadata = JSONField(load_kwargs={'object_pairs_hook': collections.OrderedDict})
+    metadata = CompressedJSONField(load_kwargs={'object_pairs_hook': collections.OrderedDict})
+
+    objects = PostQuerySet.as_manager()
 
     def __unicode__(self):
         return "{}: {}".format(self.pk, self.slug)
+
+
+class SyncState(DateTracking, models.Model):
+    """
+    Checkpoint for a crawl of a WordPress.com API endpoint,
+    so that an interrupted sync can resume where it stopped rather than starting over.
+    """
+    site_id = models.IntegerField(blank=False, null=False,
+                                  help_text=_("The site ID on Wordpress.com"))
+    endpoint = models.CharField(max_length=50, blank=False, null=False)
+    post_type = models.CharField(max_length=20, blank=True, null=False, default="")
+    status = models.CharField(max_length=20, blank=True, null=False, default="")
+    watermark = models.DateTimeField(blank=True, null=True,
+                                     help_text=_("The latest modified date of a fully completed crawl"))
+    run_modified_after = models.DateTimeField(blank=True, null=True,
+                                              help_text=_("The modified_after date the in-progress crawl was started with"))
+    run_watermark = models.DateTimeField(blank=True, null=True,
+                                         help_text=_("The latest modified date seen so far by the in-progress crawl"))
+    page_handle = models.CharField(max_length=1000, blank=True, null=True,
+                                   help_text=_("The API page handle of the next page of the in-progress crawl"))
+    page = models.IntegerField(blank=True, null=True,
+                               help_text=_("The page number of the next page of the in-progress crawl"))
+    num_processed = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ("site_id", "endpoint", "post_type", "status")
+
+    @property
+    def in_progress(self):
+        return bool(self.page_handle)
+
+    def __unicode__(self):
+        return "{}: {} {} {}".format(self.site_id, self.endpoint, self.post_type, self.status)
+
+
+class PostSyncJob(DateTracking, models.Model):
+    """
+    A request from the webhook to load a post, waiting for a worker.
+    Repeated requests for a post share one row, so each post is loaded once no matter how many times it was requested.
+    """
+    site_id = models.IntegerField(blank=False, null=False,
+                                  help_text=_("The site ID on Wordpress.com"))
+    wp_id = models.IntegerField(blank=False, null=False,
+                                help_text=_("The post ID on Wordpress.com"))
+    requested_at = models.DateTimeField(blank=False, null=False, db_index=True,
+                                        help_text=_("When the post was last requested"))
+    version = models.IntegerField(default=1,
+                                  help_text=_("Incremented with each request, so that a request that comes in while "
+                                              "the post is loading isn't lost"))
+    claimed_at = models.DateTimeField(blank=True, null=True)
+    claimed_by = models.CharField(max_length=100, blank=True, null=True, db_index=True,
+                                  help_text=_("The token of the worker batch loading the post"))
+    attempts = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ("site_id", "wp_id")
+
+    def __unicode__(self):
+        return "{}: {}".format(self.site_id, self.wp_id)
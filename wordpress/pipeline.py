@@ -0,0 +1,255 @@
+from __future__ import unicode_literals
+
+import logging
+import threading
+import time
+
+from django.conf import settings
+from six.moves import queue
+
+
+logger = logging.getLogger(__name__)
+
+# ends the items of a queue
+DONE = object()
+
+# how often stages waiting on a queue check whether the pipeline has been closed, in seconds
+POLL_INTERVAL = 0.01
+
+
+def get_pipeline_workers():
+    """
+    The number of worker threads for each stage of the post sync pipeline, from WP_API_PIPELINE_WORKERS in settings:
+    a dict of stage name to number of workers, e.g. {"transform": 4}. Stages not given have one worker.
+    """
+    return getattr(settings, "WP_API_PIPELINE_WORKERS", None) or {}
+
+
+def get_pipeline_queue_size():
+    """
+    The max number of items waiting between two stages of the post sync pipeline,
+    from WP_API_PIPELINE_QUEUE_SIZE in settings (default: 1).
+    """
+    return max(int(getattr(settings, "WP_API_PIPELINE_QUEUE_SIZE", 1)), 1)
+
+
+class PipelineClosed(Exception):
+    """
+    Raised in a stage's thread when the pipeline it's waiting on has been closed.
+    """
+
+
+class Stage(object):
+    """
+    A step of a Pipeline: a function applied to each item, by a number of worker threads.
+    """
+
+    def __init__(self, name, func, workers=1):
+        """
+        :param name: the name of the stage, for metrics
+        :param func: a function of an item that returns the item for the next stage;
+                     for the first stage, a function of no args that returns an iterable of items
+        :param workers: the number of threads to run the function in
+        """
+        self.name = name
+        self.func = func
+        self.workers = max(int(workers), 1)
+
+
+class Pipeline(object):
+    """
+    Passes items through stages of worker threads, connected by bounded queues,
+    and yields the results of the last stage to the caller, in order.
+
+    - The first stage is a source of items, iterated in a thread of its own.
+    - Each stage after it takes items from the queue before it, and puts its results on the queue after it.
+      With more than one worker, items can finish out of order, so they're numbered and put back in order at the end.
+    - Each queue holds up to queue_size items, so a slow stage holds up the stages before it,
+      rather than letting items pile up in memory.
+    - The caller consumes the results on its own thread, e.g. to write them to the db,
+      and counts as the last stage (consumer) for metrics.
+
+    For each stage, the pipeline sends the number of items processed (pipeline.items), the time spent on each
+    (pipeline.time), the time spent waiting for the stage before it (pipeline.wait), and the depth of its input queue
+    as it took each one (pipeline.queue_depth, sent as a timing, for its distribution).
+
+    If a stage raises an exception, the pipeline shuts down, and the exception is raised to the caller.
+    The caller should close() the pipeline when it's done, including when it stops early,
+    which stops the stages at their next item and waits for their threads to end.
+    """
+
+    def __init__(self, name, stages, queue_size=1, metrics=None, consumer="consumer"):
+        """
+        :param name: the name of the pipeline, for metrics
+        :param stages: the Stages, starting with the source
+        :param queue_size: the max number of items waiting between two stages
+        :param metrics: a Metrics to send stage metrics to
+        :param consumer: the name of the caller's stage, for metrics
+        """
+        self.name = name
+        self.source = stages[0]
+        self.stages = stages[1:]
+        self.metrics = metrics
+        self.consumer = consumer
+
+        self.queues = [queue.Queue(queue_size) for _ in stages]
+        self.closed = threading.Event()
+        self.error = None
+        self.threads = []
+        self.lock = threading.Lock()
+        self.num_finished = [0] * len(self.stages)
+
+    def __iter__(self):
+        self.start()
+
+        # results, by item number, that finished ahead of earlier ones
+        finished = {}
+        next_num = 0
+        while True:
+            wait_start = time.time()
+            while next_num not in finished:
+                num, item = self.get(self.queues[-1], raise_error=True)
+                if num is DONE:
+                    return
+                finished[num] = item
+            self.record(self.consumer, None, wait_start, time.time())
+
+            start = time.time()
+            yield finished.pop(next_num)
+            next_num += 1
+            self.record(self.consumer, start, None, None)
+
+    def start(self):
+        self.threads.append(threading.Thread(target=self.run_source, name="{}-{}".format(self.name, self.source.name)))
+        for index, stage in enumerate(self.stages):
+            for worker in range(stage.workers):
+                self.threads.append(threading.Thread(target=self.run_stage, args=(index,),
+                                                     name="{}-{}-{}".format(self.name, stage.name, worker)))
+
+        for thread in self.threads:
+            thread.daemon = True
+            thread.start()
+
+    def close(self):
+        """
+        Stop the stages, and wait for their threads to end.
+        """
+        self.closed.set()
+
+        # let go of the items in flight
+        for item_queue in self.queues:
+            try:
+                while True:
+                    item_queue.get_nowait()
+            except queue.Empty:
+                pass
+
+        for thread in self.threads:
+            thread.join()
+
+    def get(self, item_queue, raise_error=False):
+        """
+        Take an item from a queue, waiting until there is one, or the pipeline is closed.
+
+        :param item_queue: the queue
+        :param raise_error: if True, raise a stage's exception if it had one
+        :return: the item
+        """
+        while True:
+            if self.closed.is_set():
+                if raise_error and self.error:
+                    raise self.error
+                raise PipelineClosed()
+            try:
+                return item_queue.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                pass
+
+    def put(self, item_queue, item):
+        """
+        Put an item on a queue, waiting until there's room, or the pipeline is closed.
+        """
+        while True:
+            if self.closed.is_set():
+                raise PipelineClosed()
+            try:
+                return item_queue.put(item, timeout=POLL_INTERVAL)
+            except queue.Full:
+                pass
+
+    def fail(self, stage, error):
+        logger.exception("Error in %s stage of %s pipeline", stage.name, self.name)
+        with self.lock:
+            if not self.error:
+                self.error = error
+        self.closed.set()
+
+    def record(self, stage_name, start, wait_start, end, queue_depth=None):
+        """
+        Send the metrics of an item: the time spent on it since start, if given,
+        or the time spent waiting for it since wait_start, if given.
+        """
+        if not self.metrics:
+            return
+
+        now = time.time()
+        if start is not None:
+            self.metrics.incr("pipeline.items", pipeline=self.name, stage=stage_name)
+            self.metrics.timing("pipeline.time", (now - start) * 1000, pipeline=self.name, stage=stage_name)
+        if wait_start is not None:
+            self.metrics.timing("pipeline.wait", (end - wait_start) * 1000, pipeline=self.name, stage=stage_name)
+        if queue_depth is not None:
+            self.metrics.timing("pipeline.queue_depth", queue_depth, pipeline=self.name, stage=stage_name)
+
+    def run_source(self):
+        try:
+            items = iter(self.source.func())
+            num = 0
+            while True:
+                start = time.time()
+                try:
+                    item = next(items)
+                except StopIteration:
+                    break
+                self.record(self.source.name, start, None, None)
+
+                self.put(self.queues[0], (num, item))
+                num += 1
+
+            self.put(self.queues[0], (DONE, None))
+        except PipelineClosed:
+            pass
+        except Exception as e:
+            self.fail(self.source, e)
+
+    def run_stage(self, index):
+        stage = self.stages[index]
+        in_queue = self.queues[index]
+        out_queue = self.queues[index + 1]
+
+        try:
+            while True:
+                wait_start = time.time()
+                queue_depth = in_queue.qsize()
+                num, item = self.get(in_queue)
+
+                if num is DONE:
+                    # leave it for the stage's other workers, and end the stage once they've all seen it
+                    self.put(in_queue, (DONE, None))
+                    with self.lock:
+                        self.num_finished[index] += 1
+                        last = self.num_finished[index] == stage.workers
+                    if last:
+                        self.put(out_queue, (DONE, None))
+                    return
+
+                start = time.time()
+                self.record(stage.name, None, wait_start, start, queue_depth)
+                result = stage.func(item)
+                self.record(stage.name, start, None, None)
+
+                self.put(out_queue, (num, result))
+        except PipelineClosed:
+            pass
+        except Exception as e:
+            self.fail(stage, e)
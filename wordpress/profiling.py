@@ -0,0 +1,101 @@
+from __future__ import unicode_literals
+
+from collections import defaultdict
+import cProfile
+import os
+import sys
+
+from django.db import connections, router
+
+from wordpress.models import Post
+from wordpress.querytracking import track_queries
+
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+# frames in these files are never a query's call site
+TRACKING_FILES = set(os.path.join(PACKAGE_DIR, name) for name in ("querytracking.py", "profiling.py", "metrics.py"))
+
+
+def call_site():
+    """
+    Find the innermost frame of the wordpress app in the current stack, i.e. the app code that made a query.
+
+    :return: a "file.py:line in function" string
+    """
+    frame = sys._getframe(1)
+    while frame:
+        filename = os.path.abspath(frame.f_code.co_filename)
+        if filename.startswith(PACKAGE_DIR) and filename not in TRACKING_FILES:
+            return "{}:{} in {}".format(os.path.relpath(filename, PACKAGE_DIR), frame.f_lineno, frame.f_code.co_name)
+        frame = frame.f_back
+    return "(outside wordpress)"
+
+
+class QueryProfile(object):
+    """
+    Collects every query made during a sync, grouped by loader phase and by the call site that made it.
+    """
+
+    def __init__(self, metrics):
+        """
+        :param metrics: the loader's Metrics, for its current phase
+        """
+        self.metrics = metrics
+        # (phase, call site) -> {"count", "time", "sql"}
+        self.groups = defaultdict(lambda: {"count": 0, "time": 0.0, "sql": None})
+
+    def record(self, sql, params, duration):
+        group = self.groups[(self.metrics.current_phase or "other", call_site())]
+        group["count"] += 1
+        group["time"] += duration
+        if group["sql"] is None:
+            group["sql"] = sql
+
+    def phase_totals(self):
+        totals = defaultdict(lambda: {"count": 0, "time": 0.0})
+        for (phase, _), group in self.groups.items():
+            totals[phase]["count"] += group["count"]
+            totals[phase]["time"] += group["time"]
+        return totals
+
+    def report(self, limit=20):
+        """
+        Summarize the queries: totals per phase, then the call sites that spent the most time in the db.
+
+        :param limit: the number of call sites to list
+        :return: the lines of the report
+        """
+        lines = ["", "SQL by phase:", "  {:<14}{:>10}{:>12}".format("phase", "queries", "time (ms)")]
+        for phase, totals in sorted(self.phase_totals().items(), key=lambda item: -item[1]["time"]):
+            lines.append("  {:<14}{:>10}{:>12.1f}".format(phase, totals["count"], totals["time"] * 1000))
+
+        lines += ["", "Top {} SQL call sites by time:".format(limit),
+                  "  {:>8}{:>12}  {:<14}{}".format("queries", "time (ms)", "phase", "call site")]
+        top_groups = sorted(self.groups.items(), key=lambda item: -item[1]["time"])[:limit]
+        for (phase, site), group in top_groups:
+            lines.append("  {:>8}{:>12.1f}  {:<14}{}".format(group["count"], group["time"] * 1000, phase, site))
+            lines.append("  {:>34}{}".format("", " ".join(group["sql"].split())[:100]))
+
+        return lines
+
+
+def profile_load(loader, profile_path, **load_site_kwargs):
+    """
+    Run loader.load_site() under cProfile, capturing every query it makes.
+
+    :param loader: the WPAPILoader
+    :param profile_path: where to write the profile, for use with pstats, snakeviz, etc.
+    :param load_site_kwargs: passed on to load_site()
+    :return: the QueryProfile
+    """
+    query_profile = QueryProfile(loader.metrics)
+    connection = connections[loader.using or router.db_for_write(Post)]
+    profiler = cProfile.Profile()
+
+    with track_queries(connection, query_profile.record):
+        try:
+            profiler.runcall(loader.load_site, **load_site_kwargs)
+        finally:
+            profiler.dump_stats(profile_path)
+
+    return query_profile
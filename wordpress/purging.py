@@ -0,0 +1,97 @@
+from __future__ import unicode_literals
+
+import logging
+
+from django.db import connections, router, transaction
+from django.db.models import CASCADE, SET_NULL, DO_NOTHING
+
+
+logger = logging.getLogger(__name__)
+
+
+def purge_queryset(queryset, chunk_size=500):
+    """
+    Delete every row in a queryset, in bounded chunks of primary keys.
+
+    Unlike QuerySet.delete(), this doesn't use Django's deletion collector, which loads every row and every related row
+    into memory before deleting anything. Instead each chunk is removed with set-based DELETE statements:
+    many-to-many through rows first, then rows that cascade from it, then the rows themselves.
+    Note that no pre_delete / post_delete signals are sent.
+
+    :param queryset: the rows to delete
+    :param chunk_size: the number of rows to delete with each statement
+    :return: the number of rows deleted
+    """
+    model = queryset.model
+    using = queryset._db or router.db_for_write(model)
+    queryset = queryset.using(using).order_by("pk").values_list("pk", flat=True)
+    num_deleted = 0
+
+    while True:
+        pks = list(queryset[:chunk_size])
+        if not pks:
+            break
+
+        with transaction.atomic(using=using):
+            delete_rows(model, pks, using, chunk_size)
+
+        num_deleted += len(pks)
+        logger.info(" - purged %d %s", num_deleted, model._meta.verbose_name_plural)
+
+    return num_deleted
+
+
+def delete_rows(model, pks, using, chunk_size=500):
+    """
+    Delete rows of a model by primary key, along with the rows that depend on them.
+
+    :param model: the model class of the rows
+    :param pks: the primary keys of the rows to delete
+    :param using: the database alias
+    :param chunk_size: the chunk size for purging rows that cascade from these
+    :return: None
+    """
+    connection = connections[using]
+    placeholders = ", ".join(["%s"] * len(pks))
+    delete_sql = "DELETE FROM {} WHERE {} IN ({})"
+
+    with connection.cursor() as cursor:
+        for related_model, fk in get_foreign_keys_to(model):
+            on_delete = fk.rel.on_delete
+            related_rows = related_model._base_manager.db_manager(using).filter(**{fk.name + "__in": pks})
+
+            if related_model._meta.auto_created:
+                # many-to-many through rows: no need to look at them, just delete them
+                cursor.execute(delete_sql.format(connection.ops.quote_name(related_model._meta.db_table),
+                                                 connection.ops.quote_name(fk.column),
+                                                 placeholders),
+                               pks)
+            elif on_delete is CASCADE:
+                purge_queryset(related_rows, chunk_size)
+            elif on_delete is SET_NULL:
+                related_rows.update(**{fk.name: None})
+            elif on_delete is not DO_NOTHING:
+                raise ValueError("Can't purge {} with on_delete={} relation from {}".format(model.__name__,
+                                                                                            on_delete.__name__,
+                                                                                            related_model.__name__))
+
+        cursor.execute(delete_sql.format(connection.ops.quote_name(model._meta.db_table),
+                                         connection.ops.quote_name(model._meta.pk.column),
+                                         placeholders),
+                       pks)
+
+
+def get_foreign_keys_to(model):
+    """
+    Get the foreign keys (and one-to-one keys) that point to a model, including those of many-to-many through tables.
+
+    :param model: the model class
+    :return: a list of (related model class, foreign key field) tuples
+    """
+    if hasattr(model._meta, "get_fields"):
+        # Django 1.8+
+        return [(rel.related_model, rel.field) for rel in model._meta.get_fields(include_hidden=True)
+                if rel.auto_created and not rel.concrete and (rel.one_to_many or rel.one_to_one)]
+
+    # Django 1.7
+    return [(rel.field.model, rel.field) for rel in model._meta.get_all_related_objects(include_hidden=True)]
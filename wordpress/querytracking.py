@@ -0,0 +1,69 @@
+from __future__ import unicode_literals
+
+from contextlib import contextmanager
+import time
+
+
+class TrackingCursorWrapper(object):
+    """
+    Wraps a db cursor to report each query, with its duration, to a callback.
+    """
+
+    def __init__(self, cursor, callback):
+        self.cursor = cursor
+        self.callback = callback
+
+    def __getattr__(self, attr):
+        return getattr(self.cursor, attr)
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def execute(self, sql, params=None):
+        start = time.time()
+        try:
+            return self.cursor.execute(sql, params)
+        finally:
+            self.callback(sql, params, time.time() - start)
+
+    def executemany(self, sql, param_list):
+        start = time.time()
+        try:
+            return self.cursor.executemany(sql, param_list)
+        finally:
+            self.callback(sql, param_list, time.time() - start)
+
+
+@contextmanager
+def track_queries(connection, callback):
+    """
+    Report every query made on a db connection within the block to callback(sql, params, duration).
+
+    This wraps the cursors the connection makes, whether or not DEBUG is on,
+    and can be nested. The connection is only tracked in the current thread.
+
+    :param connection: the db connection, e.g. django.db.connections["default"]
+    :param callback: called with the SQL, its params, and its duration in seconds, after each query
+    """
+    # instance attributes shadow the connection's methods, and deleting them restores the originals
+    saved = dict((name, connection.__dict__[name]) for name in ("make_cursor", "make_debug_cursor")
+                 if name in connection.__dict__)
+    make_cursor = connection.make_cursor
+    make_debug_cursor = connection.make_debug_cursor
+
+    connection.make_cursor = lambda cursor: TrackingCursorWrapper(make_cursor(cursor), callback)
+    connection.make_debug_cursor = lambda cursor: TrackingCursorWrapper(make_debug_cursor(cursor), callback)
+    try:
+        yield
+    finally:
+        for name in ("make_cursor", "make_debug_cursor"):
+            if name in saved:
+                setattr(connection, name, saved[name])
+            else:
+                delattr(connection, name)
@@ -0,0 +1,178 @@
+from __future__ import unicode_literals
+
+from array import array
+from bisect import bisect_left
+from collections import namedtuple, OrderedDict
+import threading
+import zlib
+
+import six
+
+
+RefRecord = namedtuple("RefRecord", ["pk", "checksum"])
+
+
+def checksum(values):
+    """
+    Compute a compact checksum of a sequence of field values, for cheap change detection.
+
+    :param values: the field values, as python objects
+    :return: an unsigned 32 bit int
+    """
+    data = "\x1f".join(six.text_type(value) for value in values)
+    return zlib.crc32(data.encode("utf-8")) & 0xffffffff
+
+
+class RefDataIndex(object):
+    """
+    A compact map of WordPress IDs to local primary keys, with an optional checksum of the synced fields.
+
+    Rows loaded from the db are kept in sorted, typed arrays (a few bytes per row rather than a full model instance),
+    and looked up by binary search. Rows added afterwards go into a small overflow dict.
+    Lookups return RefRecord tuples.
+    """
+    __slots__ = ("_wp_ids", "_pks", "_checksums", "_overflow")
+
+    def __init__(self, rows=(), with_checksums=False):
+        """
+        :param rows: (wp_id, pk) or (wp_id, pk, checksum) tuples, sorted by wp_id
+        :param with_checksums: True if the rows include checksums
+        """
+        self._wp_ids = array(str("l"))
+        self._pks = array(str("l"))
+        self._checksums = array(str("L")) if with_checksums else None
+        self._overflow = {}
+
+        for row in rows:
+            self._wp_ids.append(row[0])
+            self._pks.append(row[1])
+            if with_checksums:
+                self._checksums.append(row[2])
+
+    @classmethod
+    def from_queryset(cls, queryset, checksum_fields=None):
+        """
+        Build an index from the db, streaming rows so that model instances are never created.
+
+        :param queryset: the rows to index
+        :param checksum_fields: the names of fields to include in each row's checksum, if any
+        :return: the RefDataIndex
+        """
+        fields = list(checksum_fields or [])
+        rows = queryset.order_by("wp_id").values_list("wp_id", "pk", *fields).iterator()
+
+        if fields:
+            rows = ((row[0], row[1], checksum(row[2:])) for row in rows)
+
+        return cls(rows, with_checksums=bool(fields))
+
+    def get(self, wp_id, default=None):
+        if wp_id in self._overflow:
+            return self._overflow[wp_id]
+
+        i = self._index_of(wp_id)
+        if i is None:
+            return default
+
+        return RefRecord(self._pks[i], self._checksums[i] if self._checksums is not None else None)
+
+    def __getitem__(self, wp_id):
+        record = self.get(wp_id)
+        if record is None:
+            raise KeyError(wp_id)
+        return record
+
+    def __setitem__(self, wp_id, record):
+        self._overflow[wp_id] = record
+
+    def __contains__(self, wp_id):
+        return self.get(wp_id) is not None
+
+    def __len__(self):
+        return len(self._wp_ids) + sum(1 for wp_id in self._overflow if self._index_of(wp_id) is None)
+
+    def _index_of(self, wp_id):
+        i = bisect_left(self._wp_ids, wp_id)
+        if i < len(self._wp_ids) and self._wp_ids[i] == wp_id:
+            return i
+        return None
+
+
+class LRURefMap(object):
+    """
+    A bounded, thread-safe map of WordPress IDs to RefRecords, evicting the least recently used.
+    Used to keep ref data warm across loads in a long-lived process, such as the webhook's workers.
+    """
+
+    def __init__(self, max_size=1000):
+        self.max_size = max_size
+        self._records = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, wp_id, default=None):
+        with self._lock:
+            record = self._records.pop(wp_id, None)
+            if record is None:
+                return default
+            self._records[wp_id] = record
+            return record
+
+    def __getitem__(self, wp_id):
+        record = self.get(wp_id)
+        if record is None:
+            raise KeyError(wp_id)
+        return record
+
+    def __setitem__(self, wp_id, record):
+        with self._lock:
+            self._records.pop(wp_id, None)
+            self._records[wp_id] = record
+            while len(self._records) > self.max_size:
+                self._records.popitem(last=False)
+
+    def __contains__(self, wp_id):
+        return self.get(wp_id) is not None
+
+    def __len__(self):
+        return len(self._records)
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+
+
+class RefDataCache(object):
+    """
+    Ref data maps for a site, shared by the loaders of a process.
+
+    The maps are cleared whenever the site's ref data generation in the Django cache changes,
+    which the loader bumps after it purges or reloads tags, categories, authors, or media.
+    """
+
+    def __init__(self, site_id, max_size=1000):
+        self.site_id = site_id
+        self.generation = None
+        self.maps = {
+            "authors": LRURefMap(max_size),
+            "categories": LRURefMap(max_size),
+            "tags": LRURefMap(max_size),
+            "media": LRURefMap(max_size)
+        }
+        self._lock = threading.Lock()
+
+    def get_maps(self):
+        """
+        Get the maps, first clearing them if the ref data might have changed since they were filled.
+
+        :return: a dict of LRURefMaps, keyed like WPAPILoader.ref_data_map
+        """
+        from wordpress.cache import get_ref_data_generation
+
+        generation = get_ref_data_generation(self.site_id)
+        with self._lock:
+            if generation != self.generation:
+                for ref_data_map in self.maps.values():
+                    ref_data_map.clear()
+                self.generation = generation
+
+        return self.maps
@@ -0,0 +1,106 @@
+from __future__ import unicode_literals
+
+import random
+
+from django.conf import settings
+from django.db import router
+import six
+
+
+def get_write_database():
+    """
+    The alias of the primary database that syncs write to, from WP_API_DATABASE_WRITE in settings, if any.
+    """
+    return getattr(settings, "WP_API_DATABASE_WRITE", None)
+
+
+def get_read_databases():
+    """
+    The aliases of replica databases for app reads, from WP_API_DATABASE_READ in settings, if any.
+    """
+    return list(getattr(settings, "WP_API_DATABASE_READ", None) or [])
+
+
+def get_site_database(site_id):
+    """
+    The alias of the database dedicated to a site, from WP_API_SITE_DATABASES in settings, if any.
+
+    :param site_id: the WordPress site ID
+    :return: a database alias, or None
+    """
+    site_databases = getattr(settings, "WP_API_SITE_DATABASES", None) or {}
+    if site_id is None:
+        return None
+    return site_databases.get(int(site_id)) or site_databases.get(str(site_id))
+
+
+def get_sync_database(site_id):
+    """
+    The database the loader should use for a site: its dedicated database if it has one, else the primary,
+    else the database the routers write posts to. It's never left to the routers per query,
+    since the loader reads what it's about to write, so it mustn't read from a replica.
+
+    :param site_id: the WordPress site ID
+    :return: a database alias
+    """
+    from wordpress.models import Post
+
+    return get_site_database(site_id) or get_write_database() or router.db_for_write(Post)
+
+
+class WordPressRouter(object):
+    """
+    A database router for the wordpress app, to add to DATABASE_ROUTERS in settings.
+
+    - Writes (including all of the loader's queries) go to WP_API_DATABASE_WRITE.
+    - App reads go to a random one of WP_API_DATABASE_READ, or WP_API_DATABASE_WRITE if there are none.
+    - Objects from a site listed in WP_API_SITE_DATABASES (a dict of site_id -> alias) are read from and written to
+      that database instead. Querysets can only be routed by site with Post.objects.for_site(), or .using().
+
+    Models from other apps are left to other routers.
+    """
+    app_label = "wordpress"
+
+    def _site_database(self, hints):
+        instance = hints.get("instance")
+        if instance is not None:
+            return get_site_database(getattr(instance, "site_id", None))
+        return None
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label != self.app_label:
+            return None
+
+        site_database = self._site_database(hints)
+        if site_database:
+            return site_database
+
+        read_databases = get_read_databases()
+        if read_databases:
+            return random.choice(read_databases)
+
+        return get_write_database()
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label != self.app_label:
+            return None
+
+        return self._site_database(hints) or get_write_database()
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if obj1._meta.app_label == self.app_label and obj2._meta.app_label == self.app_label:
+            return obj1._state.db == obj2._state.db
+        return None
+
+    def allow_migrate(self, db, app_label, model=None, **hints):
+        # Django 1.7 passes the model instead of its app_label
+        if not isinstance(app_label, six.string_types):
+            app_label = app_label._meta.app_label
+
+        if app_label != self.app_label:
+            return None
+
+        # replicas get their tables from replication
+        write_databases = set([get_write_database() or "default"])
+        write_databases.update((getattr(settings, "WP_API_SITE_DATABASES", None) or {}).values())
+        return db in write_databases
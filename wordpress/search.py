@@ -0,0 +1,344 @@
+from __future__ import unicode_literals
+
+import logging
+import re
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import Q
+
+from wordpress.fields import decompress
+from wordpress.utils import chunked
+
+
+logger = logging.getLogger(__name__)
+
+TABLE_NAME = "wordpress_post_search"
+
+
+def is_enabled():
+    """
+    The search index is opt-in, with WP_API_SEARCH_INDEX = True in settings, since it adds a table to the db.
+    """
+    return getattr(settings, "WP_API_SEARCH_INDEX", False)
+
+
+class SearchBackend(object):
+    """
+    Keeps a full-text index of post titles, excerpts, and content in a side table, keyed by post pk.
+    Subclasses implement the SQL for a specific database engine.
+
+    Rows are indexed from Python rather than with INSERT ... SELECT, since content may be stored compressed.
+
+    Backends are shared by every thread, so they keep the database alias, and look up the calling thread's connection
+    for it each time, since Django's connections can only be used by the thread that opened them.
+    """
+
+    def __init__(self, alias):
+        self.alias = alias
+        self.is_set_up = False
+        self.table = self.connection.ops.quote_name(TABLE_NAME)
+
+    @property
+    def connection(self):
+        return connections[self.alias]
+
+    @property
+    def post_table(self):
+        from wordpress.models import Post
+        return self.connection.ops.quote_name(Post._meta.db_table)
+
+    def set_up(self):
+        """
+        Create the index table if it doesn't exist yet.
+        """
+        if not self.is_set_up:
+            with self.connection.cursor() as cursor:
+                for sql in self.create_sql():
+                    cursor.execute(sql)
+            self.is_set_up = True
+
+    def sync_posts(self, site_id, wp_ids):
+        """
+        Bring the index up to date for the given posts: re-index the ones that exist, and drop the ones that don't.
+
+        Entries are replaced by post pk, which is the key of the index (the rowid, for SQLite),
+        rather than by site_id and wp_id, which aren't indexed in SQLite's FTS5 table.
+        Only posts that have been deleted, so have no pk to go by, are dropped by wp_id.
+
+        :param site_id: the WordPress site ID
+        :param wp_ids: the WordPress post IDs
+        :return: None
+        """
+        self.set_up()
+
+        from wordpress.models import Post
+
+        posts = Post.objects.using(self.alias).filter(site_id=site_id)
+
+        with transaction.atomic(using=self.alias):
+            with self.connection.cursor() as cursor:
+                for wp_ids_chunk in chunked(set(wp_ids), 500):
+                    rows = self.get_rows(posts.filter(wp_id__in=wp_ids_chunk))
+                    self.delete_rows(cursor, self.pk_column, [row[0] for row in rows])
+
+                    deleted_wp_ids = list(set(wp_ids_chunk) - set(row[2] for row in rows))
+                    self.delete_rows(cursor, "wp_id", deleted_wp_ids, site_id=site_id)
+
+                    self.insert_rows(cursor, rows)
+
+    def delete_rows(self, cursor, column, values, site_id=None):
+        """
+        Remove entries from the index.
+
+        :param cursor: a db cursor
+        :param column: the column to match the entries by
+        :param values: the values of the column to remove entries for
+        :param site_id: if given, only remove entries for this site
+        :return: None
+        """
+        if not values:
+            return
+
+        sql = "DELETE FROM {} WHERE {} IN ({})".format(self.table, column, ", ".join(["%s"] * len(values)))
+        params = list(values)
+        if site_id is not None:
+            sql += " AND site_id = %s"
+            params.append(site_id)
+        cursor.execute(sql, params)
+
+    @staticmethod
+    def get_rows(posts):
+        """
+        Get the values to index for posts.
+
+        :param posts: a Post queryset
+        :return: a list of (pk, site_id, wp_id, title, excerpt, content) tuples
+        """
+        return [(pk, site_id, wp_id, title or "", excerpt or "", decompress(content) or "")
+                for pk, site_id, wp_id, title, excerpt, content
+                in posts.values_list("pk", "site_id", "wp_id", "title", "excerpt", "content")]
+
+    def insert_rows(self, cursor, rows):
+        """
+        Add posts to the index.
+
+        :param cursor: a db cursor
+        :param rows: the posts' values, from get_rows()
+        :return: None
+        """
+        if rows:
+            cursor.executemany(self.insert_sql(), [self.insert_params(row) for row in rows])
+
+    def insert_params(self, row):
+        return list(row)
+
+    def rebuild(self, site_id, chunk_size=500):
+        """
+        Index every post in the site from scratch, in chunks.
+
+        :param site_id: the WordPress site ID
+        :param chunk_size: the number of posts to index with each statement
+        :return: the number of posts indexed
+        """
+        from wordpress.models import Post
+
+        self.set_up()
+
+        with self.connection.cursor() as cursor:
+            cursor.execute("DELETE FROM {} WHERE site_id = %s".format(self.table), [site_id])
+
+        num_indexed = 0
+        last_pk = 0
+        posts = Post.objects.using(self.alias).filter(site_id=site_id).order_by("pk")
+        while True:
+            pks = list(posts.filter(pk__gt=last_pk).values_list("pk", flat=True)[:chunk_size])
+            if not pks:
+                break
+
+            with self.connection.cursor() as cursor:
+                self.insert_rows(cursor, self.get_rows(posts.filter(pk__in=pks)))
+
+            num_indexed += len(pks)
+            last_pk = pks[-1]
+            logger.info(" - indexed %d posts", num_indexed)
+
+        return num_indexed
+
+    def prune(self, site_id):
+        """
+        Drop index entries for posts that no longer exist, e.g. after a purge.
+
+        :param site_id: the WordPress site ID
+        :return: None
+        """
+        self.set_up()
+
+        with self.connection.cursor() as cursor:
+            sql = ("DELETE FROM {table} WHERE site_id = %s AND {pk} NOT IN "
+                   "(SELECT id FROM {post_table} WHERE site_id = %s)")
+            cursor.execute(sql.format(table=self.table, pk=self.pk_column, post_table=self.post_table),
+                           [site_id, site_id])
+
+    def filter(self, queryset, query):
+        """
+        Limit a Post queryset to posts matching the query, best matches first.
+
+        :param queryset: the Post queryset
+        :param query: the search terms
+        :return: the filtered queryset, annotated with search_rank
+        """
+        self.set_up()
+        rank_sql, rank_params = self.rank_sql(query)
+        match_sql, match_params = self.match_sql(query)
+
+        return queryset.extra(select={"search_rank": rank_sql},
+                              select_params=rank_params,
+                              where=["{}.id IN ({})".format(self.post_table, match_sql)],
+                              params=match_params).order_by("-search_rank")
+
+
+class PostgreSQLSearchBackend(SearchBackend):
+    """
+    Stores a weighted tsvector per post with a GIN index. Needs PostgreSQL 9.5+.
+    The text search configuration can be set with WP_API_SEARCH_CONFIG (default: "english").
+    """
+    pk_column = "post_id"
+
+    @property
+    def config(self):
+        config = getattr(settings, "WP_API_SEARCH_CONFIG", "english")
+        if not re.match(r"^\w+$", config):
+            raise ValueError("Invalid WP_API_SEARCH_CONFIG: {}".format(config))
+        return config
+
+    def create_sql(self):
+        return [
+            "CREATE TABLE IF NOT EXISTS {table} ("
+            "post_id integer PRIMARY KEY REFERENCES {post_table} (id) ON DELETE CASCADE, "
+            "site_id integer NOT NULL, "
+            "wp_id integer NOT NULL, "
+            "document tsvector NOT NULL)".format(table=self.table, post_table=self.post_table),
+            "CREATE INDEX IF NOT EXISTS {} ON {} USING GIN (document)".format(
+                self.connection.ops.quote_name(TABLE_NAME + "_document"), self.table),
+            "CREATE INDEX IF NOT EXISTS {} ON {} (site_id, wp_id)".format(
+                self.connection.ops.quote_name(TABLE_NAME + "_site_id_wp_id"), self.table),
+        ]
+
+    def insert_sql(self):
+        # titles count more than excerpts, which count more than content
+        return ("INSERT INTO {} (post_id, site_id, wp_id, document) VALUES (%s, %s, %s, "
+                "setweight(to_tsvector(%s::regconfig, %s), 'A') || "
+                "setweight(to_tsvector(%s::regconfig, %s), 'B') || "
+                "setweight(to_tsvector(%s::regconfig, %s), 'C'))".format(self.table))
+
+    def insert_params(self, row):
+        pk, site_id, wp_id, title, excerpt, content = row
+        return [pk, site_id, wp_id, self.config, title, self.config, excerpt, self.config, content]
+
+    def match_sql(self, query):
+        return ("SELECT post_id FROM {} WHERE document @@ plainto_tsquery(%s, %s)".format(self.table),
+                [self.config, query])
+
+    def rank_sql(self, query):
+        return ("SELECT ts_rank(document, plainto_tsquery(%s, %s)) FROM {} "
+                "WHERE post_id = {}.id".format(self.table, self.post_table),
+                [self.config, query])
+
+
+class SQLiteSearchBackend(SearchBackend):
+    """
+    Stores posts in an FTS5 virtual table, with the post pk as the rowid.
+    """
+    pk_column = "rowid"
+
+    def create_sql(self):
+        return [
+            "CREATE VIRTUAL TABLE IF NOT EXISTS {} USING fts5("
+            "site_id UNINDEXED, wp_id UNINDEXED, title, excerpt, content)".format(self.table),
+        ]
+
+    def insert_sql(self):
+        return "INSERT INTO {} (rowid, site_id, wp_id, title, excerpt, content) VALUES (%s, %s, %s, %s, %s, %s)".format(self.table)
+
+    @staticmethod
+    def fts_query(query):
+        # quote each term so that user input can't be parsed as FTS5 query syntax
+        return " ".join('"{}"'.format(term.replace('"', '""')) for term in query.split())
+
+    def match_sql(self, query):
+        return "SELECT rowid FROM {table} WHERE {table} MATCH %s".format(table=self.table), [self.fts_query(query)]
+
+    def rank_sql(self, query):
+        # bm25 is lower for better matches; titles count more than excerpts, which count more than content
+        return ("SELECT -bm25({table}, 0, 0, 10.0, 5.0, 1.0) FROM {table} "
+                "WHERE {table} MATCH %s AND rowid = {post_table}.id".format(table=self.table, post_table=self.post_table),
+                [self.fts_query(query)])
+
+
+backend_classes = {
+    "postgresql": PostgreSQLSearchBackend,
+    "sqlite": SQLiteSearchBackend,
+}
+
+_backends = {}
+
+
+def get_backend(using=None):
+    """
+    Get the search backend for a database, or None if the index is disabled or the engine isn't supported.
+
+    :param using: the database alias; if not given, the alias the router picks for writing posts
+    :return: a SearchBackend or None
+    """
+    from wordpress.models import Post
+
+    if not is_enabled():
+        return None
+
+    using = using or router.db_for_write(Post)
+    if using not in _backends:
+        backend_class = backend_classes.get(connections[using].vendor)
+        _backends[using] = backend_class(using) if backend_class else None
+
+    return _backends[using]
+
+
+def sync_posts(site_id, wp_ids, using=None):
+    """
+    Update the index for posts that have been inserted, updated, or deleted, if the index is enabled.
+    """
+    backend = get_backend(using)
+    if backend and wp_ids:
+        backend.sync_posts(site_id, wp_ids)
+
+
+def prune(site_id, using=None):
+    """
+    Drop index entries for deleted posts, if the index is enabled.
+    """
+    backend = get_backend(using)
+    if backend:
+        backend.prune(site_id)
+
+
+def search(queryset, query):
+    """
+    Limit a Post queryset to posts matching the query.
+    Uses the full-text index if it's enabled and the db supports it, else falls back to a (slow) icontains search.
+
+    :param queryset: the Post queryset
+    :param query: the search terms
+    :return: the filtered queryset
+    """
+    if not query.split():
+        return queryset.none()
+
+    backend = get_backend(queryset.db)
+    if backend:
+        return backend.filter(queryset, query)
+
+    q = Q()
+    for term in query.split():
+        q &= Q(title__icontains=term) | Q(excerpt__icontains=term) | Q(content__icontains=term)
+    return queryset.filter(q)
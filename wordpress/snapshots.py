@@ -0,0 +1,357 @@
+from __future__ import unicode_literals
+
+import datetime
+import gzip
+import json
+import logging
+
+from django.db import models, transaction
+from django.utils import timezone
+
+from wordpress import search
+from wordpress.cache import invalidate_posts, invalidate_ref_data
+from wordpress.fields import LazyJSONField, RawJSON, decompress, is_compressed
+from wordpress.models import Author, Category, Tag, Media, Post, SyncState
+from wordpress.purging import purge_queryset
+from wordpress.routers import get_sync_database
+from wordpress.utils import chunked
+
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = "wordpress-snapshot"
+SNAPSHOT_VERSION = 1
+
+# in the order they're written and loaded, since posts refer to the rest
+SNAPSHOT_MODELS = (Author, Category, Tag, Media, Post)
+
+# relations of posts, written as the wp_ids of the related objects
+POST_RELATIONS = ("categories", "tags", "attachments")
+
+# set by the db on every insert, so not worth writing
+SKIPPED_FIELDS = ("id", "site_id", "created_date", "updated_date")
+
+
+def snapshot_fields(model):
+    """
+    The names of a model's fields that are written to snapshots, as they're stored.
+    Foreign keys (i.e. the post author) aren't included; they're written separately as wp_ids.
+    """
+    return [field.name for field in model._meta.concrete_fields
+            if field.name not in SKIPPED_FIELDS and not field.rel]
+
+
+def encode_value(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    raise TypeError("{!r} is not JSON serializable".format(value))
+
+
+class SnapshotWriter(object):
+    """
+    Writes a snapshot as gzipped JSON lines: a header, then a section for each model,
+    i.e. a line with the model's field names, followed by a JSON array of values for each row.
+    """
+
+    def __init__(self, fileobj):
+        self.file = gzip.GzipFile(fileobj=fileobj, mode="wb")
+
+    def write(self, data):
+        line = json.dumps(data, default=encode_value, separators=(",", ":"), ensure_ascii=False) + "\n"
+        self.file.write(line.encode("utf-8"))
+
+    def close(self):
+        self.file.close()
+
+
+class SnapshotReader(object):
+    """
+    Reads a snapshot written by SnapshotWriter, one line at a time.
+    """
+
+    def __init__(self, fileobj):
+        self.file = gzip.GzipFile(fileobj=fileobj, mode="rb")
+
+        self.header = self.read()
+        if not isinstance(self.header, dict) or self.header.get("format") != SNAPSHOT_FORMAT:
+            raise ValueError("Not a WordPress snapshot.")
+        if self.header.get("version") != SNAPSHOT_VERSION:
+            raise ValueError("Unsupported snapshot version: {}".format(self.header.get("version")))
+
+    def read(self):
+        line = self.file.readline()
+        return json.loads(line.decode("utf-8")) if line else None
+
+    def __iter__(self):
+        while True:
+            data = self.read()
+            if data is None:
+                break
+            yield data
+
+
+def export_snapshot(site_id, fileobj, using=None, chunk_size=500):
+    """
+    Write all of a site's synced content to a snapshot: its authors, categories, tags, media, and posts,
+    with the posts' authors, categories, tags, and attachments, and the watermarks of its completed crawls.
+
+    Rows are read in chunks of primary keys, so memory use stays flat however large the site is.
+    Compressed content is written decompressed, since the whole snapshot is compressed.
+
+    :param site_id: the WordPress site ID
+    :param fileobj: a file opened for writing in binary mode
+    :param using: the database alias to read from; if not given, the site's sync database
+    :param chunk_size: the number of rows to read at a time
+    :return: a dict of the number of rows written, by model name
+    """
+    site_id = int(site_id)
+    using = using or get_sync_database(site_id)
+
+    writer = SnapshotWriter(fileobj)
+    writer.write({"format": SNAPSHOT_FORMAT,
+                  "version": SNAPSHOT_VERSION,
+                  "site_id": site_id,
+                  "created": timezone.now()})
+
+    counts = {}
+    for model in SNAPSHOT_MODELS:
+        counts[model._meta.model_name] = export_model(writer, model, site_id, using, chunk_size)
+
+    sync_states = (SyncState.objects.using(using)
+                                    .filter(site_id=site_id, watermark__isnull=False)
+                                    .values_list("endpoint", "post_type", "status", "watermark"))
+    writer.write({"model": "syncstate", "fields": ["endpoint", "post_type", "status", "watermark"]})
+    counts["syncstate"] = 0
+    for row in sync_states:
+        writer.write(row)
+        counts["syncstate"] += 1
+
+    writer.close()
+    return counts
+
+
+def export_model(writer, model, site_id, using, chunk_size=500):
+    """
+    Write a model's section of a snapshot.
+
+    :return: the number of rows written
+    """
+    field_names = snapshot_fields(model)
+    columns = list(field_names)
+    if model is Post:
+        columns.append("author")
+        columns.extend(POST_RELATIONS)
+
+    writer.write({"model": model._meta.model_name, "fields": columns})
+
+    queryset = model.objects.using(using).filter(site_id=site_id).order_by("pk")
+    values_fields = ["pk"] + field_names + (["author__wp_id"] if model is Post else [])
+
+    num_written = 0
+    last_pk = 0
+    while True:
+        # values_list() returns the stored strings for compressed and JSON fields, without decoding them
+        rows = list(queryset.filter(pk__gt=last_pk).values_list(*values_fields)[:chunk_size])
+        if not rows:
+            break
+
+        if model is Post:
+            related_wp_ids = dict((field_name, get_related_wp_ids(field_name, [row[0] for row in rows], using))
+                                  for field_name in POST_RELATIONS)
+
+        for row in rows:
+            values = [decompress(value) if is_compressed(value) else value for value in row[1:]]
+            if model is Post:
+                values.extend(related_wp_ids[field_name].get(row[0], []) for field_name in POST_RELATIONS)
+            writer.write(values)
+
+        num_written += len(rows)
+        last_pk = rows[-1][0]
+
+    logger.info(" - exported %d %s", num_written, model._meta.verbose_name_plural)
+    return num_written
+
+
+def get_related_wp_ids(field_name, post_pks, using):
+    """
+    Look up the wp_ids of the objects related to some posts with a many to many field, in one query.
+
+    :return: a dict of post pk -> list of wp_ids
+    """
+    field = Post._meta.get_field(field_name)
+    through = field.rel.through
+
+    related_wp_ids = {}
+    rows = (through.objects.using(using)
+                           .filter(**{field.m2m_field_name() + "__in": post_pks})
+                           .order_by("pk")
+                           .values_list(field.m2m_column_name(), field.m2m_reverse_field_name() + "__wp_id"))
+    for post_pk, wp_id in rows:
+        related_wp_ids.setdefault(post_pk, []).append(wp_id)
+
+    return related_wp_ids
+
+
+def import_snapshot(fileobj, site_id=None, using=None, chunk_size=500, purge=False):
+    """
+    Load a snapshot written by export_snapshot() into a site with no synced content.
+
+    Rows are inserted in bulk, a chunk at a time, so memory use stays flat however large the snapshot is.
+    An incremental sync afterwards brings in whatever changed since the snapshot was made.
+
+    :param fileobj: a file opened for reading in binary mode
+    :param site_id: the WordPress site ID to load into; if not given, the site the snapshot was made from
+    :param using: the database alias to write to; if not given, the site's sync database
+    :param chunk_size: the number of rows to insert at a time
+    :param purge: delete the site's existing content first -- careful, this is destructive!
+        If not set and the site has any content, nothing is loaded.
+    :return: a dict of the number of rows loaded, by model name
+    """
+    reader = SnapshotReader(fileobj)
+
+    site_id = int(reader.header["site_id"] if site_id is None else site_id)
+    using = using or get_sync_database(site_id)
+
+    if purge:
+        purge_site(site_id, using, chunk_size)
+    elif any(model.objects.using(using).filter(site_id=site_id).exists() for model in SNAPSHOT_MODELS):
+        raise ValueError("Site {} already has content; purge it first to load a snapshot.".format(site_id))
+
+    models = dict((model._meta.model_name, model) for model in SNAPSHOT_MODELS + (SyncState,))
+    counts = {}
+    model = columns = None
+    rows = []
+
+    for data in reader:
+        if isinstance(data, dict):
+            if rows:
+                import_rows(model, columns, rows, site_id, using)
+                counts[model._meta.model_name] += len(rows)
+                rows = []
+
+            if data.get("model") not in models:
+                raise ValueError("Unknown model in snapshot: {}".format(data.get("model")))
+            model = models[data["model"]]
+            columns = data["fields"]
+            counts[model._meta.model_name] = 0
+            continue
+
+        rows.append(data)
+        if len(rows) >= chunk_size:
+            import_rows(model, columns, rows, site_id, using)
+            counts[model._meta.model_name] += len(rows)
+            rows = []
+
+    if rows:
+        import_rows(model, columns, rows, site_id, using)
+        counts[model._meta.model_name] += len(rows)
+
+    invalidate_ref_data(site_id)
+
+    search_backend = search.get_backend(using)
+    if search_backend:
+        search_backend.rebuild(site_id, chunk_size)
+
+    return counts
+
+
+def purge_site(site_id, using, chunk_size=500):
+    """
+    Delete all of a site's synced content, and its cached posts.
+    """
+    posts = Post.objects.using(using).filter(site_id=site_id)
+    cache_values = posts.values_list("wp_id", "slug", "guid", "post_type").iterator()
+    for chunk in chunked(cache_values, chunk_size):
+        invalidate_posts(site_id, chunk)
+
+    for model in reversed(SNAPSHOT_MODELS):
+        purge_queryset(model.objects.using(using).filter(site_id=site_id), chunk_size)
+    SyncState.objects.using(using).filter(site_id=site_id).delete()
+
+    search.prune(site_id, using=using)
+    invalidate_ref_data(site_id)
+
+
+def import_rows(model, columns, rows, site_id, using):
+    """
+    Insert a chunk of rows from a snapshot, along with their relations.
+    """
+    if model is SyncState:
+        watermark_field = SyncState._meta.get_field("watermark")
+        with transaction.atomic(using=using):
+            for row in rows:
+                values = dict(zip(columns, row))
+                watermark = watermark_field.to_python(values["watermark"])
+                SyncState.objects.using(using).update_or_create(
+                    site_id=site_id, endpoint=values["endpoint"], post_type=values["post_type"],
+                    status=values["status"], defaults={"watermark": watermark})
+        return
+
+    if model is Post:
+        author_pks = get_pks(Author, site_id, [row[columns.index("author")] for row in rows], using)
+
+    relations = dict((field_name, []) for field_name in POST_RELATIONS)
+    objs = []
+    for row in rows:
+        values = dict(zip(columns, row))
+        if model is Post:
+            values["author_id"] = author_pks.get(values.pop("author"))
+            for field_name in POST_RELATIONS:
+                relations[field_name].append(values.pop(field_name))
+        objs.append(model(site_id=site_id, **snapshot_values(model, values)))
+
+    with transaction.atomic(using=using):
+        model.objects.using(using).bulk_create(objs)
+
+        if model is Post:
+            add_post_relations(objs, relations, site_id, using)
+
+
+def snapshot_values(model, values):
+    """
+    Convert the values of a row as written to a snapshot to model field values.
+    """
+    for field_name, value in values.items():
+        field = model._meta.get_field(field_name)
+        if value is None:
+            continue
+        if isinstance(field, LazyJSONField):
+            # stored JSON is saved back as is, without being decoded and encoded again
+            values[field_name] = RawJSON(value)
+        elif isinstance(field, models.DateTimeField):
+            values[field_name] = field.to_python(value)
+    return values
+
+
+def get_pks(model, site_id, wp_ids, using):
+    """
+    Look up the primary keys of a site's objects by wp_id, in chunks.
+
+    :return: a dict of wp_id -> pk
+    """
+    pks = {}
+    for wp_ids_chunk in chunked(set(wp_ids) - {None}, 500):
+        pks.update(model.objects.using(using).filter(site_id=site_id, wp_id__in=wp_ids_chunk).values_list("wp_id", "pk"))
+    return pks
+
+
+def add_post_relations(posts, relations, site_id, using):
+    """
+    Add the categories, tags, and attachments of a chunk of newly inserted posts.
+    Related objects that aren't in the db are skipped, as the loader does.
+    """
+    post_pks = get_pks(Post, site_id, [post.wp_id for post in posts], using)
+
+    for field_name in POST_RELATIONS:
+        field = Post._meta.get_field(field_name)
+        through = field.rel.through
+        related_pks = get_pks(field.rel.to, site_id,
+                              [wp_id for wp_ids in relations[field_name] for wp_id in wp_ids], using)
+
+        through_objs = []
+        for post, wp_ids in zip(posts, relations[field_name]):
+            for wp_id in wp_ids:
+                if wp_id in related_pks:
+                    through_objs.append(through(**{field.m2m_column_name(): post_pks[post.wp_id],
+                                                   field.m2m_reverse_name(): related_pks[wp_id]}))
+        through.objects.using(using).bulk_create(through_objs)
@@ -0,0 +1,167 @@
+from __future__ import unicode_literals
+
+import logging
+import math
+import threading
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase
+from mock import patch, Mock
+from requests import Response
+
+from .. import loading
+from ..backends import WPComBackend, WPV2Backend
+from ..models import Post, Author, Category, Tag
+
+
+API_BASE_URL = "https://example.com/wp-json/wp/v2/"
+
+
+class FakeV2Site(object):
+    """
+    Serves requests.get() calls for a few v2 API endpoints, and records them.
+    """
+
+    def __init__(self, num_posts):
+        self.categories = [{"id": 1, "name": "News", "slug": "news", "description": "All the news", "count": num_posts,
+                            "parent": 0}]
+        self.tags = [{"id": 2, "name": "Django", "slug": "django", "description": "", "count": num_posts}]
+        self.author = {"id": 3, "name": "Ann Author", "slug": "ann", "url": "", "link": API_BASE_URL + "author/ann",
+                       "avatar_urls": {"24": "https://example.com/24.png", "96": "https://example.com/96.png"}}
+        self.posts = [self.api_post(wp_id) for wp_id in range(num_posts, 0, -1)]
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def api_post(self, wp_id):
+        return {
+            "id": wp_id,
+            "date_gmt": "2017-01-0{}T12:00:00".format(wp_id),
+            "modified_gmt": "2017-02-0{}T12:00:00".format(wp_id),
+            "guid": {"rendered": "https://example.com/?p={}".format(wp_id)},
+            "slug": "post-{}".format(wp_id),
+            "status": "publish",
+            "type": "post",
+            "link": "https://example.com/post-{}/".format(wp_id),
+            "title": {"rendered": "Post {}".format(wp_id)},
+            "content": {"rendered": "<p>Content {}</p>".format(wp_id)},
+            "excerpt": {"rendered": "<p>Excerpt {}</p>".format(wp_id)},
+            "author": 3,
+            "featured_media": 10,
+            "sticky": False,
+            "format": "standard",
+            "meta": [],
+            "categories": [1],
+            "tags": [2],
+            "_embedded": {
+                "author": [self.author],
+                "wp:featuredmedia": [{"id": 10, "source_url": "https://example.com/image.jpg",
+                                      "mime_type": "image/jpeg", "media_details": {"width": 640, "height": 480}}],
+                "wp:term": [[{"id": 1, "name": "News", "slug": "news"}], [{"id": 2, "name": "Django", "slug": "django"}]],
+            },
+        }
+
+    def get(self, url, headers=None, params=None):
+        endpoint = url[len(API_BASE_URL):]
+        with self.lock:
+            self.requests.append((endpoint, params))
+
+        objs = {"posts": self.posts, "categories": self.categories, "tags": self.tags, "users": [self.author],
+                "media": []}[endpoint]
+        if "include[]" in params:
+            objs = [obj for obj in objs if obj["id"] in params["include[]"]]
+
+        per_page = params.get("per_page", 10)
+        offset = params.get("offset", (params.get("page", 1) - 1) * per_page)
+        return self.response(objs[offset:offset + per_page], len(objs),
+                             int(math.ceil(float(len(objs)) / per_page)))
+
+    @staticmethod
+    def response(data, total, total_pages):
+        response = Mock(Response)
+        response.ok = True
+        response.status_code = 200
+        response.text = "some text"
+        response.content = b"some text"
+        response.headers = {"X-WP-Total": str(total), "X-WP-TotalPages": str(total_pages)}
+        response.json = lambda: data
+        return response
+
+
+class WPAPIBackendTest(TestCase):
+
+    def setUp(self):
+        logging.getLogger('wordpress.loading').addHandler(logging.NullHandler())
+
+    def test_backend(self):
+        self.assertIsInstance(loading.WPAPILoader(site_id=1).backend, WPComBackend)
+
+        with self.settings(WP_API_VERSION="v2", WP_API_BASE_URL=API_BASE_URL):
+            loader = loading.WPAPILoader(site_id=1)
+        self.assertIsInstance(loader.backend, WPV2Backend)
+        self.assertEqual(loader.api_base_url, API_BASE_URL)
+
+        # self-hosted sites have no standard URL
+        with self.assertRaises(ImproperlyConfigured):
+            loading.WPAPILoader(site_id=1, api_version="v2")
+
+    def test_load_posts(self):
+        site = FakeV2Site(num_posts=5)
+        loader = loading.WPAPILoader(site_id=1, api_base_url=API_BASE_URL, api_version="v2")
+        loader.backend.prefetch_pages = 2
+
+        with patch("requests.get", side_effect=site.get):
+            loader.load_site(type="post", batch_size=2)
+
+        post = Post.objects.get(wp_id=5)
+        self.assertEqual(post.title, "Post 5")
+        self.assertEqual(post.post_date.isoformat(), "2017-01-05T12:00:00+00:00")
+        self.assertEqual(post.featured_image, "https://example.com/image.jpg")
+        self.assertEqual(post.author.name, "Ann Author")
+        self.assertEqual(post.author.avatar_url, "https://example.com/96.png")
+        self.assertEqual([category.description for category in post.categories.all()], ["All the news"])
+        self.assertEqual([tag.name for tag in post.tags.all()], ["Django"])
+        self.assertEqual(Post.objects.count(), 5)
+        self.assertEqual(Author.objects.count(), 1)
+
+        # each page requested once, with embeds, and each taxonomy's terms fetched once with include[]
+        post_requests = [params for endpoint, params in site.requests if endpoint == "posts"]
+        self.assertEqual(sorted(params["page"] for params in post_requests), [1, 2, 3])
+        self.assertTrue(all(params["_embed"] == WPV2Backend.embed for params in post_requests))
+        self.assertEqual([(endpoint, params["include[]"]) for endpoint, params in site.requests
+                          if endpoint != "posts"], [("categories", [1]), ("tags", [2])])
+
+    def test_known_terms(self):
+        site = FakeV2Site(num_posts=2)
+        loader = loading.WPAPILoader(site_id=1, api_base_url=API_BASE_URL, api_version="v2")
+
+        with patch("requests.get", side_effect=site.get):
+            loader.load_site(type="ref_data")
+            self.assertEqual(Category.objects.count(), 1)
+            self.assertEqual(Tag.objects.get().post_count, 2)
+
+            site.requests = []
+            loader.load_site(type="post")
+
+        # the terms were listed, so the posts didn't need them fetched
+        self.assertEqual([endpoint for endpoint, params in site.requests], ["posts"])
+        self.assertEqual(Post.objects.count(), 2)
+
+    def test_prefetch_listings(self):
+        site = FakeV2Site(num_posts=5)
+        loader = loading.WPAPILoader(site_id=1, api_base_url=API_BASE_URL, api_version="v2")
+        backend = loader.backend
+        backend.prefetch_pages = 2
+
+        with patch("requests.get", side_effect=site.get):
+            # listing another endpoint in between, as the attachment sync does, doesn't drop the posts' prefetches
+            backend.fetch_page("posts", {"per_page": 2, "page": 1})
+            backend.fetch_page("media", {"per_page": 2, "page": 1})
+            backend.fetch_page("posts", {"per_page": 2, "page": 2})
+            backend.fetch_page("posts", {"per_page": 2, "page": 3})
+
+            # pages fetched ahead that aren't picked up expire
+            backend.prefetch_max_age = 0
+            backend.fetch_page("media", {"per_page": 2, "page": 1})
+            self.assertEqual(list(backend.prefetched), [])
+
+        self.assertEqual(sorted(params["page"] for endpoint, params in site.requests if endpoint == "posts"), [1, 2, 3])
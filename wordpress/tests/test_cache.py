@@ -0,0 +1,64 @@
+from __future__ import unicode_literals
+
+import datetime
+
+from django.test import TestCase
+
+from .. import cache
+from ..loading import WPAPILoader
+from ..models import Post
+
+
+class PostCacheTest(TestCase):
+
+    def setUp(self):
+        self.test_site_id = -1
+        cache.get_cache().clear()
+        cache.reset_stats()
+        self.post = Post.objects.create(site_id=self.test_site_id,
+                                        wp_id=1,
+                                        slug="test-post",
+                                        guid="http://test.local/?p=1",
+                                        status="publish",
+                                        post_type="post",
+                                        post_date=datetime.date(2015, 10, 1),
+                                        modified=datetime.date(2015, 10, 1))
+
+    def test_get_post(self):
+        self.assertEqual(cache.get_post(site_id=self.test_site_id, slug="test-post"), self.post)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(cache.get_post(site_id=self.test_site_id, slug="test-post"), self.post)
+
+        self.assertEqual(cache.get_stats(), {"hits": 1, "misses": 1})
+
+        # missing posts are cached too
+        self.assertIsNone(cache.get_post(site_id=self.test_site_id, wp_id=2))
+        with self.assertNumQueries(0):
+            self.assertIsNone(cache.get_post(site_id=self.test_site_id, wp_id=2))
+
+        with self.assertRaises(ValueError):
+            cache.get_post(site_id=self.test_site_id, title="Test Post")
+
+    def test_invalidate_posts(self):
+        cache.get_post(site_id=self.test_site_id, wp_id=1)
+        cache.get_post(site_id=self.test_site_id, wp_id=2, post_type="post")
+        self.assertEqual([p.wp_id for p in cache.get_posts(site_id=self.test_site_id)], [1])
+
+        # the loader invalidates the posts it writes
+        loader = WPAPILoader(site_id=self.test_site_id)
+        new_post = Post(site_id=self.test_site_id,
+                        wp_id=2,
+                        slug="test-post-2",
+                        status="publish",
+                        post_type="post",
+                        post_date=datetime.date(2015, 10, 2),
+                        modified=datetime.date(2015, 10, 2))
+        loader.bulk_create_posts([new_post], {}, {}, {})
+        loader.flush_changed_posts()
+
+        cache.reset_stats()
+        self.assertEqual(cache.get_post(site_id=self.test_site_id, wp_id=2, post_type="post").slug, "test-post-2")
+        self.assertEqual([p.wp_id for p in cache.get_posts(site_id=self.test_site_id)], [2, 1])
+        cache.get_post(site_id=self.test_site_id, wp_id=1)
+        self.assertEqual(cache.get_stats(), {"hits": 1, "misses": 2})
@@ -0,0 +1,68 @@
+from __future__ import unicode_literals
+
+import logging
+
+from django.test import TestCase
+from mock import patch
+
+from ..daemon import SyncDaemon
+
+
+class SyncDaemonTest(TestCase):
+
+    def setUp(self):
+        logging.getLogger('wordpress.daemon').addHandler(logging.NullHandler())
+        self.daemon = SyncDaemon([-1], min_interval=10, max_interval=35, ref_data_interval=3600)
+        self.site = self.daemon.sites[0]
+        self.loads = []
+        self.changes = []
+
+    def load_site(self, **kwargs):
+        self.loads.append(kwargs["type"])
+        if self.changes:
+            self.site.loader.metrics.incr("posts.updated", self.changes.pop(0))
+
+    def sync(self, changes=0):
+        self.changes.append(changes)
+        self.loads = []
+        with patch.object(self.site.loader, "load_site", side_effect=self.load_site):
+            return self.daemon.sync(self.site)
+
+    def test_adaptive_interval(self):
+        self.assertEqual(self.sync(changes=3), 3)
+        self.assertEqual(self.site.interval, 10)
+
+        # back off while nothing changes, up to the max
+        self.sync()
+        self.assertEqual(self.site.interval, 20)
+        self.sync()
+        self.sync()
+        self.assertEqual(self.site.interval, 35)
+
+        # and poll often again once it does
+        self.sync(changes=1)
+        self.assertEqual(self.site.interval, 10)
+
+    def test_ref_data_interval(self):
+        # ref data is only crawled on the first sync, until it's due again
+        self.sync()
+        self.assertEqual(self.loads, ["all"])
+        self.sync()
+        self.assertEqual(self.loads, ["attachment", "post", "page"])
+
+        self.site.next_ref_data_sync = 0
+        self.sync()
+        self.assertEqual(self.loads, ["all"])
+
+    def test_stop(self):
+        # a stop during a sync ends it after the current load, and ends the daemon
+        def load_site(**kwargs):
+            self.loads.append(kwargs["type"])
+            self.daemon.stop()
+
+        self.site.next_ref_data_sync = float("inf")
+        with patch.object(self.site.loader, "load_site", side_effect=load_site):
+            self.daemon.run()
+
+        self.assertEqual(self.loads, ["attachment"])
+        self.assertTrue(self.site.loader.stopping())
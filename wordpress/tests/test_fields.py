@@ -0,0 +1,152 @@
+from __future__ import unicode_literals
+
+import collections
+import datetime
+import pickle
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from .. import search
+from ..fields import RawJSON, compress, decompress, is_compressed
+from ..models import Media, Post
+
+
+class CompressedFieldTest(TestCase):
+
+    def setUp(self):
+        search._backends.clear()
+        self.content = "<p>{}</p>".format("All about tomatoes. " * 50)
+        self.metadata = [{"key": "tomatoes", "value": "Tomatoes need sun. " * 20}]
+
+    def create_post(self, wp_id=1):
+        return Post.objects.create(site_id=-1, wp_id=wp_id, title="Tomatoes", content=self.content,
+                                   metadata=self.metadata, post_date=datetime.date(2015, 10, 1),
+                                   modified=datetime.date(2015, 10, 1))
+
+    def stored_values(self, post):
+        return Post.objects.filter(pk=post.pk).values_list("content", "metadata").get()
+
+    def test_compress(self):
+        self.assertEqual(compress("short"), "short")
+        self.assertEqual(compress(None), None)
+        compressed = compress(self.content)
+        self.assertTrue(is_compressed(compressed))
+        self.assertLess(len(compressed), len(self.content))
+        self.assertEqual(compress(compressed), compressed)
+        self.assertEqual(decompress(compressed), self.content)
+        self.assertEqual(decompress(self.content), self.content)
+
+    def test_round_trip(self):
+        with self.settings(WP_API_COMPRESS_CONTENT=True):
+            post = self.create_post()
+
+            content, metadata = self.stored_values(post)
+            self.assertTrue(is_compressed(content))
+            self.assertTrue(is_compressed(metadata))
+
+            post = Post.objects.get(pk=post.pk)
+            # decompressed on first access only
+            self.assertTrue(is_compressed(post.__dict__["content"]))
+            self.assertEqual(post.content, self.content)
+            self.assertEqual(post.__dict__["content"], self.content)
+            self.assertEqual(post.metadata, self.metadata)
+
+            # deferred loading goes through the same descriptor
+            post = Post.objects.defer("content").get(pk=post.pk)
+            self.assertEqual(post.content, self.content)
+
+    def test_unread_content_isnt_recompressed(self):
+        with self.settings(WP_API_COMPRESS_CONTENT=True):
+            post = self.create_post()
+            stored_content = self.stored_values(post)[0]
+
+            post = Post.objects.get(pk=post.pk)
+            post.title = "Tomatoes!"
+            self.assertEqual(Post._meta.get_field("content").pre_save(post, False), stored_content)
+            post.save()
+            self.assertEqual(self.stored_values(post)[0], stored_content)
+
+    def test_mixed_rows(self):
+        # rows stored before compression was enabled are read as is, and vice versa
+        plain_post = self.create_post(wp_id=1)
+        with self.settings(WP_API_COMPRESS_CONTENT=True):
+            compressed_post = self.create_post(wp_id=2)
+
+        for post in Post.objects.filter(pk__in=[plain_post.pk, compressed_post.pk]):
+            self.assertEqual(post.content, self.content)
+            self.assertEqual(post.metadata, self.metadata)
+
+    def test_search_index(self):
+        with self.settings(WP_API_COMPRESS_CONTENT=True, WP_API_SEARCH_INDEX=True):
+            post = self.create_post()
+            search.sync_posts(-1, [post.wp_id])
+            self.assertEqual(list(Post.objects.search("all about")), [post])
+
+    def test_compress_command(self):
+        post = self.create_post()
+
+        with self.settings(WP_API_COMPRESS_CONTENT=True):
+            call_command("compress_wp_content")
+        content, metadata = self.stored_values(post)
+        self.assertTrue(is_compressed(content))
+        self.assertTrue(is_compressed(metadata))
+
+        call_command("compress_wp_content", decompress=True)
+        self.assertEqual(self.stored_values(post)[0], self.content)
+        post = Post.objects.get(pk=post.pk)
+        self.assertEqual(post.content, self.content)
+        self.assertEqual(post.metadata, self.metadata)
+
+
+class LazyJSONFieldTest(TestCase):
+
+    def setUp(self):
+        self.metadata = [{"id": "1", "key": "tomatoes", "value": "yes"}]
+        self.post = Post.objects.create(site_id=-1, wp_id=1, title="Tomatoes", metadata=self.metadata,
+                                        parent={"ID": 2, "type": "page"}, post_date=datetime.date(2015, 10, 1),
+                                        modified=datetime.date(2015, 10, 1))
+
+    def stored_metadata(self):
+        return Post.objects.filter(pk=self.post.pk).values_list("metadata", flat=True).get()
+
+    def test_decoded_on_first_access(self):
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertIsInstance(post.__dict__["metadata"], RawJSON)
+        self.assertIsInstance(post.__dict__["parent"], RawJSON)
+
+        self.assertEqual(post.parent, {"ID": 2, "type": "page"})
+        self.assertIsInstance(post.parent, collections.OrderedDict)
+        self.assertIsInstance(post.__dict__["metadata"], RawJSON)
+        self.assertEqual(post.metadata, self.metadata)
+
+    def test_save(self):
+        # unread values are saved back as stored
+        stored_metadata = self.stored_metadata()
+        post = Post.objects.get(pk=self.post.pk)
+        field = Post._meta.get_field("metadata")
+        self.assertIsInstance(field.pre_save(post, False), RawJSON)
+        post.save()
+        self.assertEqual(self.stored_metadata(), stored_metadata)
+
+        # read values are serialized, including changes made in place
+        post = Post.objects.get(pk=self.post.pk)
+        post.metadata[0]["value"] = "no"
+        post.save()
+        self.assertEqual(Post.objects.get(pk=self.post.pk).metadata[0]["value"], "no")
+
+        # strings assigned to a loaded instance are values, not JSON, as with jsonfield
+        post.parent = "none"
+        post.save()
+        self.assertEqual(Post.objects.get(pk=self.post.pk).parent, "none")
+
+    def test_pickle(self):
+        # cached posts keep their JSON undecoded
+        post = pickle.loads(pickle.dumps(Post.objects.get(pk=self.post.pk), pickle.HIGHEST_PROTOCOL))
+        self.assertIsInstance(post.__dict__["metadata"], RawJSON)
+        self.assertEqual(post.metadata, self.metadata)
+
+    def test_media(self):
+        media = Media.objects.create(site_id=-1, wp_id=1, url="http://example.com/1.jpg", exif={"camera": "phone"},
+                                     uploaded_date=datetime.date(2015, 10, 1))
+        self.assertEqual(Media.objects.get(pk=media.pk).exif, {"camera": "phone"})
@@ -0,0 +1,72 @@
+from __future__ import unicode_literals
+
+import logging
+
+from django.test import TestCase
+
+from .. import jobs
+from ..models import PostSyncJob
+
+
+class PostSyncJobTest(TestCase):
+
+    def setUp(self):
+        logging.getLogger('wordpress.jobs').addHandler(logging.NullHandler())
+        self.loaded = []
+
+    def handler(self, site_id, wp_post_id):
+        self.loaded.append((site_id, wp_post_id))
+        return object()
+
+    def test_enqueue(self):
+        for _ in range(3):
+            jobs.enqueue_post(-1, 1)
+        jobs.enqueue_post(-1, 2)
+
+        self.assertEqual(PostSyncJob.objects.count(), 2)
+        self.assertEqual(PostSyncJob.objects.get(wp_id=1).version, 3)
+
+    def test_process(self):
+        jobs.enqueue_post(-1, 1)
+        jobs.enqueue_post(-1, 2)
+        jobs.enqueue_post(-2, 1)
+
+        # not claimed until the debounce window has passed
+        self.assertEqual(jobs.process_jobs(debounce=60, handler=self.handler), 0)
+
+        self.assertEqual(jobs.process_jobs(batch_size=2, debounce=0, handler=self.handler), 2)
+        self.assertEqual(jobs.process_jobs(batch_size=2, debounce=0, handler=self.handler), 1)
+        self.assertEqual(sorted(self.loaded), [(-2, 1), (-1, 1), (-1, 2)])
+        self.assertFalse(PostSyncJob.objects.exists())
+
+    def test_claim(self):
+        jobs.enqueue_post(-1, 1)
+
+        claimed = jobs.claim_jobs(debounce=0)
+        self.assertEqual([job.wp_id for job in claimed], [1])
+        # claimed exactly once
+        self.assertEqual(jobs.claim_jobs(debounce=0), [])
+        # unless the claim expires
+        self.assertEqual(len(jobs.claim_jobs(debounce=0, claim_timeout=-1)), 1)
+
+    def test_requested_while_loading(self):
+        jobs.enqueue_post(-1, 1)
+        job = jobs.claim_jobs(debounce=0)[0]
+
+        jobs.enqueue_post(-1, 1)
+        jobs.complete_job(job)
+
+        # released to be loaded again
+        job = PostSyncJob.objects.get()
+        self.assertIsNone(job.claimed_by)
+        self.assertEqual(jobs.process_jobs(debounce=0, handler=self.handler), 1)
+        self.assertFalse(PostSyncJob.objects.exists())
+
+    def test_failure(self):
+        jobs.enqueue_post(-1, 1)
+
+        for _ in range(2):
+            jobs.process_jobs(debounce=0, max_attempts=2, handler=lambda site_id, wp_post_id: None)
+            self.assertEqual(len(self.loaded), 0)
+
+        self.assertFalse(PostSyncJob.objects.exists())
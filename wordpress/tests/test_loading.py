@@ -4,13 +4,18 @@ import logging
 import json
 import os
 import datetime
+import threading
 
 from mock import patch, call, DEFAULT, Mock
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from requests import Response
 
 from .. import loading
-from ..models import Post, Tag
+from ..cache import invalidate_ref_data
+from ..models import Post, Tag, Author, Category, SyncState
+from ..refdata import RefDataCache
 
 
 class WPAPIInitTest(TestCase):
@@ -141,6 +146,307 @@ class WPAPILoadSiteTest(TestCase):
         load_posts.assert_called_once_with(post_type=type, status=status)
 
 
+def read_post_json():
+    with open(os.path.join(os.path.dirname(__file__), "data", "post.json")) as post_json_file:
+        return json.load(post_json_file)
+
+
+def mock_api_response(api_json=None, ok=True):
+    mock_response = Mock(Response)
+    mock_response.ok = ok
+    mock_response.status_code = 200 if ok else 500
+    mock_response.text = "some text"
+    mock_response.json = lambda: api_json
+    return mock_response
+
+
+def api_page_json(wp_ids, modified, next_page=None, post_type="page"):
+    # pages skip the attachment sync, which would need its own API responses
+    api_posts = []
+    for wp_id in wp_ids:
+        api_post = read_post_json()
+        api_post.update(ID=wp_id, type=post_type, modified=modified, tags={}, categories={}, attachments={})
+        api_posts.append(api_post)
+    return {"found": 4, "posts": api_posts, "meta": {"next_page": next_page} if next_page else {}}
+
+
+class WPAPISyncStateTest(TestCase):
+
+    def setUp(self):
+        logging.getLogger('wordpress.loading').addHandler(logging.NullHandler())
+        self.test_site_id = -1
+        self.loader = loading.WPAPILoader(site_id=self.test_site_id)
+
+    def load_pages(self, responses):
+        requested_params = []
+
+        def get(url, headers=None, params=None):
+            requested_params.append(dict(params or {}))
+            return responses.pop(0)
+
+        with patch("requests.get", side_effect=get):
+            self.loader.load_site(type="page")
+
+        return requested_params
+
+    def test_stop_between_pages(self):
+        self.loader.stop_event = threading.Event()
+        self.loader.stop_event.set()
+
+        # the loader stops after the first page, leaving a checkpoint to resume from
+        first_page = api_page_json([1, 2], "2015-08-07T13:30:16-04:00", next_page="handle-2")
+        requested_params = self.load_pages([mock_api_response(first_page)])
+
+        self.assertEqual(len(requested_params), 1)
+        sync_state = SyncState.objects.get(site_id=self.test_site_id, endpoint="posts", post_type="page", status="publish")
+        self.assertTrue(sync_state.in_progress)
+        self.assertEqual(sync_state.page_handle, "handle-2")
+
+    def test_resume_interrupted_crawl(self):
+        # the crawl dies fetching the second page
+        self.load_pages([mock_api_response(api_page_json([1, 2], "2015-08-07T13:30:16-04:00", next_page="handle-2")),
+                         mock_api_response(ok=False)])
+
+        sync_state = SyncState.objects.get(site_id=self.test_site_id, endpoint="posts", post_type="page", status="publish")
+        self.assertEqual(sync_state.page_handle, "handle-2")
+        self.assertEqual(sync_state.page, 2)
+        self.assertEqual(sync_state.num_processed, 2)
+        self.assertIsNone(sync_state.watermark)
+
+        # the next run picks up at the second page, and commits the watermark when done
+        requested_params = self.load_pages([mock_api_response(api_page_json([3, 4], "2015-08-09T10:00:00-04:00"))])
+
+        self.assertEqual(requested_params[0]["page_handle"], "handle-2")
+        self.assertEqual(Post.objects.filter(site_id=self.test_site_id).count(), 4)
+
+        sync_state = SyncState.objects.get(pk=sync_state.pk)
+        self.assertFalse(sync_state.in_progress)
+        self.assertEqual(sync_state.watermark.isoformat(), "2015-08-09T14:00:00+00:00")
+
+        # and the run after that only gets posts modified after the watermark
+        requested_params = self.load_pages([mock_api_response({"found": 0, "posts": []})])
+
+        self.assertNotIn("page_handle", requested_params[0])
+        self.assertEqual(requested_params[0]["modified_after"], "2015-08-09T14:00:00+00:00")
+
+    def test_resume_failed(self):
+        self.load_pages([mock_api_response(api_page_json([1, 2], "2015-08-07T13:30:16-04:00", next_page="handle-2")),
+                         mock_api_response(ok=False)])
+
+        # the checkpoint's page handle has gone stale, so the next run starts over from the local posts
+        requested_params = self.load_pages([mock_api_response(ok=False),
+                                            mock_api_response(api_page_json([3, 4], "2015-08-09T10:00:00-04:00"))])
+
+        self.assertEqual(requested_params[0]["page_handle"], "handle-2")
+        self.assertNotIn("page_handle", requested_params[1])
+        self.assertEqual(requested_params[1]["modified_after"], "2015-08-07T17:30:16+00:00")
+        self.assertEqual(Post.objects.filter(site_id=self.test_site_id).count(), 4)
+
+        sync_state = SyncState.objects.get(site_id=self.test_site_id, endpoint="posts", post_type="page", status="publish")
+        self.assertFalse(sync_state.in_progress)
+        self.assertEqual(sync_state.watermark.isoformat(), "2015-08-09T14:00:00+00:00")
+
+    def test_max_pages(self):
+        pages = {
+            None: api_page_json([1], "2020-01-05T10:00:00+00:00", next_page="handle-2"),
+            "handle-2": api_page_json([2], "2020-01-04T10:00:00+00:00", next_page="handle-3"),
+            "handle-3": api_page_json([3], "2020-01-03T10:00:00+00:00"),
+        }
+
+        def get(url, headers=None, params=None):
+            return mock_api_response(dict(pages[params.get("page_handle")], found=3))
+
+        def load_posts():
+            self.loader.get_ref_data_map()
+            with patch("requests.get", side_effect=get):
+                self.loader.load_posts(post_type="page", max_pages=2)
+            return SyncState.objects.get(site_id=self.test_site_id, endpoint="posts", post_type="page",
+                                         status="publish")
+
+        self.loader.purge_first = self.loader.full = False
+        self.loader.modified_after = None
+        self.loader.batch_size = 1
+
+        # the kill counter cuts the crawl short, so the watermark stays put, and the next run resumes
+        for num_posts, page_handle in ((1, "handle-2"), (2, "handle-3")):
+            sync_state = load_posts()
+            self.assertEqual(Post.objects.filter(site_id=self.test_site_id).count(), num_posts)
+            self.assertEqual(sync_state.page_handle, page_handle)
+            self.assertIsNone(sync_state.watermark)
+
+        # until it gets to the end of the listing
+        sync_state = load_posts()
+        self.assertEqual(Post.objects.filter(site_id=self.test_site_id).count(), 3)
+        self.assertFalse(sync_state.in_progress)
+        self.assertEqual(sync_state.watermark.isoformat(), "2020-01-05T10:00:00+00:00")
+
+
+class WPAPIRefDataMapTest(TestCase):
+
+    def setUp(self):
+        logging.getLogger('wordpress.loading').addHandler(logging.NullHandler())
+        self.test_site_id = -1
+        Tag.objects.create(site_id=self.test_site_id, wp_id=1, name="Test", slug="test", post_count=1)
+
+    def test_keep_ref_data_map(self):
+        loader = loading.WPAPILoader(site_id=self.test_site_id, keep_ref_data_map=True)
+        loader.get_ref_data_map()
+        self.assertIn(1, loader.ref_data_map["tags"])
+
+        # kept between runs
+        with self.assertNumQueries(0):
+            loader.get_ref_data_map()
+
+        # until the ref data is reloaded
+        invalidate_ref_data(self.test_site_id)
+        with self.assertNumQueries(4):
+            loader.get_ref_data_map()
+
+        # loaders that don't keep their map reload it every run
+        loader = loading.WPAPILoader(site_id=self.test_site_id)
+        loader.get_ref_data_map()
+        with self.assertNumQueries(4):
+            loader.get_ref_data_map()
+
+
+class WPAPIRefDataPagesTest(TestCase):
+
+    def setUp(self):
+        logging.getLogger('wordpress.loading').addHandler(logging.NullHandler())
+        self.test_site_id = -1
+        self.loader = loading.WPAPILoader(site_id=self.test_site_id)
+        self.loader.purge_first = False
+        self.loader.full = False
+        self.loader.fetch_concurrency = 2
+
+    def load(self, load, key, num_objects, per_page=100):
+        api_post = read_post_json()
+        api_object = {"categories": api_post["categories"]["News"], "users": api_post["author"]}[key]
+        requested_params = []
+        lock = threading.Lock()
+
+        def get(url, headers=None, params=None):
+            with lock:
+                requested_params.append(dict(params))
+            start = params.get("offset", (params.get("page", 1) - 1) * per_page)
+            wp_ids = range(start + 1, min(start + per_page, num_objects) + 1)
+            return mock_api_response({"found": num_objects,
+                                      key: [dict(api_object, ID=wp_id, slug="slug-{}".format(wp_id))
+                                            for wp_id in wp_ids]})
+
+        with patch("requests.get", side_effect=get):
+            load()
+
+        return requested_params
+
+    def test_parallel_pages(self):
+        requested_params = self.load(self.loader.load_categories, "categories", 350)
+
+        # every page requested once, after the first told us how many there are
+        self.assertEqual(requested_params[0], {"number": 100})
+        self.assertEqual(sorted(params.get("page", 1) for params in requested_params), [1, 2, 3, 4])
+        self.assertEqual(Category.objects.filter(site_id=self.test_site_id).count(), 350)
+
+        # written in order
+        self.assertEqual(list(Category.objects.filter(site_id=self.test_site_id).order_by("pk")
+                                              .values_list("wp_id", flat=True)), list(range(1, 351)))
+
+    def test_offset_pages(self):
+        requested_params = self.load(self.loader.load_authors, "users", 250)
+
+        self.assertEqual(sorted(params.get("offset", 0) for params in requested_params), [0, 100, 200])
+        self.assertEqual(Author.objects.filter(site_id=self.test_site_id).count(), 250)
+
+    def test_max_pages(self):
+        requested_params = self.load(lambda: self.loader.load_categories(max_pages=3), "categories", 500)
+
+        self.assertEqual(len(requested_params), 2)
+        self.assertEqual(Category.objects.filter(site_id=self.test_site_id).count(), 200)
+
+    def test_stop_early(self):
+        self.load(self.loader.load_categories, "categories", 100)
+
+        # no new categories on the first page, so the rest aren't written
+        requested_params = self.load(self.loader.load_categories, "categories", 1000)
+        self.assertLessEqual(len(requested_params), 1 + self.loader.fetch_concurrency)
+        self.assertEqual(Category.objects.filter(site_id=self.test_site_id).count(), 100)
+
+
+class WPAPIReconcileTest(TestCase):
+
+    def setUp(self):
+        logging.getLogger('wordpress.loading').addHandler(logging.NullHandler())
+        self.test_site_id = -1
+        self.loader = loading.WPAPILoader(site_id=self.test_site_id)
+        for wp_id in range(1, 6):
+            Post.objects.create(site_id=self.test_site_id, wp_id=wp_id, post_type="post", status="publish",
+                                post_date=datetime.date(2015, 10, 1), modified=datetime.date(2015, 10, 1))
+
+    def api_pages(self, wp_ids_pages, found):
+        pages = []
+        for i, wp_ids in enumerate(wp_ids_pages):
+            pages.append(mock_api_response({
+                "found": found,
+                "posts": [{"ID": wp_id, "modified": "2015-10-01T00:00:00+00:00"} for wp_id in wp_ids],
+                "meta": {"next_page": "page{}".format(i + 2)} if i + 1 < len(wp_ids_pages) else {}
+            }))
+        return pages
+
+    def test_reconcile_posts__delete(self):
+        with patch("requests.get", side_effect=self.api_pages([[1, 2], [4]], 3)) as RequestsGetMock:
+            self.assertEqual(self.loader.reconcile_posts("post"), 2)
+
+        self.assertEqual(sorted(Post.objects.values_list("wp_id", flat=True)), [1, 2, 4])
+        # only IDs and modified dates were requested
+        self.assertEqual(RequestsGetMock.call_args[1]["params"]["fields"], "ID,modified")
+        self.assertEqual(RequestsGetMock.call_args[1]["params"]["page_handle"], "page2")
+
+    def test_reconcile_posts__trash(self):
+        with patch("requests.get", side_effect=self.api_pages([[1, 2, 3, 4]], 4)):
+            self.assertEqual(self.loader.reconcile_posts("post", action="trash"), 1)
+
+        self.assertEqual(list(Post.objects.filter(status="trash").values_list("wp_id", flat=True)), [5])
+
+    def test_reconcile_posts__incomplete(self):
+        # posts that moved between pages while listing, or an API error, mean nothing is removed
+        with patch("requests.get", side_effect=self.api_pages([[1, 2], [4]], 4)):
+            self.assertEqual(self.loader.reconcile_posts("post"), 0)
+        with patch("requests.get", return_value=mock_api_response(ok=False)):
+            self.assertEqual(self.loader.reconcile_posts("post"), 0)
+
+        self.assertEqual(Post.objects.count(), 5)
+
+
+class WPAPIResolvePostRefDataTest(TestCase):
+
+    def setUp(self):
+        logging.getLogger('wordpress.loading').addHandler(logging.NullHandler())
+        self.test_site_id = -1
+        self.loader = loading.WPAPILoader(site_id=self.test_site_id)
+        self.loader.get_ref_data_map()
+
+    def test_resolve_post_ref_data(self):
+        api_posts = []
+        for wp_id in range(1, 4):
+            api_post = read_post_json()
+            api_post["ID"] = wp_id
+            api_post["tags"]["Extra"] = dict(api_post["tags"]["Testing"], ID=100 + wp_id, name="Extra", slug="extra-{}".format(wp_id))
+            api_posts.append(api_post)
+
+        # a select, a bulk insert, and a select of the new pks per model, no matter how many posts
+        with self.assertNumQueries(9):
+            self.loader.resolve_post_ref_data(api_posts)
+
+        self.assertEqual(Tag.objects.filter(site_id=self.test_site_id).count(), 4)
+        self.assertEqual(self.loader.ref_data_map["tags"][101].pk, Tag.objects.get(wp_id=101).pk)
+        self.assertIn(4, self.loader.ref_data_map["categories"])
+        self.assertIn(2, self.loader.ref_data_map["media"])
+
+        # and it's all in the ref data map now
+        with self.assertNumQueries(0):
+            self.loader.resolve_post_ref_data(api_posts)
+
+
 class WPAPILoadPostTest(TestCase):
 
     def setUp(self):
@@ -152,10 +458,6 @@ class WPAPILoadPostTest(TestCase):
     def test_load_post(self, RequestsGetMock):
 
         # set up a mock response with stubbed json to simulate the API
-        def read_post_json():
-            with open(os.path.join(os.path.dirname(__file__), "data", "post.json")) as post_json_file:
-                return json.load(post_json_file)
-
         mock_response = Mock(Response)
         mock_response.ok = True
         mock_response.text = "some text"
@@ -175,6 +477,28 @@ class WPAPILoadPostTest(TestCase):
         self.assertEqual(post.tags.first().name, "Testing")
         self.assertEqual(post.attachments.first().url, "https://test.local/testpost.jpg")
 
+    def test_load_post__ref_data_cache(self):
+        session = Mock(get=Mock(return_value=mock_api_response(read_post_json())))
+        ref_data_cache = RefDataCache(self.test_site_id)
+        loader = loading.WPAPILoader(site_id=self.test_site_id, session=session, ref_data_cache=ref_data_cache)
+
+        loader.load_post(1)
+        self.assertEqual(len(ref_data_cache.maps["tags"]), 1)
+
+        # unchanged ref data isn't looked up again
+        with CaptureQueriesContext(connection) as queries:
+            post = loader.load_post(1)
+        ref_data_tables = [Author._meta.db_table, Category._meta.db_table, Tag._meta.db_table]
+        self.assertFalse([query for query in queries.captured_queries
+                          if any('FROM "{0}" WHERE "{0}"."site_id"'.format(table) in query["sql"]
+                                 for table in ref_data_tables)])
+        self.assertEqual(post.tags.first().name, "Testing")
+        self.assertTrue(session.get.called)
+
+        # reloading ref data clears it
+        invalidate_ref_data(self.test_site_id)
+        self.assertEqual(len(ref_data_cache.get_maps()["tags"]), 0)
+
 
 class WPAPIProcessPostTest(TestCase):
 
@@ -216,3 +540,131 @@ class WPAPIProcessPostTest(TestCase):
 
         self.loader.process_post_many_to_many_field(test_existing_post, "tags", test_related_tags)
         self.assertEqual(list(test_existing_post.tags.all().order_by("id")), test_tags)
+
+    def test_process_post_author__bulk_mode(self):
+        api_author = read_post_json()["author"]
+        author = Author.objects.create(site_id=self.test_site_id,
+                                       wp_id=api_author["ID"],
+                                       **self.loader.api_object_data("author", api_author))
+        self.loader.get_ref_data_map()
+
+        # unchanged authors come straight from the ref data map
+        with self.assertNumQueries(0):
+            self.assertEqual(self.loader.process_post_author(True, api_author), author.pk)
+
+        # changed authors get updated
+        api_author["name"] = "Test Author"
+        self.assertEqual(self.loader.process_post_author(True, api_author), author.pk)
+        self.assertEqual(Author.objects.get(pk=author.pk).name, "Test Author")
+
+        with self.assertNumQueries(0):
+            self.loader.process_post_author(True, api_author)
+
+
+class WPAPIQueryBudgetTest(TestCase):
+    """
+    Pin the number of queries the loader makes for a page of API data, which shouldn't grow with the page size.
+    Per-item queries are what make large syncs slow, so if one of these fails, look for a query in a loop.
+    """
+
+    def setUp(self):
+        logging.getLogger('wordpress.loading').addHandler(logging.NullHandler())
+        self.test_site_id = -1
+        self.loader = loading.WPAPILoader(site_id=self.test_site_id)
+        self.loader.purge_first = False
+        self.loader.full = False
+        self.loader.modified_after = None
+        self.loader.batch_size = 100
+
+        api_author = read_post_json()["author"]
+        Author.objects.create(site_id=self.test_site_id, wp_id=api_author["ID"],
+                              **self.loader.api_object_data("author", api_author))
+        self.loader.get_ref_data_map()
+
+    def api_posts(self, wp_ids, modified="2015-08-07T13:30:16-04:00"):
+        # each post has its own category, tag, and attachment, so that the ref data grows with the page too
+        api_posts = []
+        for wp_id in wp_ids:
+            api_post = read_post_json()
+            category = dict(api_post["categories"]["News"], ID=1000 + wp_id, name="News {}".format(wp_id),
+                            slug="news-{}".format(wp_id))
+            tag = dict(api_post["tags"]["Testing"], ID=2000 + wp_id, name="Testing {}".format(wp_id),
+                       slug="testing-{}".format(wp_id))
+            attachment = dict(api_post["attachments"]["2"], ID=3000 + wp_id, post_ID=wp_id)
+            api_post.update(ID=wp_id, slug="post-{}".format(wp_id), modified=modified,
+                            categories={category["name"]: category},
+                            tags={tag["name"]: tag},
+                            attachments={str(attachment["ID"]): attachment})
+            api_posts.append(api_post)
+        return api_posts
+
+    def load_page(self, api_posts):
+        response = mock_api_response({"found": len(api_posts), "posts": api_posts})
+        self.loader.process_posts_response(response, "sites/-1/posts", {}, max_pages=10)
+
+    def test_new_posts(self):
+        # a select, insert, and select of the new pks for each type of ref data, a select of the posts and their
+        # attachments, then insert the posts, select their pks, and one insert per many-to-many field
+        for wp_ids in (range(1, 6), range(6, 16)):
+            with self.assertNumQueries(16):
+                self.load_page(self.api_posts(wp_ids))
+
+        self.assertEqual(Post.objects.filter(site_id=self.test_site_id).count(), 15)
+        self.assertEqual(Post.objects.get(site_id=self.test_site_id, wp_id=10).tags.get().wp_id, 2010)
+
+    def test_existing_posts(self):
+        self.load_page(self.api_posts(range(1, 16)))
+
+        # a select of the posts, one per many-to-many field, and one of their attachments: unchanged posts aren't written
+        for wp_ids in (range(1, 6), range(1, 16)):
+            with self.assertNumQueries(5):
+                self.load_page(self.api_posts(wp_ids))
+
+        # changed posts cost one update each
+        changed_posts = self.api_posts(range(1, 4), modified="2015-08-08T13:30:16-04:00")
+        with self.assertNumQueries(5 + 3):
+            self.load_page(changed_posts + self.api_posts(range(4, 16)))
+
+    def test_existing_posts__attachments(self):
+        self.load_page(self.api_posts(range(1, 11)))
+        for wp_id in range(1, 11):
+            Post.objects.create(site_id=self.test_site_id, wp_id=3000 + wp_id, post_type="attachment",
+                                parent={"ID": wp_id, "type": "post"},
+                                post_date=datetime.date(2015, 10, 1), modified=datetime.date(2015, 10, 1))
+
+        # attachments still in the API are kept, without a query per post
+        api_attachments = {"found": 10, "posts": [{"ID": 3000 + wp_id} for wp_id in range(1, 11)]}
+        with patch("requests.get", return_value=mock_api_response(api_attachments)) as RequestsGetMock:
+            with self.assertNumQueries(5):
+                self.load_page(self.api_posts(range(1, 11)))
+
+        self.assertEqual(RequestsGetMock.call_count, 10)
+        self.assertEqual(Post.objects.filter(site_id=self.test_site_id, post_type="attachment").count(), 10)
+
+    def test_mixed_posts(self):
+        self.load_page(self.api_posts(range(1, 6)))
+
+        # as for new posts, plus prefetching the existing posts' many-to-many fields
+        for wp_ids in (range(1, 11), range(1, 21)):
+            with self.assertNumQueries(19):
+                self.load_page(self.api_posts(wp_ids))
+
+    def test_ref_data_loaders(self):
+        api_post = read_post_json()
+        for load, key, api_object in ((self.loader.load_categories, "categories", api_post["categories"]["News"]),
+                                      (self.loader.load_tags, "tags", api_post["tags"]["Testing"]),
+                                      (self.loader.load_authors, "users", api_post["author"]),
+                                      (self.loader.load_media, "media", api_post["attachments"]["2"])):
+            for wp_ids in (range(100, 105), range(100, 110)):
+                api_json = {"found": len(wp_ids),
+                            key: [dict(api_object, ID=wp_id, slug="slug-{}".format(wp_id)) for wp_id in wp_ids]}
+
+                # a page of new and existing objects: one select, and one insert for the new ones
+                with patch("requests.get", side_effect=[mock_api_response(api_json), mock_api_response({key: []})]):
+                    with self.assertNumQueries(2):
+                        load()
+
+                # a page of unchanged objects: one select
+                with patch("requests.get", side_effect=[mock_api_response(api_json), mock_api_response({key: []})]):
+                    with self.assertNumQueries(1):
+                        load()
@@ -0,0 +1,75 @@
+from __future__ import unicode_literals
+
+import logging
+
+from django.db import connection
+from django.test import TestCase
+from mock import Mock, patch
+
+from .. import loading
+from ..metrics import CallbackSink, Metrics, StatsdSink
+from ..models import Post
+from ..querytracking import track_queries
+from .test_loading import mock_api_response, read_post_json
+
+
+class MetricsTest(TestCase):
+
+    def setUp(self):
+        logging.getLogger('wordpress.loading').addHandler(logging.NullHandler())
+        self.emitted = []
+        self.metrics = Metrics(sinks=[CallbackSink(lambda *args: self.emitted.append(args))])
+
+    def totals(self, kind, name):
+        totals = {}
+        for emitted_kind, emitted_name, value, tags in self.emitted:
+            if emitted_kind == kind and emitted_name == name:
+                key = tuple(sorted(tags.items()))
+                totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def test_load_post(self):
+        loader = loading.WPAPILoader(site_id=-1, metrics=self.metrics)
+
+        api_post = read_post_json()
+        with patch("requests.get", return_value=mock_api_response(api_post)):
+            loader.load_post(1)
+            loader.load_post(1)
+            api_post["like_count"] = 5
+            loader.load_post(1)
+
+        self.assertEqual(self.totals("incr", "api.requests"), {(("endpoint", "posts"),): 3})
+        self.assertEqual(len(self.totals("timing", "api.request")), 1)
+        self.assertEqual(self.totals("incr", "posts.inserted"), {(): 1})
+        self.assertEqual(self.totals("incr", "posts.updated"), {(): 1})
+        self.assertEqual(self.totals("incr", "posts.unchanged"), {(): 1})
+
+        db_queries = self.totals("incr", "db.queries")
+        for phase in ("ref_data", "posts", "m2m", "attachments"):
+            self.assertGreater(db_queries[(("phase", phase),)], 0)
+
+    def test_phases(self):
+        with track_queries(connection, lambda sql, params, duration: self.metrics.record_query(duration)):
+            with self.metrics.phase("posts"):
+                Post.objects.count()
+                with self.metrics.phase("m2m"):
+                    Post.objects.count()
+                    Post.objects.count()
+        self.metrics.flush()
+
+        self.assertEqual(self.totals("incr", "db.queries"), {(("phase", "posts"),): 1, (("phase", "m2m"),): 2})
+        self.assertEqual(set(self.totals("timing", "phase.time")), {(("phase", "posts"),), (("phase", "m2m"),)})
+
+        # tracking stops at the end of the block
+        Post.objects.count()
+        self.metrics.flush()
+        self.assertEqual(len(self.totals("incr", "db.queries")), 2)
+
+    def test_statsd_sink(self):
+        client = Mock()
+        metrics = Metrics(sinks=[StatsdSink(client)])
+        metrics.incr("pages", endpoint="posts")
+        metrics.timing("api.request", 12.5, endpoint="posts")
+
+        client.incr.assert_called_once_with("wordpress.pages.endpoint_posts", 1)
+        client.timing.assert_called_once_with("wordpress.api.request.endpoint_posts", 12.5)
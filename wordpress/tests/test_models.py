@@ -0,0 +1,58 @@
+from __future__ import unicode_literals
+
+import datetime
+
+from django.test import TestCase
+
+from ..models import Post, Tag, Author
+
+
+class PostQuerySetTest(TestCase):
+
+    def setUp(self):
+        self.test_site_id = -1
+        author = Author.objects.create(site_id=self.test_site_id, wp_id=-6, login="testauthor", email="",
+                                       name="testauthor", nice_name="testauthor", url="", avatar_url="",
+                                       profile_url="")
+        tag = Tag.objects.create(site_id=self.test_site_id, wp_id=-201, name="Test Tag", slug="test-tag",
+                                 post_count=5)
+        for wp_id, status in enumerate(["publish", "publish", "publish", "draft"]):
+            post = Post.objects.create(site_id=self.test_site_id,
+                                       wp_id=wp_id,
+                                       author=author,
+                                       status=status,
+                                       post_type="post",
+                                       content="<p>Post {}</p>".format(wp_id),
+                                       post_date=datetime.date(2015, 10, wp_id + 1),
+                                       modified=datetime.date(2015, 10, wp_id + 1))
+            post.tags.add(tag)
+        Post.objects.create(site_id=-2, wp_id=0, status="publish", post_type="post",
+                            post_date=datetime.date(2015, 10, 1), modified=datetime.date(2015, 10, 1))
+
+    def test_for_site(self):
+        self.assertEqual(Post.objects.for_site(self.test_site_id).count(), 4)
+        with self.settings(WP_API_SITE_ID="-2"):
+            self.assertEqual(Post.objects.for_site().count(), 1)
+
+    def test_published(self):
+        self.assertEqual(Post.objects.for_site(self.test_site_id).of_type("post").published().count(), 3)
+
+    def test_for_listing(self):
+        # one query for the posts and authors, one each for tags and categories
+        with self.assertNumQueries(3):
+            posts = list(Post.objects.for_site(self.test_site_id).published().for_listing())
+            for post in posts:
+                self.assertEqual(post.author.name, "testauthor")
+                self.assertEqual([t.name for t in post.tags.all()], ["Test Tag"])
+                list(post.categories.all())
+
+        self.assertEqual([post.wp_id for post in posts], [2, 1, 0])
+        self.assertIn("content", posts[0].get_deferred_fields())
+
+    def test_with_relations(self):
+        with self.assertNumQueries(4):
+            for post in Post.objects.for_site(self.test_site_id).with_relations():
+                post.author.name
+                list(post.tags.all())
+                list(post.categories.all())
+                list(post.attachments.all())
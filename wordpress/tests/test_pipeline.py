@@ -0,0 +1,116 @@
+from __future__ import unicode_literals
+
+import logging
+import random
+import threading
+import time
+
+from django.test import SimpleTestCase, TestCase
+from mock import patch
+
+from .. import loading
+from ..fields import is_compressed
+from ..metrics import CallbackSink, Metrics
+from ..models import Post
+from ..pipeline import Pipeline, Stage
+from .test_loading import api_page_json, mock_api_response
+
+
+class PipelineTest(SimpleTestCase):
+
+    def setUp(self):
+        logging.getLogger('wordpress.pipeline').addHandler(logging.NullHandler())
+
+    def test_order(self):
+        def square(n):
+            # finish out of order
+            time.sleep(random.random() / 100)
+            return n * n
+
+        metrics = []
+        pipeline = Pipeline("test",
+                            [Stage("source", lambda: range(20)), Stage("square", square, workers=4)],
+                            metrics=Metrics([CallbackSink(lambda *args: metrics.append(args))]))
+        try:
+            self.assertEqual(list(pipeline), [n * n for n in range(20)])
+        finally:
+            pipeline.close()
+
+        items = dict((tags["stage"], value) for kind, name, value, tags in metrics if name == "pipeline.items")
+        self.assertEqual(sorted(items), ["consumer", "source", "square"])
+        self.assertTrue(any(name == "pipeline.queue_depth" for kind, name, value, tags in metrics))
+
+    def test_error(self):
+        def fail(n):
+            if n == 3:
+                raise ValueError("bad item")
+            return n
+
+        pipeline = Pipeline("test", [Stage("source", lambda: range(10)), Stage("fail", fail)])
+        try:
+            with self.assertRaises(ValueError):
+                list(pipeline)
+        finally:
+            pipeline.close()
+
+    def test_close(self):
+        produced = []
+
+        def source():
+            for n in range(1000):
+                produced.append(n)
+                yield n
+
+        pipeline = Pipeline("test", [Stage("source", source), Stage("identity", lambda n: n)], queue_size=1)
+        for n in pipeline:
+            break
+        pipeline.close()
+
+        # the queues are bounded, so the source only got a few items ahead, and stopped when closed
+        self.assertLess(len(produced), 10)
+        self.assertFalse(any(thread.is_alive() for thread in pipeline.threads))
+
+
+class WPAPIPostsPipelineTest(TestCase):
+
+    def setUp(self):
+        logging.getLogger('wordpress.loading').addHandler(logging.NullHandler())
+        self.loader = loading.WPAPILoader(site_id=-1)
+
+    def test_pages(self):
+        responses = {
+            None: api_page_json([1, 2], "2015-08-07T13:30:16-04:00", next_page="handle-2"),
+            "handle-2": api_page_json([3, 4], "2015-08-06T13:30:16-04:00"),
+        }
+        for api_post in responses[None]["posts"] + responses["handle-2"]["posts"]:
+            api_post["content"] = "<p>This is a test post.</p>\n" * 20
+        lock = threading.Lock()
+        requested_handles = []
+
+        def get(url, headers=None, params=None):
+            with lock:
+                requested_handles.append(params.get("page_handle"))
+            return mock_api_response(responses[params.get("page_handle")])
+
+        with self.settings(WP_API_COMPRESS_CONTENT=True,
+                           WP_API_PIPELINE_WORKERS={"transform": 2}, WP_API_PIPELINE_QUEUE_SIZE=2):
+            with patch("requests.get", side_effect=get):
+                self.loader.load_site(type="page")
+
+            self.assertEqual(requested_handles, [None, "handle-2"])
+
+            # new posts' values are prepared off the db thread, and stored as they would be otherwise
+            post = Post.objects.get(site_id=-1, wp_id=3)
+            api_post = responses["handle-2"]["posts"][0]
+            self.assertEqual(post.content, api_post["content"])
+            self.assertEqual(post.metadata, api_post["metadata"])
+            self.assertEqual(post.modified.isoformat(), "2015-08-06T17:30:16+00:00")
+            self.assertTrue(is_compressed(Post.objects.filter(pk=post.pk).values_list("content", flat=True)[0]))
+
+        # and unchanged on a second load
+        counts = []
+        self.loader.metrics.sinks.append(CallbackSink(lambda kind, name, value, tags: counts.append(name)))
+        with patch("requests.get", side_effect=get):
+            self.loader.load_site(type="page", full=True)
+        self.assertEqual(counts.count("posts.unchanged"), 4)
+        self.assertNotIn("posts.updated", counts)
@@ -0,0 +1,44 @@
+from __future__ import unicode_literals
+
+import logging
+import os
+import pstats
+import shutil
+import tempfile
+
+from django.test import TestCase
+from mock import patch
+
+from .. import loading
+from ..profiling import profile_load
+from .test_loading import api_page_json, mock_api_response, read_post_json
+
+
+class ProfileLoadTest(TestCase):
+
+    def setUp(self):
+        logging.getLogger('wordpress.loading').addHandler(logging.NullHandler())
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+
+    def test_profile_load(self):
+        loader = loading.WPAPILoader(site_id=-1)
+        profile_path = os.path.join(self.tmp_dir, "load.prof")
+        api_json = api_page_json([1, 2], "2015-10-01T00:00:00+00:00")
+        api_json["posts"][0]["tags"] = read_post_json()["tags"]
+
+        with patch("requests.get", return_value=mock_api_response(api_json)):
+            query_profile = profile_load(loader, profile_path, type="page")
+
+        # the profile can be sorted and printed
+        pstats.Stats(profile_path).sort_stats("cumulative")
+
+        sites = dict(((phase, site.split(":")[0], site.split(" in ")[-1]), group["count"])
+                     for (phase, site), group in query_profile.groups.items())
+        self.assertIn(("posts", "loading.py", "bulk_create_posts"), sites)
+        self.assertIn(("m2m", "loading.py", "bulk_add_many_to_many_field"), sites)
+        self.assertIn(("ref_data", "refdata.py", "__init__"), sites)
+
+        report = "\n".join(query_profile.report())
+        self.assertIn("SQL by phase:", report)
+        self.assertIn("bulk_create_posts", report)
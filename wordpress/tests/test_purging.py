@@ -0,0 +1,40 @@
+from __future__ import unicode_literals
+
+import datetime
+
+from django.test import TestCase
+
+from ..models import Post, Tag, Author
+from ..purging import purge_queryset
+
+
+class PurgeQuerysetTest(TestCase):
+
+    def setUp(self):
+        self.test_site_id = -1
+        self.author = Author.objects.create(site_id=self.test_site_id, wp_id=-6, login="testauthor", email="",
+                                            name="testauthor", nice_name="testauthor", url="", avatar_url="",
+                                            profile_url="")
+        self.tag = Tag.objects.create(site_id=self.test_site_id, wp_id=-201, name="Test Tag", slug="test-tag",
+                                      post_count=5)
+        for wp_id in range(5):
+            post = Post.objects.create(site_id=self.test_site_id,
+                                       wp_id=wp_id,
+                                       author=self.author if wp_id % 2 else None,
+                                       post_date=datetime.date(2015, 10, 1),
+                                       modified=datetime.date(2015, 10, 1))
+            post.tags.add(self.tag)
+
+    def test_purge_posts(self):
+        self.assertEqual(purge_queryset(Post.objects.filter(site_id=self.test_site_id), chunk_size=2), 5)
+
+        self.assertFalse(Post.objects.exists())
+        self.assertFalse(Post.tags.through.objects.exists())
+        self.assertTrue(Tag.objects.filter(pk=self.tag.pk).exists())
+
+    def test_purge_cascades(self):
+        self.assertEqual(purge_queryset(Author.objects.filter(site_id=self.test_site_id)), 1)
+
+        # the author's posts go with it, as they would with QuerySet.delete()
+        self.assertEqual(sorted(Post.objects.values_list("wp_id", flat=True)), [0, 2, 4])
+        self.assertEqual(Post.tags.through.objects.count(), 3)
@@ -0,0 +1,53 @@
+from __future__ import unicode_literals
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from ..loading import WPAPILoader
+from ..models import Post, Tag
+from ..routers import WordPressRouter
+
+
+class WordPressRouterTest(TestCase):
+
+    def setUp(self):
+        self.router = WordPressRouter()
+
+    def test_no_settings(self):
+        self.assertIsNone(self.router.db_for_read(Post))
+        self.assertIsNone(self.router.db_for_write(Post))
+        self.assertEqual(WPAPILoader(site_id=-1).using, "default")
+
+    def test_primary_and_replicas(self):
+        with self.settings(WP_API_DATABASE_WRITE="primary", WP_API_DATABASE_READ=["replica1", "replica2"]):
+            self.assertIn(self.router.db_for_read(Post), ["replica1", "replica2"])
+            self.assertEqual(self.router.db_for_write(Tag), "primary")
+            self.assertEqual(WPAPILoader(site_id=-1).using, "primary")
+            self.assertEqual(WPAPILoader(site_id=-1, using="other").using, "other")
+
+            # leave other apps alone
+            self.assertIsNone(self.router.db_for_read(User))
+            self.assertIsNone(self.router.allow_migrate("replica1", "auth"))
+            self.assertFalse(self.router.allow_migrate("replica1", "wordpress"))
+            self.assertTrue(self.router.allow_migrate("primary", "wordpress"))
+
+            # as Django 1.7 calls it
+            self.assertIsNone(self.router.allow_migrate("replica1", User))
+            self.assertFalse(self.router.allow_migrate("replica1", Post))
+            self.assertTrue(self.router.allow_migrate("primary", Post))
+
+    def test_replicas_only(self):
+        with self.settings(WP_API_DATABASE_READ=["replica1", "replica2"]):
+            self.assertIn(self.router.db_for_read(Post), ["replica1", "replica2"])
+
+            # the loader reads what it writes, so it doesn't go to the replicas
+            self.assertEqual(WPAPILoader(site_id=-1).using, "default")
+
+    def test_site_databases(self):
+        with self.settings(WP_API_DATABASE_WRITE="primary", WP_API_SITE_DATABASES={-2: "site2"}):
+            self.assertEqual(self.router.db_for_write(Post, instance=Post(site_id=-2)), "site2")
+            self.assertEqual(self.router.db_for_read(Post, instance=Post(site_id=-2)), "site2")
+            self.assertEqual(self.router.db_for_write(Post, instance=Post(site_id=-1)), "primary")
+            self.assertEqual(WPAPILoader(site_id=-2).using, "site2")
+            self.assertEqual(Post.objects.for_site(-2).db, "site2")
+            self.assertTrue(self.router.allow_migrate("site2", "wordpress"))
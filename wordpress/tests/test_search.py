@@ -0,0 +1,103 @@
+from __future__ import unicode_literals
+
+import datetime
+import threading
+import unittest
+
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+
+from .. import search
+from ..loading import WPAPILoader
+from ..models import Post
+
+
+class PostSearchTest(TestCase):
+
+    def setUp(self):
+        # the index table is created lazily, and rolled back with each test
+        search._backends.clear()
+        self.test_site_id = -1
+        self.loader = WPAPILoader(site_id=self.test_site_id)
+
+    def create_posts(self):
+        posts = [
+            Post(site_id=self.test_site_id, wp_id=1, title="Gardening tips", content="<p>Tomatoes need sun</p>"),
+            Post(site_id=self.test_site_id, wp_id=2, title="Cooking", content="<p>A tomato salad with basil</p>"),
+            Post(site_id=self.test_site_id, wp_id=3, title="Tomatoes", content="<p>All about tomatoes</p>"),
+            Post(site_id=-2, wp_id=1, title="Tomatoes", content="<p>Another site's tomatoes</p>"),
+        ]
+        for post in posts:
+            post.post_date = post.modified = datetime.date(2015, 10, 1)
+
+        self.loader.bulk_create_posts(posts[:3], {}, {}, {})
+        Post.objects.create(**{f.attname: getattr(posts[3], f.attname) for f in Post._meta.concrete_fields if f.attname != "id"})
+        self.loader.flush_changed_posts()
+
+    def test_search__index(self):
+        with self.settings(WP_API_SEARCH_INDEX=True):
+            self.create_posts()
+
+            posts = Post.objects.for_site(self.test_site_id).search("tomatoes")
+            # title matches rank first
+            self.assertEqual([post.wp_id for post in posts], [3, 1])
+
+            # the loader keeps the index up to date
+            post = Post.objects.get(site_id=self.test_site_id, wp_id=1)
+            self.loader.changed_posts.append(self.loader.post_cache_values(post))
+            post.delete()
+            self.loader.flush_changed_posts()
+            self.assertEqual([post.wp_id for post in Post.objects.for_site(self.test_site_id).search("tomatoes")], [3])
+
+            # re-indexed posts replace their entries, and deleted posts' entries are dropped
+            search.sync_posts(self.test_site_id, [2, 3])
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT wp_id FROM {} WHERE site_id = %s ORDER BY wp_id".format(search.TABLE_NAME),
+                               [self.test_site_id])
+                self.assertEqual([row[0] for row in cursor.fetchall()], [2, 3])
+
+            # user input isn't parsed as query syntax
+            self.assertEqual(list(Post.objects.search('tomatoes" OR "basil')), [])
+            self.assertEqual(list(Post.objects.search("  ")), [])
+
+    def test_search__no_index(self):
+        self.create_posts()
+        posts = Post.objects.for_site(self.test_site_id).search("tomato salad")
+        self.assertEqual([post.wp_id for post in posts], [2])
+
+
+class PostSearchThreadTest(TransactionTestCase):
+
+    def setUp(self):
+        search._backends.clear()
+
+    def tearDown(self):
+        # the index table isn't flushed with the app's tables
+        search._backends.clear()
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TABLE IF EXISTS {}".format(search.TABLE_NAME))
+
+    @unittest.skipIf(connection.vendor == "sqlite" and not getattr(connection.features, "can_share_in_memory_db", True),
+                     "the test db can't be shared with other threads")
+    def test_search__other_thread(self):
+        post = Post.objects.create(site_id=-1, wp_id=1, title="Tomatoes", content="<p>All about tomatoes</p>",
+                                   post_date=datetime.date(2015, 10, 1), modified=datetime.date(2015, 10, 1))
+        errors = []
+
+        def sync():
+            try:
+                search.sync_posts(-1, [post.wp_id])
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        with self.settings(WP_API_SEARCH_INDEX=True):
+            # the backend is shared by threads, e.g. the webhook's workers, so each uses its own connection
+            search.sync_posts(-1, [post.wp_id])
+            thread = threading.Thread(target=sync)
+            thread.start()
+            thread.join()
+
+            self.assertEqual(errors, [])
+            self.assertEqual(list(Post.objects.search("tomatoes")), [post])
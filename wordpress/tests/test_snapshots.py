@@ -0,0 +1,92 @@
+from __future__ import unicode_literals
+
+import datetime
+import gzip
+import io
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from ..models import Author, Category, Media, Post, SyncState, Tag
+from ..snapshots import export_snapshot, import_snapshot
+
+
+class SnapshotTest(TestCase):
+
+    def setUp(self):
+        self.test_site_id = -1
+        date = datetime.datetime(2015, 10, 1, 12, 30, tzinfo=timezone.utc)
+
+        author = Author.objects.create(site_id=self.test_site_id, wp_id=6, login="testauthor", email="",
+                                       name="Test Author", nice_name="testauthor", url="", avatar_url="",
+                                       profile_url="")
+        category = Category.objects.create(site_id=self.test_site_id, wp_id=7, name="Test Category",
+                                           slug="test-category", post_count=1)
+        tags = [Tag.objects.create(site_id=self.test_site_id, wp_id=wp_id, name="Tag {}".format(wp_id),
+                                   slug="tag-{}".format(wp_id), post_count=1) for wp_id in range(3)]
+        media = Media.objects.create(site_id=self.test_site_id, wp_id=8, url="http://example.com/a.jpg",
+                                     uploaded_date=date, exif={"camera": "Test"})
+
+        for wp_id in range(5):
+            post = Post.objects.create(site_id=self.test_site_id,
+                                       wp_id=wp_id,
+                                       author=author if wp_id % 2 else None,
+                                       post_date=date,
+                                       modified=date + datetime.timedelta(days=wp_id),
+                                       title="Post {}".format(wp_id),
+                                       content="Lots of content. " * 100,
+                                       slug="post-{}".format(wp_id),
+                                       parent={"ID": 1, "type": "post"} if wp_id == 4 else None,
+                                       metadata=[{"key": "geo_public", "value": "0"}])
+            post.tags.add(*tags[:wp_id])
+            post.categories.add(category)
+            if wp_id == 4:
+                post.attachments.add(media)
+
+        SyncState.objects.create(site_id=self.test_site_id, endpoint="posts", post_type="post", status="publish",
+                                 watermark=date)
+
+    def export(self):
+        snapshot = io.BytesIO()
+        counts = export_snapshot(self.test_site_id, snapshot, chunk_size=2)
+        return io.BytesIO(snapshot.getvalue()), counts
+
+    def site_content(self):
+        posts = Post.objects.filter(site_id=self.test_site_id).order_by("wp_id")
+        return [(post.wp_id, post.author.wp_id if post.author else None, post.post_date, post.modified, post.title,
+                 post.content, post.slug, post.parent, post.metadata,
+                 sorted(post.tags.values_list("wp_id", flat=True)),
+                 list(post.categories.values_list("wp_id", flat=True)),
+                 [(media.wp_id, media.exif) for media in post.attachments.all()])
+                for post in posts]
+
+    def test_round_trip(self):
+        content = self.site_content()
+        snapshot, counts = self.export()
+        self.assertEqual(counts, {"author": 1, "category": 1, "tag": 3, "media": 1, "post": 5, "syncstate": 1})
+
+        # nothing is loaded into a site that already has content
+        with self.assertRaises(ValueError):
+            import_snapshot(snapshot, chunk_size=2)
+        self.assertEqual(Post.objects.count(), 5)
+        snapshot.seek(0)
+
+        with override_settings(WP_API_COMPRESS_CONTENT=True):
+            counts = import_snapshot(snapshot, chunk_size=2, purge=True)
+
+        self.assertEqual(counts, {"author": 1, "category": 1, "tag": 3, "media": 1, "post": 5, "syncstate": 1})
+        self.assertEqual(self.site_content(), content)
+        self.assertEqual(SyncState.objects.get(site_id=self.test_site_id).watermark,
+                         datetime.datetime(2015, 10, 1, 12, 30, tzinfo=timezone.utc))
+
+        # the content is stored compressed, as the loader would with WP_API_COMPRESS_CONTENT
+        self.assertTrue(all(content.startswith("\x1fzlib:")
+                            for content in Post.objects.values_list("content", flat=True)))
+
+    def test_not_a_snapshot(self):
+        snapshot = io.BytesIO()
+        with gzip.GzipFile(fileobj=snapshot, mode="wb") as f:
+            f.write(b'{"site_id": -1}\n')
+
+        with self.assertRaises(ValueError):
+            import_snapshot(io.BytesIO(snapshot.getvalue()))
@@ -0,0 +1,63 @@
+from __future__ import unicode_literals
+
+import threading
+import time
+
+from django.test import SimpleTestCase
+
+from ..webhooks import WebhookDispatcher
+
+
+class WebhookDispatcherTest(SimpleTestCase):
+
+    def setUp(self):
+        self.lock = threading.Lock()
+        self.loaded = []
+        self.num_running = 0
+        self.max_running = 0
+
+    def handler(self, site_id, wp_post_id):
+        with self.lock:
+            self.num_running += 1
+            self.max_running = max(self.max_running, self.num_running)
+        time.sleep(0.02)
+        with self.lock:
+            self.num_running -= 1
+            self.loaded.append((site_id, wp_post_id))
+
+    def test_coalesce(self):
+        dispatcher = WebhookDispatcher(handler=self.handler, debounce=0.1, num_workers=2)
+
+        for _ in range(5):
+            dispatcher.schedule(-1, 1)
+        for wp_post_id in range(2, 7):
+            dispatcher.schedule(-1, wp_post_id)
+        dispatcher.schedule("-1", "1")
+
+        self.assertTrue(dispatcher.join(timeout=5))
+        self.assertEqual(sorted(self.loaded), [(-1, wp_post_id) for wp_post_id in range(1, 7)])
+        self.assertLessEqual(self.max_running, 2)
+
+    def test_debounce(self):
+        dispatcher = WebhookDispatcher(handler=self.handler, debounce=0.2, num_workers=1)
+
+        start = time.time()
+        dispatcher.schedule(-1, 1)
+        time.sleep(0.1)
+        # a second request pushes the load back
+        dispatcher.schedule(-1, 1)
+        self.assertFalse(dispatcher.join(timeout=0.05))
+        self.assertTrue(dispatcher.join(timeout=5))
+        self.assertGreaterEqual(time.time() - start, 0.3)
+        self.assertEqual(self.loaded, [(-1, 1)])
+
+    def test_rerun_while_loading(self):
+        dispatcher = WebhookDispatcher(handler=self.handler, debounce=0, num_workers=1)
+
+        dispatcher.schedule(-1, 1)
+        while not dispatcher.running:
+            time.sleep(0.001)
+        dispatcher.schedule(-1, 1)
+
+        self.assertTrue(dispatcher.join(timeout=5))
+        self.assertEqual(self.loaded, [(-1, 1), (-1, 1)])
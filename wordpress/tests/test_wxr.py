@@ -0,0 +1,78 @@
+from __future__ import unicode_literals
+
+import datetime
+import logging
+import os
+
+from django.test import TestCase
+from django.utils import timezone
+
+from .. import loading
+from ..models import Author, Category, Media, Post, SyncState, Tag
+from ..wxr import WXRImporter
+
+
+class WXRImporterTest(TestCase):
+
+    def setUp(self):
+        logging.getLogger('wordpress.wxr').addHandler(logging.NullHandler())
+        logging.getLogger('wordpress.loading').addHandler(logging.NullHandler())
+        self.test_site_id = -1
+
+    def load(self, batch_size=100):
+        loader = loading.WPAPILoader(site_id=self.test_site_id)
+        with open(os.path.join(os.path.dirname(__file__), "data", "export.xml"), "rb") as f:
+            return WXRImporter(loader, batch_size=batch_size).load(f)
+
+    def test_load(self):
+        counts = self.load(batch_size=2)
+
+        self.assertEqual(counts, {"authors": 1, "categories": 2, "tags": 2, "media": 1, "posts": 3})
+
+        author = Author.objects.get(site_id=self.test_site_id, wp_id=6)
+        self.assertEqual((author.login, author.name, author.email), ("testauthor", "Test Author", "test@example.com"))
+        self.assertEqual(Category.objects.get(wp_id=8).parent_wp_id, 7)
+
+        post = Post.objects.get(site_id=self.test_site_id, wp_id=101)
+        self.assertEqual(post.author, author)
+        self.assertEqual(post.post_date, datetime.datetime(2015, 8, 7, 17, 30, 16, tzinfo=timezone.utc))
+        self.assertEqual(post.modified, datetime.datetime(2015, 8, 9, 13, 0, tzinfo=timezone.utc))
+        self.assertEqual((post.title, post.slug, post.content, post.excerpt),
+                         ("Rain at the Park", "rain-at-the-park", "<p>It rained.</p>", "Wet"))
+        self.assertEqual((post.status, post.post_type, post.format, post.sticky), ("publish", "post", "gallery", True))
+        self.assertEqual(post.metadata, [{"key": "geo_public", "value": "0"}])
+        self.assertEqual(list(post.categories.values_list("wp_id", flat=True)), [8])
+        self.assertEqual(sorted(post.tags.values_list("wp_id", flat=True)), [21, 22])
+
+        # the attachment comes after the post it's attached to
+        media = Media.objects.get(site_id=self.test_site_id, wp_id=102)
+        self.assertEqual((media.post_ID, media.width, media.height, media.mime_type, media.alt),
+                         (101, 1024, 768, "image/jpeg", "A big puddle"))
+        self.assertEqual(list(post.attachments.all()), [media])
+        attachment = Post.objects.get(site_id=self.test_site_id, wp_id=102)
+        self.assertEqual((attachment.post_type, attachment.parent), ("attachment", {"ID": 101}))
+
+        self.assertEqual(Post.objects.get(site_id=self.test_site_id, wp_id=2).menu_order, 3)
+        self.assertFalse(Post.objects.filter(wp_id=3).exists())
+
+        # incremental syncs take over from the export
+        self.assertEqual(SyncState.objects.get(site_id=self.test_site_id, post_type="post", status="publish").watermark,
+                         datetime.datetime(2015, 8, 9, 13, 0, tzinfo=timezone.utc))
+
+    def test_load_existing(self):
+        Tag.objects.create(site_id=self.test_site_id, wp_id=21, name="Old Name", slug="parks", post_count=12)
+        self.load()
+        Post.objects.filter(wp_id=101).update(like_count=5, short_url="http://wp.me/p1")
+
+        # loading again only reads, a batch at a time, since nothing has changed
+        with self.assertNumQueries(20):
+            self.load()
+
+        # and updates, rather than duplicates, keeping what the export doesn't have
+
+        self.assertEqual(Post.objects.filter(site_id=self.test_site_id).count(), 3)
+        self.assertEqual(Media.objects.get(wp_id=102).post_set.count(), 1)
+        tag = Tag.objects.get(wp_id=21)
+        self.assertEqual((tag.name, tag.post_count), ("Parks", 12))
+        post = Post.objects.get(wp_id=101)
+        self.assertEqual((post.like_count, post.short_url), (5, "http://wp.me/p1"))
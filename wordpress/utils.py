@@ -8,3 +8,18 @@ def int_or_None(value):
         except ValueError:
             return None
     return None
+
+
+def chunked(values, size):
+    """
+    Split values into lists of at most the given size, e.g. to keep IN clauses within db parameter limits.
+    Values can come from any iterable, including a queryset's iterator(), without being held in memory all at once.
+    """
+    chunk = []
+    for value in values:
+        chunk.append(value)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
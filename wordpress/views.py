@@ -1,14 +1,13 @@
 from __future__ import unicode_literals
 
 import logging
-import time
 
+from django.conf import settings
 from django.views.decorators.http import require_POST
 from django.views.decorators.csrf import csrf_exempt
 from django.http.response import Http404, JsonResponse
-import after_response
 
-from wordpress.loading import WPAPILoader
+from wordpress import jobs, webhooks
 
 
 logger = logging.getLogger(__name__)
@@ -30,28 +29,21 @@ def load_post_webhook(request):
     except:
         raise Http404("Post does not exist")
 
-    # load this asynchronously so that the webhook gets a fast response
-    load_post.after_response(wp_post_id)
+    # load this asynchronously so that the webhook gets a fast response;
+    # repeated requests for the same post are coalesced
+    if jobs.is_enabled():
+        jobs.enqueue_post(settings.WP_API_SITE_ID, wp_post_id)
+    else:
+        webhooks.get_dispatcher().schedule(settings.WP_API_SITE_ID, wp_post_id)
     return JsonResponse({"status": "Refreshing wp_post_id: {}".format(wp_post_id)})
 
 
-@after_response.enable
 def load_post(wp_post_id):
     """
-    Called from load_post_webhook.
-    This builds a generic WPAPILoader and uses its load_post() to insert/update content for the post.
+    Insert/update content for a single post synchronously, on the calling thread.
+    This uses the thread's long-lived loader for the site, like the webhook's worker pool (see wordpress.webhooks).
 
     :param wp_post_id: the WordPress post ID to load
     :return: None
     """
-
-    # wait a bit to give WordPress REST API a chance to catch up
-    time.sleep(1)
-
-    loader = WPAPILoader()
-    post = loader.load_post(wp_post_id)
-
-    if post:
-        logger.info("Successfully loaded post wp_post_id=%s, pk=%s", wp_post_id, post.pk)
-    else:
-        logger.warning("Error loading post wp_post_id=%s", wp_post_id)
+    webhooks.load_post(settings.WP_API_SITE_ID, wp_post_id)
@@ -0,0 +1,245 @@
+from __future__ import unicode_literals
+
+import heapq
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+import requests
+from six.moves import queue
+
+from wordpress.loading import WPAPILoader
+from wordpress.refdata import RefDataCache
+
+
+logger = logging.getLogger(__name__)
+
+
+def get_debounce():
+    """
+    The number of seconds to wait for more edits to a post before loading it,
+    from WP_API_WEBHOOK_DEBOUNCE in settings (default: 1).
+    This also gives the WordPress REST API a chance to catch up with the edit.
+    """
+    return float(getattr(settings, "WP_API_WEBHOOK_DEBOUNCE", 1))
+
+
+def get_num_workers():
+    """
+    The max number of posts to load at once, from WP_API_WEBHOOK_WORKERS in settings (default: 2).
+    """
+    return int(getattr(settings, "WP_API_WEBHOOK_WORKERS", 2))
+
+
+def get_ref_data_cache_size():
+    """
+    The max number of each of authors, tags, categories, and media to keep in memory between webhook loads,
+    from WP_API_WEBHOOK_REF_CACHE_SIZE in settings (default: 1000).
+    """
+    return int(getattr(settings, "WP_API_WEBHOOK_REF_CACHE_SIZE", 1000))
+
+
+_ref_data_caches = {}
+_ref_data_caches_lock = threading.Lock()
+_loaders = threading.local()
+
+
+def get_ref_data_cache(site_id):
+    """
+    Get the process's RefDataCache for a site, shared by all webhook loads.
+    """
+    with _ref_data_caches_lock:
+        if site_id not in _ref_data_caches:
+            _ref_data_caches[site_id] = RefDataCache(site_id, max_size=get_ref_data_cache_size())
+        return _ref_data_caches[site_id]
+
+
+def get_loader(site_id):
+    """
+    Get a long-lived loader for webhook loads of a site's posts.
+
+    Loaders are kept per thread, since they aren't thread-safe, and each keeps its HTTP connections open in a requests
+    Session. The ref data they resolve is shared by the whole process, so that a webhook load only queries the tags,
+    categories, authors, and media of a post the first time it sees them, or when they change.
+
+    :param site_id: the WordPress site ID
+    :return: a WPAPILoader
+    """
+    site_id = int(site_id)
+    loaders = getattr(_loaders, "loaders", None)
+    if loaders is None:
+        loaders = _loaders.loaders = {}
+
+    if site_id not in loaders:
+        loaders[site_id] = WPAPILoader(site_id=site_id,
+                                       session=requests.Session(),
+                                       ref_data_cache=get_ref_data_cache(site_id))
+    return loaders[site_id]
+
+
+def load_post(site_id, wp_post_id):
+    """
+    Insert/update a single post from the WordPress REST API, with the thread's long-lived loader for the site.
+
+    :param site_id: the WordPress site ID
+    :param wp_post_id: the WordPress post ID to load
+    :return: the Post, or None if it couldn't be loaded
+    """
+    # worker threads outlive requests, so manage db connections like a request would
+    close_old_connections()
+    try:
+        post = get_loader(site_id).load_post(wp_post_id)
+    finally:
+        close_old_connections()
+
+    if post:
+        logger.info("Successfully loaded post wp_post_id=%s, pk=%s", wp_post_id, post.pk)
+    else:
+        logger.warning("Error loading post wp_post_id=%s", wp_post_id)
+
+    return post
+
+
+class WebhookDispatcher(object):
+    """
+    Loads posts in the background for the webhook.
+
+    Requests for a post that's already waiting are coalesced: the post is loaded once, after no more requests
+    for it have come in for the debounce window. Posts are then loaded by a fixed number of worker threads.
+    A post that's requested again while it's loading is loaded again afterwards, so the last edit always wins.
+
+    Waiting posts are kept in a heap by due time, so the delay doesn't hold a worker.
+    Threads are started on first use, and again after a fork.
+    """
+
+    def __init__(self, handler=load_post, debounce=None, num_workers=None):
+        """
+        :param handler: called with (site_id, wp_post_id) to load a post
+        :param debounce: seconds to wait for more requests for a post; if not given, we use get_debounce()
+        :param num_workers: the number of worker threads; if not given, we use get_num_workers()
+        """
+        self.handler = handler
+        self.debounce = get_debounce() if debounce is None else debounce
+        self.num_workers = get_num_workers() if num_workers is None else num_workers
+
+        self.condition = threading.Condition()
+        # (site_id, wp_post_id) -> due time, for posts waiting out the debounce window
+        self.due = {}
+        # (due time, key) entries; an entry is moved back if its post was requested again since it was pushed
+        self.heap = []
+        self.running = set()
+        self.rerun = set()
+        self.jobs = queue.Queue()
+        self.pid = None
+
+    def schedule(self, site_id, wp_post_id):
+        """
+        Request a load of a post.
+
+        :param site_id: the WordPress site ID
+        :param wp_post_id: the WordPress post ID
+        :return: None
+        """
+        key = (int(site_id), int(wp_post_id))
+
+        with self.condition:
+            self.start()
+
+            if key in self.running:
+                self.rerun.add(key)
+            else:
+                self.push(key)
+
+    def push(self, key):
+        # call with the lock held
+        if key not in self.due:
+            heapq.heappush(self.heap, (time.time() + self.debounce, key))
+        self.due[key] = time.time() + self.debounce
+        self.condition.notify_all()
+
+    def start(self):
+        # call with the lock held
+        if self.pid == os.getpid():
+            return
+
+        self.pid = os.getpid()
+        threads = [threading.Thread(target=self.dispatch, name="wordpress-webhook-dispatcher")]
+        threads += [threading.Thread(target=self.work, name="wordpress-webhook-worker-{}".format(i))
+                    for i in range(self.num_workers)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+    def dispatch(self):
+        """
+        Hand posts to the workers once they're due.
+        """
+        with self.condition:
+            while True:
+                now = time.time()
+                while self.heap and self.heap[0][0] <= now:
+                    _, key = heapq.heappop(self.heap)
+                    if self.due[key] > now:
+                        heapq.heappush(self.heap, (self.due[key], key))
+                        continue
+
+                    del self.due[key]
+                    self.running.add(key)
+                    self.jobs.put(key)
+
+                self.condition.wait(self.heap[0][0] - now if self.heap else None)
+
+    def work(self):
+        """
+        Load posts as they're handed over, until the process exits.
+        """
+        while True:
+            key = self.jobs.get()
+            try:
+                self.handler(*key)
+            except Exception:
+                logger.exception("Error loading post site_id=%s, wp_post_id=%s", *key)
+            finally:
+                with self.condition:
+                    self.running.discard(key)
+                    if key in self.rerun:
+                        self.rerun.discard(key)
+                        self.push(key)
+                    self.condition.notify_all()
+
+    def join(self, timeout=None):
+        """
+        Wait for all requested posts to be loaded, e.g. before shutting down.
+
+        :param timeout: the max number of seconds to wait
+        :return: True if everything was loaded, False if we timed out
+        """
+        deadline = None if timeout is None else time.time() + timeout
+
+        with self.condition:
+            while self.due or self.running:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.condition.wait(remaining)
+
+        return True
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher():
+    """
+    Get the dispatcher for this process, configured from settings.
+    """
+    global _dispatcher
+
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = WebhookDispatcher()
+        return _dispatcher
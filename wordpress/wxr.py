@@ -0,0 +1,478 @@
+from __future__ import unicode_literals
+
+import logging
+import mimetypes
+import os
+import re
+
+from django.utils.dateparse import parse_datetime
+import six
+
+from wordpress.cache import invalidate_ref_data
+from wordpress.models import Author, Category, Tag, Media, Post
+from wordpress.utils import chunked, int_or_None
+
+try:
+    import xml.etree.cElementTree as ElementTree
+except ImportError:
+    import xml.etree.ElementTree as ElementTree
+
+
+logger = logging.getLogger(__name__)
+
+NAMESPACE_PREFIXES = {
+    "http://purl.org/rss/1.0/modules/content/": "content",
+    "http://purl.org/dc/elements/1.1/": "dc",
+    "http://wellformedweb.org/CommentAPI/": "wfw",
+}
+
+# post fields the API has but WXR exports don't; existing posts keep their values, new posts get these defaults
+API_ONLY_POST_FIELDS = {
+    "short_URL": "",
+    "likes_enabled": None,
+    "sharing_enabled": None,
+    "like_count": None,
+    "global_ID": "",
+    "featured_image": "",
+    "post_thumbnail": None,
+}
+
+# e.g. s:5:"width";i:1024; in the PHP serialized _wp_attachment_metadata
+ATTACHMENT_SIZE_RE = re.compile(r's:\d+:"(width|height)";i:(\d+);')
+
+
+def tag_name(element):
+    """
+    The tag of an element with its namespace as the prefix WXR files use, e.g. "wp:post_id" or "content:encoded".
+    """
+    tag = element.tag
+    if not tag.startswith("{"):
+        return tag
+
+    namespace, name = tag[1:].split("}", 1)
+    if namespace.startswith("http://wordpress.org/export/"):
+        prefix = "excerpt" if namespace.rstrip("/").endswith("excerpt") else "wp"
+    else:
+        prefix = NAMESPACE_PREFIXES.get(namespace, namespace)
+    return "{}:{}".format(prefix, name)
+
+
+def children(element):
+    """
+    The text of an element's children, by tag name. For repeated children, the last one's.
+    """
+    return dict((tag_name(child), child.text or "") for child in element)
+
+
+def wxr_date(gmt, local=""):
+    """
+    Convert a WXR date to the API's ISO format. Drafts have no GMT date, so their local date is taken as UTC.
+    """
+    for value in (gmt, local):
+        if value and not value.startswith("0000"):
+            return value.replace(" ", "T") + "+00:00"
+    return None
+
+
+def iter_wxr(fileobj):
+    """
+    Stream the elements of a WXR file that map to synced content, without holding the file in memory.
+
+    Each element is cleared from the tree once it's been handled, so memory stays flat however many items there are.
+
+    :param fileobj: the WXR file, opened in binary mode
+    :return: an iterator of (tag name, element), for wp:author, wp:category, wp:tag, and item elements
+    """
+    channel = None
+    for event, element in ElementTree.iterparse(fileobj, events=(str("start"), str("end"))):
+        name = tag_name(element)
+        if event == "start":
+            if name == "channel":
+                channel = element
+            continue
+
+        if name in ("wp:author", "wp:category", "wp:tag", "item"):
+            yield name, element
+
+        # drop finished children of the channel, including the ones we don't use (comments are inside items)
+        if channel is not None and element in channel:
+            channel.remove(element)
+
+
+class WXRImporter(object):
+    """
+    Loads content from a WordPress export (WXR) file, such as a site's Tools > Export download,
+    into the same rows the loader creates from the API.
+
+    Objects are upserted on (site_id, wp_id), like the loader does: existing rows are updated if they've changed,
+    and new ones are bulk created, a batch of items at a time.
+
+    WXR files don't have everything the API does: post counts, like counts, short URLs, and author avatars, for example.
+    Existing rows keep what they have for those, and new rows get empty values until they're synced from the API.
+    """
+
+    def __init__(self, loader, batch_size=100):
+        """
+        :param loader: the WPAPILoader to load items with, for its site and database
+        :param batch_size: the number of items to load at a time
+        """
+        self.loader = loader
+        self.site_id = loader.site_id
+        self.using = loader.using
+        self.batch_size = batch_size
+
+        # terms are few compared to posts, and items refer to them by slug
+        self.categories = {}
+        self.tags = {}
+        self.authors = {}
+
+        self.api_authors = []
+        self.api_categories = []
+        self.api_tags = []
+        self.api_posts = []
+        self.api_medias = []
+
+        # the latest modified date of each post type and status, for incremental syncs to take over from
+        self.watermarks = {}
+        self.counts = dict((name, 0) for name in ("authors", "categories", "tags", "media", "posts"))
+
+    def load(self, fileobj):
+        """
+        Load every author, category, tag, post, and attachment in a WXR file.
+
+        :param fileobj: the WXR file, opened in binary mode
+        :return: a dict of the number of each kind of object loaded
+        """
+        with self.loader.tracking():
+            try:
+                for name, element in iter_wxr(fileobj):
+                    if name == "wp:author":
+                        self.api_authors.append(self.get_api_author(element))
+                    elif name == "wp:category":
+                        self.api_categories.append(self.get_api_category(element))
+                    elif name == "wp:tag":
+                        self.api_tags.append(self.get_api_tag(element))
+                    else:
+                        self.flush_terms()
+                        self.add_item(element)
+                        if len(self.api_posts) >= self.batch_size:
+                            self.flush_items()
+
+                self.flush_terms()
+                self.flush_items()
+                self.link_attachments()
+            finally:
+                # other processes may have ref data in memory that's out of date now
+                invalidate_ref_data(self.site_id)
+
+        self.update_watermarks()
+
+        logger.info("loaded %s", ", ".join("{} {}".format(count, name) for name, count in sorted(self.counts.items())))
+        return self.counts
+
+    # ------- authors and terms ---------- #
+
+    def get_api_author(self, element):
+        data = children(element)
+        return {
+            "ID": int(data["wp:author_id"]),
+            "login": data.get("wp:author_login", ""),
+            "email": data.get("wp:author_email", ""),
+            "name": data.get("wp:author_display_name", ""),
+            "nice_name": data.get("wp:author_login", ""),
+        }
+
+    def get_api_category(self, element):
+        data = children(element)
+        api_category = {
+            "ID": int(data["wp:term_id"]),
+            "name": data.get("wp:cat_name", ""),
+            "slug": data.get("wp:category_nicename", ""),
+            "description": data.get("wp:category_description", ""),
+            # WXR refers to the parent by slug; categories come after their parents
+            "parent": self.categories.get(data.get("wp:category_parent"), {}).get("ID"),
+        }
+        self.categories[api_category["slug"]] = self.post_term(api_category)
+        return api_category
+
+    def get_api_tag(self, element):
+        data = children(element)
+        api_tag = {
+            "ID": int(data["wp:term_id"]),
+            "name": data.get("wp:tag_name", ""),
+            "slug": data.get("wp:tag_slug", ""),
+            "description": data.get("wp:tag_description", ""),
+        }
+        self.tags[api_tag["slug"]] = self.post_term(api_tag)
+        return api_tag
+
+    @staticmethod
+    def post_term(api_term):
+        # as a post's categories and tags are in the API
+        return dict(api_term, post_count=0)
+
+    def flush_terms(self):
+        """
+        Upsert the authors and terms read so far, and map the authors for items to refer to.
+        """
+        if self.api_authors or self.api_categories or self.api_tags:
+            with self.loader.metrics.phase("ref_data"):
+                self.upsert_terms()
+
+    def upsert_terms(self):
+        if self.api_authors:
+            for author in self.upsert("author", Author, self.api_authors, "authors"):
+                # with the values we have, so that the loader sees the author hasn't changed
+                api_author = dict((field[1], getattr(author, field[0])) for field in self.loader.fields_mapping["author"])
+                api_author["ID"] = author.wp_id
+                self.authors[author.login] = api_author
+            self.api_authors = []
+
+        if self.api_categories:
+            self.upsert("category", Category, self.api_categories, "categories")
+            self.api_categories = []
+
+        if self.api_tags:
+            self.upsert("tag", Tag, self.api_tags, "tags")
+            self.api_tags = []
+
+    def upsert(self, type, model, api_objects, count_name):
+        """
+        Update the local copies of objects from WXR data, and bulk create the rest.
+        Fields that WXR doesn't have are left as they are, or set to empty values on new objects.
+
+        :return: the up to date objects, existing and new
+        """
+        fields = self.loader.fields_mapping[type]
+        existing_objs = self.loader.get_existing_objs(model, api_objects)
+
+        objs = []
+        new_objs = []
+        for api_object in api_objects:
+            existing_obj = existing_objs.get(api_object["ID"])
+            if existing_obj:
+                self.loader.update_existing_obj([field for field in fields if field[1] in api_object],
+                                                existing_obj, api_object)
+                objs.append(existing_obj)
+            else:
+                new_objs.append(model(site_id=self.site_id, wp_id=api_object["ID"],
+                                      **self.new_obj_data(model, type, api_object)))
+
+        for chunk in chunked(new_objs, 500):
+            model.objects.using(self.using).bulk_create(chunk)
+
+        self.counts[count_name] += len(api_objects)
+        return objs + new_objs
+
+    def new_obj_data(self, model, type, api_object):
+        data = self.loader.api_object_data(type, api_object)
+        for name, value in data.items():
+            field = model._meta.get_field(name)
+            if value is None and not field.null:
+                data[name] = "" if field.empty_strings_allowed else 0
+        return data
+
+    # ------- items ---------- #
+
+    def add_item(self, element):
+        """
+        Map an item to API post data, and for attachments, to API media data too.
+        """
+        data, terms, metadata, attachment_meta = self.parse_item(element)
+
+        post_type = data.get("wp:post_type", "post")
+        if post_type not in ("post", "page", "attachment"):
+            return
+
+        wp_id = int(data["wp:post_id"])
+        date = wxr_date(data.get("wp:post_date_gmt"), data.get("wp:post_date"))
+        parent_id = int_or_None(data.get("wp:post_parent"))
+
+        api_post = {
+            "ID": wp_id,
+            "author": self.authors.get(data.get("dc:creator"), {}),
+            "date": date,
+            # exports from before WordPress 6.x have no modified dates
+            "modified": wxr_date(data.get("wp:post_modified_gmt"), data.get("wp:post_modified")) or date,
+            "title": data.get("title", ""),
+            "URL": data.get("link", ""),
+            "content": data.get("content:encoded", ""),
+            "excerpt": data.get("excerpt:encoded", ""),
+            "slug": data.get("wp:post_name", ""),
+            "guid": data.get("guid", ""),
+            "status": data.get("wp:status", ""),
+            "sticky": data.get("wp:is_sticky") == "1",
+            "password": data.get("wp:post_password", ""),
+            "parent": {"ID": parent_id} if parent_id else False,
+            "type": post_type,
+            "format": terms["format"],
+            "menu_order": int_or_None(data.get("wp:menu_order")) or 0,
+            "metadata": metadata or False,
+            "categories": terms["categories"],
+            "tags": terms["tags"],
+            # linked to the media attached to each post once every item is loaded, since parents may come later
+            "attachments": {},
+        }
+        api_post.update(API_ONLY_POST_FIELDS)
+        self.api_posts.append(api_post)
+
+        # attachments are crawled with the posts' status
+        watermark_key = (post_type, "publish" if api_post["status"] == "inherit" else api_post["status"])
+        modified = parse_datetime(api_post["modified"]) if api_post["modified"] else None
+        if modified and (watermark_key not in self.watermarks or modified > self.watermarks[watermark_key]):
+            self.watermarks[watermark_key] = modified
+
+        # like the media API, only media attached to a post
+        if post_type == "attachment" and parent_id:
+            self.add_attachment_media(api_post, data, attachment_meta)
+
+    def parse_item(self, element):
+        """
+        Read the child elements of an item.
+
+        :param element: the item element
+        :return: a tuple of: the text of its other elements, by tag name; its categories, tags, and post format,
+                 as the API has them; its public metadata, as the API has it; and its private metadata, by key
+        """
+        data = {}
+        terms = {"categories": {}, "tags": {}, "format": "standard"}
+        metadata = []
+        private_meta = {}
+
+        for child in element:
+            name = tag_name(child)
+            if name == "category":
+                self.add_item_term(child, terms)
+            elif name == "wp:postmeta":
+                meta = children(child)
+                key, value = meta.get("wp:meta_key", ""), meta.get("wp:meta_value", "")
+                if key.startswith("_"):
+                    private_meta[key] = value
+                else:
+                    # the API only has public metadata
+                    metadata.append({"key": key, "value": value})
+            elif name != "wp:comment":
+                data[name] = child.text or ""
+
+        return data, terms, metadata, private_meta
+
+    def add_item_term(self, element, terms):
+        """
+        Add an item's category element to its categories, tags, or post format.
+        """
+        domain = element.get("domain")
+        slug = element.get("nicename")
+        if domain == "category" and slug in self.categories:
+            terms["categories"][self.categories[slug]["name"]] = self.categories[slug]
+        elif domain == "post_tag" and slug in self.tags:
+            terms["tags"][self.tags[slug]["name"]] = self.tags[slug]
+        elif domain == "post_format" and slug:
+            terms["format"] = slug.replace("post-format-", "")
+
+    def add_attachment_media(self, api_post, data, attachment_meta):
+        """
+        Map an attachment item to API media data.
+
+        :param api_post: the API post data for the attachment
+        :param data: the text of the item's elements, by tag name
+        :param attachment_meta: the item's private metadata, by key
+        """
+        url = data.get("wp:attachment_url", "")
+        file_name = os.path.basename(url)
+        sizes = dict(ATTACHMENT_SIZE_RE.findall(attachment_meta.get("_wp_attachment_metadata", "")))
+        self.api_medias.append({
+            "ID": api_post["ID"],
+            "URL": url,
+            "guid": api_post["guid"],
+            "date": api_post["date"],
+            "post_ID": api_post["parent"]["ID"],
+            "file": file_name,
+            "extension": os.path.splitext(file_name)[1].lstrip("."),
+            "mime_type": mimetypes.guess_type(file_name)[0],
+            "width": sizes.get("width"),
+            "height": sizes.get("height"),
+            "title": api_post["title"],
+            "caption": api_post["excerpt"],
+            "description": api_post["content"],
+            "alt": attachment_meta.get("_wp_attachment_image_alt", ""),
+            "exif": {},
+        })
+
+    def flush_items(self):
+        """
+        Load the batch of items read so far, with the loader.
+        """
+        if self.api_medias:
+            self.upsert("media", Media, self.api_medias, "media")
+            self.api_medias = []
+
+        if not self.api_posts:
+            return
+
+        # keep what existing posts have for the fields WXR doesn't, and the media attached to them
+        api_fields = dict((field[1], field[0]) for field in self.loader.fields_mapping["post"]
+                          if field[1] in API_ONLY_POST_FIELDS)
+        existing_posts = Post.objects.using(self.using).filter(site_id=self.site_id,
+                                                               wp_id__in=[api_post["ID"] for api_post in self.api_posts])
+        existing_values = dict((post.wp_id, post) for post in existing_posts.only("wp_id", *api_fields.values()))
+        attachments = {}
+        if existing_values:
+            through = Post.attachments.through
+            for post_wp_id, media_wp_id in (through.objects.using(self.using)
+                                                           .filter(post__in=[post.pk for post in existing_values.values()])
+                                                           .values_list("post__wp_id", "media__wp_id")):
+                attachments.setdefault(post_wp_id, {})[six.text_type(media_wp_id)] = {"ID": media_wp_id}
+
+        for api_post in self.api_posts:
+            existing_post = existing_values.get(api_post["ID"])
+            if existing_post:
+                api_post.update((api_field, getattr(existing_post, field)) for api_field, field in api_fields.items())
+                api_post["attachments"] = attachments.get(api_post["ID"], {})
+
+        if self.loader.ref_data_map is None:
+            self.loader.get_ref_data_map()
+
+        # the export has every attachment, so there's no need to ask the API which were removed
+        with self.loader.metrics.phase("posts"):
+            self.loader.load_wp_posts(self.api_posts, sync_attachments=False)
+
+        self.counts["posts"] += len(self.api_posts)
+        logger.info(" - loaded %d posts", self.counts["posts"])
+        self.api_posts = []
+
+    def link_attachments(self):
+        """
+        Add the media attached to each post to its attachments, in chunks, as the API lists them.
+        """
+        field = Post._meta.get_field("attachments")
+        through = field.rel.through
+        medias = (Media.objects.using(self.using).filter(site_id=self.site_id, post_ID__isnull=False)
+                                                 .order_by("pk")
+                                                 .values_list("pk", "post_ID")
+                                                 .iterator())
+
+        for chunk in chunked(medias, 500):
+            post_pks = dict(Post.objects.using(self.using).filter(site_id=self.site_id,
+                                                                  wp_id__in=set(post_ID for pk, post_ID in chunk))
+                                                          .values_list("wp_id", "pk"))
+            links = set((post_pks[post_ID], pk) for pk, post_ID in chunk if post_ID in post_pks)
+            if not links:
+                continue
+
+            existing_links = set(through.objects.using(self.using)
+                                                .filter(**{field.m2m_reverse_name() + "__in": [pk for pk, post_ID in chunk]})
+                                                .values_list(field.m2m_column_name(), field.m2m_reverse_name()))
+            through.objects.using(self.using).bulk_create([
+                through(**{field.m2m_column_name(): post_pk, field.m2m_reverse_name(): media_pk})
+                for post_pk, media_pk in links - existing_links])
+
+    def update_watermarks(self):
+        """
+        Move the watermarks of the site's crawls up to the latest modified date in the export,
+        so that the next incremental sync takes over from there.
+        """
+        for (post_type, status), watermark in six.iteritems(self.watermarks):
+            sync_state = self.loader.get_sync_state("posts", post_type=post_type, status=status)
+            if not sync_state.watermark or watermark > sync_state.watermark:
+                sync_state.watermark = watermark
+                sync_state.save()